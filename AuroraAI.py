@@ -1,355 +1,1159 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import boto3
+from flask import Blueprint, Flask, Response, g, render_template, request, jsonify, send_file
 import base64
 import json
 import os
 import base64
 import psycopg2
+import psycopg2.extensions
 import re
+import bisect
+import contextvars
+import datetime
+import decimal
+import gzip
+import hashlib
+import math
+import random
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+
+# dc - 2026-10-18 - Optional accelerators: faster JSON encoding and brotli compression when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# dc - 2026-10-18 - boto3 and numpy take longer to import than the rest of the module together, so they are imported on
+# first use: boto3 by get_aws_client and numpy, which backs the example index, by import_numpy
+numpy = None
+
+# dc - 2026-10-18 - Routes are registered on a blueprint; create_app() builds the Flask application around it
+routes = Blueprint('auroraai', __name__)
+
+# dc - 2026-10-18 - Connection pool sizing and recycling, overridable from the environment
+POOL_MIN_SIZE = int(os.environ.get('AURORAAI_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.environ.get('AURORAAI_POOL_MAX_SIZE', '10'))
+POOL_MAX_AGE = float(os.environ.get('AURORAAI_POOL_MAX_AGE', '1800'))
+POOL_MAX_IDLE = float(os.environ.get('AURORAAI_POOL_MAX_IDLE', '300'))
+POOL_PING_AFTER = float(os.environ.get('AURORAAI_POOL_PING_AFTER', '30'))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get('AURORAAI_POOL_CHECKOUT_TIMEOUT', '10'))
+
+# dc - 2026-10-18 - Reader endpoints for generated SELECTs ("host[:port],..."; empty sends everything to DB_HOST), how a reader
+# is picked (least_outstanding or latency), the replication lag a reader may have and how health checks eject and re-admit readers
+DB_READER_HOSTS = os.environ.get('AURORAAI_DB_READER_HOSTS', '')
+READER_POLICY = os.environ.get('AURORAAI_READER_POLICY', 'least_outstanding')
+READER_MAX_LAG = float(os.environ.get('AURORAAI_READER_MAX_LAG', '30'))
+READER_CHECK_INTERVAL = float(os.environ.get('AURORAAI_READER_CHECK_INTERVAL', '5'))
+READER_EJECT_AFTER = int(os.environ.get('AURORAAI_READER_EJECT_AFTER', '2'))
+READER_READMIT_AFTER = int(os.environ.get('AURORAAI_READER_READMIT_AFTER', '2'))
+
+# dc - 2026-10-18 - Schema metadata cache lifetime and how often the catalog fingerprint is re-checked
+SCHEMA_NAME = os.environ.get('AURORAAI_SCHEMA_NAME', 'dc_ai_test')
+SCHEMA_CACHE_TTL = float(os.environ.get('AURORAAI_SCHEMA_CACHE_TTL', '3600'))
+SCHEMA_CHECK_INTERVAL = float(os.environ.get('AURORAAI_SCHEMA_CHECK_INTERVAL', '30'))
+
+# dc - 2026-10-18 - AWS region, database secret and how long fetched secrets are reused
+AWS_REGION = os.environ.get('AURORAAI_AWS_REGION', 'us-east-1')
+SECRET_ID = os.environ.get('AURORAAI_SECRET_ID', 'AuroraAI')
+SECRET_CACHE_TTL = float(os.environ.get('AURORAAI_SECRET_CACHE_TTL', '300'))
+
+# dc - 2026-10-18 - Bedrock model and the prompt-to-SQL cache bounds; set the path to persist the cache in SQLite
+BEDROCK_MODEL_ID = os.environ.get('AURORAAI_BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+SQL_CACHE_MAX_ENTRIES = int(os.environ.get('AURORAAI_SQL_CACHE_MAX_ENTRIES', '1000'))
+SQL_CACHE_MAX_BYTES = int(os.environ.get('AURORAAI_SQL_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+SQL_CACHE_TTL = float(os.environ.get('AURORAAI_SQL_CACHE_TTL', '86400'))
+SQL_CACHE_PATH = os.environ.get('AURORAAI_SQL_CACHE_PATH', '')
+
+# dc - 2026-10-18 - Stream Bedrock responses and stop generation as soon as the guardrail can decide
+BEDROCK_STREAMING = os.environ.get('AURORAAI_BEDROCK_STREAMING', 'false').lower() in ('1', 'true', 'yes')
+
+# dc - 2026-10-18 - Send only the tables relevant to the prompt, within a token budget, falling back to the full schema
+SCHEMA_PRUNING = os.environ.get('AURORAAI_SCHEMA_PRUNING', 'true').lower() in ('1', 'true', 'yes')
+PRUNE_TOP_K = int(os.environ.get('AURORAAI_PRUNE_TOP_K', '5'))
+PRUNE_TOKEN_BUDGET = int(os.environ.get('AURORAAI_PRUNE_TOKEN_BUDGET', '2000'))
+PRUNE_MIN_SCORE = float(os.environ.get('AURORAAI_PRUNE_MIN_SCORE', '1.0'))
+
+# dc - 2026-10-18 - Format used to describe the schema to the model: compact, columnar or json
+SCHEMA_FORMAT = os.environ.get('AURORAAI_SCHEMA_FORMAT', 'compact')
+
+# dc - 2026-10-18 - Pre-execution EXPLAIN gate and per-request statement timeout for generated SQL
+QUERY_MAX_COST = float(os.environ.get('AURORAAI_QUERY_MAX_COST', '10000000'))
+QUERY_MAX_ROWS = int(os.environ.get('AURORAAI_QUERY_MAX_ROWS', '100000'))
+QUERY_ROWS_ACTION = os.environ.get('AURORAAI_QUERY_ROWS_ACTION', 'limit')
+STATEMENT_TIMEOUT_MS = int(os.environ.get('AURORAAI_STATEMENT_TIMEOUT_MS', '30000'))
+
+# dc - 2026-10-18 - Responses smaller than this are not worth compressing; exports spill to disk above the spool size
+COMPRESS_MIN_BYTES = int(os.environ.get('AURORAAI_COMPRESS_MIN_BYTES', '1024'))
+EXPORT_SPOOL_BYTES = int(os.environ.get('AURORAAI_EXPORT_SPOOL_BYTES', str(16 * 1024 * 1024)))
+
+# dc - 2026-10-18 - Bedrock request rate per model (0 disables), throttling retries and batch fan-out
+BEDROCK_MAX_RPS = float(os.environ.get('AURORAAI_BEDROCK_MAX_RPS', '10'))
+BEDROCK_MAX_RETRIES = int(os.environ.get('AURORAAI_BEDROCK_MAX_RETRIES', '4'))
+BEDROCK_BACKOFF_BASE = float(os.environ.get('AURORAAI_BEDROCK_BACKOFF_BASE', '0.5'))
+BEDROCK_BACKOFF_MAX = float(os.environ.get('AURORAAI_BEDROCK_BACKOFF_MAX', '8'))
+BATCH_MAX_WORKERS = int(os.environ.get('AURORAAI_BATCH_MAX_WORKERS', '8'))
+BATCH_MAX_PROMPTS = int(os.environ.get('AURORAAI_BATCH_MAX_PROMPTS', '100'))
+
+# dc - 2026-10-18 - Cache of query results keyed on normalized SQL, invalidated when the tables it read change
+RESULT_CACHE_ENABLED = os.environ.get('AURORAAI_RESULT_CACHE', 'true').lower() in ('1', 'true', 'yes')
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('AURORAAI_RESULT_CACHE_MAX_ENTRIES', '256'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('AURORAAI_RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.environ.get('AURORAAI_RESULT_CACHE_TTL', '300'))
+RESULT_CACHE_CHECK_INTERVAL = float(os.environ.get('AURORAAI_RESULT_CACHE_CHECK_INTERVAL', '1'))
+# dc - 2026-10-18 - A streamed result is kept for the cache only up to this many bytes, so streaming stays flat in memory
+RESULT_CACHE_STREAM_MAX_BYTES = int(os.environ.get('AURORAAI_RESULT_CACHE_STREAM_MAX_BYTES', str(1024 * 1024)))
+
+# dc - 2026-10-18 - Prompt/SQL pairs that ran successfully, used as few-shot examples and optionally reused for near-identical prompts; set the path to memory-map the store on disk
+EXAMPLES_ENABLED = os.environ.get('AURORAAI_EXAMPLES', 'true').lower() in ('1', 'true', 'yes')
+EXAMPLE_STORE_PATH = os.environ.get('AURORAAI_EXAMPLE_STORE_PATH', '')
+EXAMPLE_CAPACITY = int(os.environ.get('AURORAAI_EXAMPLE_CAPACITY', '10000'))
+EXAMPLE_DIMENSIONS = int(os.environ.get('AURORAAI_EXAMPLE_DIMENSIONS', '512'))
+FEW_SHOT_K = int(os.environ.get('AURORAAI_FEW_SHOT_K', '3'))
+FEW_SHOT_MIN_SIMILARITY = float(os.environ.get('AURORAAI_FEW_SHOT_MIN_SIMILARITY', '0.5'))
+EXAMPLE_REUSE = os.environ.get('AURORAAI_EXAMPLE_REUSE', 'false').lower() in ('1', 'true', 'yes')
+EXAMPLE_REUSE_THRESHOLD = float(os.environ.get('AURORAAI_EXAMPLE_REUSE_THRESHOLD', '0.95'))
+
+# dc - 2026-10-18 - Background jobs: worker threads, jobs allowed to wait, largest result kept in memory and how long results are kept
+JOB_MAX_WORKERS = int(os.environ.get('AURORAAI_JOB_MAX_WORKERS', '4'))
+JOB_MAX_QUEUED = int(os.environ.get('AURORAAI_JOB_MAX_QUEUED', '32'))
+JOB_SPILL_BYTES = int(os.environ.get('AURORAAI_JOB_SPILL_BYTES', str(8 * 1024 * 1024)))
+JOB_SPILL_DIR = os.environ.get('AURORAAI_JOB_SPILL_DIR', '')
+JOB_RESULT_TTL = float(os.environ.get('AURORAAI_JOB_RESULT_TTL', '900'))
+
+# dc - 2026-10-18 - What create_app does about clients, pools and the schema cache: warm them on a background thread, block
+# until they are warm, or leave it to the first /ready probe (off, e.g. when the app is created before the server forks)
+WARM_UP = os.environ.get('AURORAAI_WARM_UP', 'background').lower()
+
+# dc - 2026-10-18 - Structured log verbosity (debug, info, warning, error) and whether to send Server-Timing headers
+LOG_LEVEL = os.environ.get('AURORAAI_LOG_LEVEL', 'info').lower()
+SERVER_TIMING = os.environ.get('AURORAAI_SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes')
+
+# dc - 2026-10-18 - Rows fetched per round trip by server-side cursors when streaming results
+STREAM_ITERSIZE = int(os.environ.get('AURORAAI_STREAM_ITERSIZE', '2000'))
+
+_LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+_log_threshold = _LOG_LEVELS.get(LOG_LEVEL, 20)
+_current_trace = contextvars.ContextVar('auroraai_trace', default=None)
+
+
+
+def log(event, level='info', **fields):
+    # dc - 2026-10-18 - One JSON object per line on stdout; lines of the same request share its request_id
+    if _LOG_LEVELS[level] < _log_threshold:
+        return
+    record = {'ts': round(time.time(), 3), 'level': level, 'event': event}
+    trace = _current_trace.get()
+    if trace is not None:
+        record['request_id'] = trace.request_id
+    record.update(fields)
+    print(json.dumps(record, default=str))
+
+
+
+class Trace:
+    """Stage timings and counters (tokens, rows, bytes) of one request.
+
+    Batch items record into their request's trace from worker threads, so
+    updates take ``lock``.
+    """
+
+    __slots__ = ('request_id', 'route', 'started', 'stages', 'counters', 'outcome', 'status', 'finished', 'lock')
+
+    def __init__(self, route):
+        self.request_id = uuid.uuid4().hex
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.outcome = None
+        self.status = None
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        # dc - 2026-10-18 - Server-Timing durations are in milliseconds
+        parts = ['%s;dur=%.1f' % (name, seconds * 1000) for name, seconds in self.stages.items()]
+        parts.append('total;dur=%.1f' % (self.elapsed() * 1000))
+        return ', '.join(parts)
+
+
+
+# dc - 2026-10-18 - Seconds; from a cached lookup up to a slow Bedrock generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help_text), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for label_values, counts, total in series:
+            labels = ','.join('%s="%s"' % (name, _label_value(value)) for name, value in zip(self.label_names, label_values))
+            prefix = labels + ',' if labels else ''
+            suffix = '{%s}' % labels if labels else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append('%s_bucket{%sle="%s"} %d' % (self.name, prefix, bound, cumulative))
+            cumulative += counts[-1]
+            lines.append('%s_bucket{%sle="+Inf"} %d' % (self.name, prefix, cumulative))
+            lines.append('%s_sum%s %.6f' % (self.name, suffix, total))
+            lines.append('%s_count%s %d' % (self.name, suffix, cumulative))
+        return '\n'.join(lines)
+
+
+
+class MetricCounter:
+    """Prometheus counter without labels."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, value=1):
+        with self._lock:
+            self._value += value
+
+    def render(self):
+        with self._lock:
+            value = self._value
+        return '# HELP %s %s\n# TYPE %s counter\n%s %s' % (self.name, self.help_text, self.name, self.name, value)
+
+
+
+STAGE_SECONDS = Histogram('auroraai_stage_duration_seconds', 'Time spent in each pipeline stage.', ('stage',))
+REQUEST_SECONDS = Histogram('auroraai_request_duration_seconds', 'End-to-end request time by route and outcome.', ('route', 'outcome'))
+
+# dc - 2026-10-18 - Trace counters that are also exported as Prometheus counters
+TRACE_COUNTERS = {
+    'input_tokens': MetricCounter('auroraai_bedrock_input_tokens_total', 'Prompt tokens sent to Bedrock.'),
+    'output_tokens': MetricCounter('auroraai_bedrock_output_tokens_total', 'Tokens generated by Bedrock.'),
+    'rows': MetricCounter('auroraai_rows_returned_total', 'Result rows returned to clients.'),
+    'response_bytes': MetricCounter('auroraai_response_bytes_total', 'Response body bytes after compression.'),
+}
+
+METRICS = [STAGE_SECONDS, REQUEST_SECONDS] + list(TRACE_COUNTERS.values())
+
+
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
+
+
+
+@contextmanager
+def stage(name):
+    # dc - 2026-10-18 - Time a pipeline stage into the stage histogram and the current request's trace
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, elapsed)
+
+
+
+def count(name, value):
+    TRACE_COUNTERS[name].inc(value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+
+def set_outcome(outcome):
+    # dc - 2026-10-18 - forbidden, non_select, rejected, cancelled, error or success
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+
+
+def start_trace(route):
+    trace = Trace(route)
+    return trace, _current_trace.set(trace)
+
+
+
+def finish_trace(trace, status=None):
+    # dc - 2026-10-18 - Record the request once, whether it ended normally, in a stream or with an error
+    if trace.finished:
+        return
+    trace.finished = True
+    elapsed = trace.elapsed()
+    outcome = trace.outcome or ('success' if status is None or status < 400 else 'error')
+    REQUEST_SECONDS.observe(elapsed, trace.route, outcome)
+    log('request', request_id=trace.request_id, route=trace.route, status=status, outcome=outcome,
+        duration_ms=round(elapsed * 1000, 1),
+        stages_ms={name: round(seconds * 1000, 1) for name, seconds in trace.stages.items()},
+        **trace.counters)
+
 
-# dc - 2024-12-04 - Initialize Flask application
-app = Flask(__name__)
-
-# dc - 2024-12-04 - Ensure templates directory exists for Flask views
-os.makedirs('templates', exist_ok=True)
-
-# dc - 2024-12-04 - Create index.html template with HTML/CSS/JavaScript content
-with open('templates/index.html', 'w') as f:
-    f.write('''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Report Generator</title>
-    <!-- dc - 2024-12-04 - Include Bootstrap CSS for styling -->
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        /* dc - 2024-12-04 - Base styling for body content */
-        body {
-            font-family: Arial, sans-serif;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-        }
-        /* dc - 2024-12-04 - Container styling for prompt input area */
-        .prompt-container {
-            width: 100%;
-            margin: 20px 0;
-        }
-        /* dc - 2024-12-04 - Styling for the textarea input field */
-        .prompt-input {
-            width: 80%;
-            height: 150px;
-            padding: 12px 20px;
-            margin: 8px 0;
-            box-sizing: border-box;
-            border: 2px solid #ccc;
-            border-radius: 4px;
-            background-color: #f8f8f8;
-            font-size: 16px;
-            resize: vertical;
-            display: block;
-            margin-left: auto;
-            margin-right: auto;
-        }
-        .warning-box {
-            background-color: #ffff99;
-            color: #003300;
-            border: 1px solid #ff0000;
-            padding: 10px;
-            margin: 10px auto;
-            border-radius: 4px;
-            font-size: 14px;
-            display: block;           /* Makes the box fit to content width */
-            width: 80%;              /* Allows box to size to content */
-            min-width: min-content;   /* Ensures minimum width fits content */
-            max-width: 100%;          /* Prevents overflow on small screens */
-            box-sizing: border-box;   /* Includes padding in width calculation */
-            white-space: normal;      /* Allows text to wrap naturally */
-            line-height: 1.4;         /* Improves readability of wrapped text */
-            text-align: center;       /* Centers the text inside */            
-        }
-        /* dc - 2024-12-04 - Styling for the submit button */
-        .submit-btn {
-            background-color: #4CAF50;
-            color: white;
-            padding: 12px 20px;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            display: block;
-            margin: 20px auto;
-            font-size: 16px;
-        }
-        /* dc - 2024-12-04 - Hover effect for submit button */
-        .submit-btn:hover {
-            background-color: #45a049;
-        }
-        /* dc - 2024-12-04 - Container styling for results table */
-        .table-container {
-            margin-top: 20px;
-            overflow-x: auto;
-        }
-        /* dc - 2024-12-04 - Base table styling */
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-        }
-        /* dc - 2024-12-04 - Table cell styling */
-        th, td {
-            padding: 8px;
-            text-align: left;
-            border: 1px solid #ddd;
-        }
-        /* dc - 2024-12-04 - Header row styling */
-        th {
-            background-color: #f2f2f2;
-        }
-        /* dc - 2024-12-04 - Alternating row colors */
-        tr:nth-child(even) {
-            background-color: #f9f9f9;
-        }
-        /* dc - 2024-12-04 - Row hover effect */
-        tr:hover {
-            background-color: #f5f5f5;
-        }
-        /* dc - 2024-12-04 - Loading indicator styling */
-        #loading {
-            display: none;
-            margin: 20px 0;
-            font-style: italic;
-            color: #666;
-            text-align: center;
-        }
-        /* dc - 2024-12-04 - Page title styling */
-        h1 {
-            text-align: center;
-            color: #333;
-            margin-bottom: 30px;
-        }
-    </style>
-</head>
-<body>
-    <!-- dc - 2024-12-04 - Main page heading -->
-    <h1>Report Generator</h1>
-    <!-- dc - 2024-12-04 - Form container for user input -->
-    <div class="prompt-container">
-        <form id="promptForm">
-            <textarea 
-                class="prompt-input" 
-                id="prompt" 
-                placeholder="Enter the data to be retrieved from the database in plain text format"
-                required></textarea>
-            <div class="warning-box">
-                Do not use the words 'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER'
-            </div>
-            <button type="submit" class="submit-btn">Generate Report</button>
-        </form>
-    </div>
-
-    <!-- dc - 2024-12-04 - Loading indicator element -->
-    <div id="loading">Retrieving data, please wait...</div>
-    
-    <!-- dc - 2024-12-04 - Container for query results -->
-    <div class="table-container" id="resultContainer"></div>
-
-    <script>
-        // dc - 2024-12-04 - Event listener for form submission
-        document.getElementById('promptForm').addEventListener('submit', async (e) => {
-            e.preventDefault();
-            const prompt = document.getElementById('prompt').value;
-            const loading = document.getElementById('loading');
-            const resultContainer = document.getElementById('resultContainer');
-            
-            // dc - 2024-12-04 - Show loading state and clear previous results
-            loading.style.display = 'block';
-            resultContainer.innerHTML = '';
-
-            try {
-                // dc - 2024-12-04 - Send request to backend API
-                console.log('Sending request to /generate');
-                const response = await fetch('/generate', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({ prompt: prompt })
-                });
-                
-                console.log('Response received:', response);
-                
-                if (response.ok) {
-                    const data = await response.json();
-                    console.log('Data received:', data);
-                    
-                    // dc - 2024-12-04 - Generate dynamic table from response data
-                    if (data.columns && data.rows) {
-                        const table = document.createElement('table');
-                        table.className = 'table table-striped table-bordered';
-                        
-                        // dc - 2024-12-04 - Create table header
-                        const thead = document.createElement('thead');
-                        const headerRow = document.createElement('tr');
-                        data.columns.forEach(column => {
-                            const th = document.createElement('th');
-                            th.textContent = column;
-                            headerRow.appendChild(th);
-                        });
-                        thead.appendChild(headerRow);
-                        table.appendChild(thead);
-                        
-                        // dc - 2024-12-04 - Create table body with data
-                        const tbody = document.createElement('tbody');
-                        data.rows.forEach(row => {
-                            const tr = document.createElement('tr');
-                            row.forEach(cell => {
-                                const td = document.createElement('td');
-                                td.textContent = cell === null ? 'NULL' : cell;
-                                tr.appendChild(td);
-                            });
-                            tbody.appendChild(tr);
-                        });
-                        table.appendChild(tbody);
-                        
-                        resultContainer.appendChild(table);
-                    } else {
-                        resultContainer.innerHTML = 'No data returned';
-                    }
-                } else {
-                    // dc - 2024-12-04 - Handle error responses
-                    const errorData = await response.json();
-                    console.error('Server error:', errorData);
-                    resultContainer.innerHTML = `Error: ${errorData.error || 'Unknown error'}`;
-                }
-            } catch (error) {
-                // dc - 2024-12-04 - Handle network or other errors
-                console.error('Error:', error);
-                resultContainer.innerHTML = 'Error fetching results';
-            } finally {
-                // dc - 2024-12-04 - Hide loading indicator
-                loading.style.display = 'none';
-            }
-        });
-    </script>
-</body>
-</html>
-    ''')
 
 # dc - 2024-12-04 - Function to process user input and generate SQL using Bedrock AI
-def call_bedrock(input_prompt):
+def call_bedrock(input_prompt, execute=None, details=None):
+    # dc - 2026-10-18 - execute_sql buffers the result; execute_sql_stream returns a RowStream instead
+    execute = execute or execute_sql
+    # dc - 2026-10-18 - details collects the generated SQL and the plan decision for the caller
+    details = {} if details is None else details
+    try:
+        sql_from_bedrock, rejection = prepare_sql(input_prompt, details)
+    except Exception as e:
+        set_outcome('error')
+        log('generate_error', 'error', error=str(e))
+        # dc - 2026-10-18 - Keep the cause for callers that report it later, e.g. a background job
+        details['error'] = str(e)
+        return None
+    if rejection is not None:
+        # dc - 2024-12-04 - Return the query results or error message to the caller                    
+        return rejection
+    # dc - 2024-12-04 - Execute the validated SELECT query and retrieve results
+    result = execute(sql_from_bedrock, details)
+    # dc - 2026-10-18 - Streamed SQL becomes an example only once its rows have been read to the end
+    rows = result[1] if result else None
+    if isinstance(rows, RowStream):
+        rows.on_complete(lambda data: record_example(input_prompt, details, result))
+    else:
+        record_example(input_prompt, details, result)
+    return result
+
+
+
+# dc - 2026-10-18 - Turn a prompt into validated SQL, or an error message in the usual (columns, data) shape
+def prepare_sql(input_prompt, details=None, metadata=None):
+    details = {} if details is None else details
     # Check for sql injection
-    prompt_check = sql_injection_guardrail(input_prompt, 'prompt from user')
+    with stage('guardrail'):
+        prompt_check = sql_injection_guardrail(input_prompt, 'prompt from user')
     if  prompt_check == 'forbidden':
+        set_outcome('forbidden')
         columns = ['Error message']
         data = [(0, 'I cannot execute any statement that modifies the database.')]
-        # dc - 2024-12-04 - Return the query results or error message to the caller                    
-        return columns, data
-    else:
-        # dc - 2024-12-04 - Get the table structure from the database
-        conn, metadata = get_metadata()
-
-        # dc - 2024-12-04 - Initialize Bedrock client for AI processing
-        client_bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-
-        # dc - 2024-12-04 - Construct prompt for AI model with safety constraints
-        prompt_text = """
-        Act as a developer writing SQL code for an Aurora Postgres database.
-        Important: Do not generate any SQL that modifies data in the database. Only generate SELECT statements.
-        Never generate INSERT, UPDATE, DELETE, DROP, CREATE, ALTER, or any other data modification statements.
-        Reject requests that contain the words change, modify, revise, replace.
-        The database schema name is dc_ai_test and contains the following tables:
-        """ + metadata + """
-        Convert the following text to SQL query and only return the SQL query without any explanation.
-        """ + input_prompt 
-        print(prompt_text)
-
-        # dc - 2024-12-04 - Configure Bedrock API request parameters
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4096,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt_text
-                        }
-                    ]
-                }
-            ],
-            "temperature": 0.4,  # Controls randomness in response
-            "top_p": 0.999,
-            "top_k": 250
-        }
+        return None, (columns, data)
+
+    # dc - 2024-12-04 - Get the table structure from the database, unless the caller already has it
+    if metadata is None:
+        with stage('metadata'):
+            metadata = get_metadata()
+
+    # dc - 2026-10-18 - Serve repeated prompts from the SQL cache; identical in-flight prompts share one Bedrock call
+    sql_from_bedrock = sql_cache.get_or_generate(
+        sql_cache_key(input_prompt),
+        lambda: generate_sql(input_prompt, metadata),
+        is_cacheable_sql
+    )
+    # dc - 2026-10-18 - Lex the response once: forbidden operations, statement kind and statement count
+    with stage('validate'):
+        verdict = inspect_sql(sql_from_bedrock)
+    log('sql_verdict', **verdict._asdict())
+    if  verdict.forbidden:
+        set_outcome('forbidden')
+        columns = ['Error message']
+        data = [(0, 'I cannot execute any statement that modifies the database.')]
+        return None, (columns, data)
+    # dc - 2024-12-04 - Verify if the SQL is a SELECT statement and execute if valid
+    if not verdict.allowed:
+        # dc - 2024-12-04 - Return error message if query is not a SELECT statement
+        set_outcome('non_select')
+        columns = ['Error message']
+        data = [(0, 'I can only execute SELECT statements.')]
+        return None, (columns, data)
+
+    details['sql'] = sql_from_bedrock
+    details['relations'] = verdict.relations
+    return sql_from_bedrock, None
+
+
+
+# dc - 2026-10-18 - Ask Bedrock to translate the prompt into SQL; errors propagate to call_bedrock
+def generate_sql(input_prompt, metadata):
+    # dc - 2026-10-18 - Similar prompts that already ran become few-shot examples; a near-identical one can skip Bedrock
+    with stage('examples'):
+        examples = find_examples(input_prompt)
+        reused = reuse_example(input_prompt, examples) if EXAMPLE_REUSE else None
+    if reused is not None:
+        return reused
+    if examples:
+        get_example_store().record('few_shot')
+
+    # dc - 2026-10-18 - Reuse the process-wide Bedrock client for AI processing
+    client_bedrock = get_aws_client('bedrock-runtime')
+
+    # dc - 2026-10-18 - Describe the schema compactly and only the tables the question is likely about
+    with stage('prune'):
+        body = build_bedrock_body(input_prompt, prompt_schema(input_prompt, metadata), examples)
+
+    with stage('bedrock'):
+        if BEDROCK_STREAMING:
+            return generate_sql_streaming(client_bedrock, body)
+
+        # dc - 2024-12-04 - Call Bedrock API and process response
+        response = invoke_bedrock(
+            client_bedrock.invoke_model,
+            modelId=BEDROCK_MODEL_ID,
+            body=json.dumps(body)
+        )
+        # dc - 2024-12-04 - Parse and extract SQL from response
+        response_body = json.loads(response.get('body').read())
+    usage = response_body.get('usage') or {}
+    count('input_tokens', usage.get('input_tokens', 0))
+    count('output_tokens', usage.get('output_tokens', 0))
+    return response_body['content'][0]['text']
+
+
+
+def build_bedrock_body(input_prompt, metadata, examples=()):
+    # dc - 2024-12-04 - Construct prompt for AI model with safety constraints
+    prompt_text = """
+    Act as a developer writing SQL code for an Aurora Postgres database.
+    Important: Do not generate any SQL that modifies data in the database. Only generate SELECT statements.
+    Never generate INSERT, UPDATE, DELETE, DROP, CREATE, ALTER, or any other data modification statements.
+    Reject requests that contain the words change, modify, revise, replace.
+    The database schema name is dc_ai_test and contains the following tables:
+    """ + metadata + few_shot_text(examples) + """
+    Convert the following text to SQL query and only return the SQL query without any explanation.
+    """ + input_prompt 
+    log('bedrock_prompt', 'debug', prompt=prompt_text)
+
+    # dc - 2024-12-04 - Configure Bedrock API request parameters
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt_text
+                    }
+                ]
+            }
+        ],
+        "temperature": 0.4,  # Controls randomness in response
+        "top_p": 0.999,
+        "top_k": 250
+    }
+    return body
+
+
+
+def few_shot_text(examples):
+    # dc - 2026-10-18 - Worked examples for the prompt, one line of SQL each
+    if not examples:
+        return ''
+    lines = ['', '    These questions were answered correctly against the same schema:']
+    for example in examples:
+        lines.append('    Question: ' + ' '.join(example.prompt.split()))
+        lines.append('    SQL: ' + ' '.join(example.sql.split()))
+    return '\n'.join(lines)
+
+
+
+def generate_sql_streaming(client_bedrock, body):
+    # dc - 2026-10-18 - Receive the answer token by token so a bad response can be cut off early
+    response = invoke_bedrock(
+        client_bedrock.invoke_model_with_response_stream,
+        modelId=BEDROCK_MODEL_ID,
+        body=json.dumps(body)
+    )
+    stream = response.get('body')
+    guard = StreamingSqlGuard()
+    verdict = 'continue'
+    try:
+        for event in stream:
+            chunk = event.get('chunk')
+            if chunk is None:
+                continue
+            message = json.loads(chunk['bytes'])
+            if message.get('type') == 'content_block_delta':
+                verdict = guard.feed(message['delta'].get('text', ''))
+                if verdict != 'continue':
+                    break
+            elif message.get('type') == 'message_start':
+                count('input_tokens', message['message'].get('usage', {}).get('input_tokens', 0))
+            elif message.get('type') == 'message_delta':
+                count('output_tokens', message.get('usage', {}).get('output_tokens', 0))
+            elif message.get('type') == 'message_stop':
+                break
+    finally:
+        # dc - 2026-10-18 - Closing the event stream cancels the rest of the generation
+        if verdict != 'continue' and hasattr(stream, 'close'):
+            stream.close()
+    if verdict == 'continue':
+        verdict = guard.finish()
+    log('bedrock_stream_end', verdict=verdict, chunks=guard.chunks)
+    # dc - 2026-10-18 - call_bedrock re-checks the text, so forbidden or non-SELECT output is rejected there as usual
+    return guard.text
+
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # dc - 2026-10-18 - Reserve a token even when in deficit, then sleep off the deficit outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+
+def get_rate_limiter(model_id):
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(model_id)
+        if limiter is None:
+            limiter = _rate_limiters[model_id] = RateLimiter(BEDROCK_MAX_RPS)
+        return limiter
+
+
+
+# dc - 2026-10-18 - Error codes Bedrock returns when it is overloaded rather than when the request is wrong
+BEDROCK_RETRYABLE_ERRORS = frozenset([
+    'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException',
+    'ModelNotReadyException', 'InternalServerException',
+])
+
+
+
+def invoke_bedrock(method, **kwargs):
+    # dc - 2026-10-18 - Rate-limit per model and retry throttling with exponential backoff and full jitter
+    limiter = get_rate_limiter(kwargs.get('modelId'))
+    import botocore.exceptions
+    for attempt in range(BEDROCK_MAX_RETRIES + 1):
+        limiter.acquire()
         try:
-            # dc - 2024-12-04 - Call Bedrock API and process response
-            response = client_bedrock.invoke_model(
-                modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-                body=json.dumps(body)
-            )
-            # dc - 2024-12-04 - Parse and extract SQL from response
-            response_body = json.loads(response.get('body').read())
-            sql_from_bedrock = response_body['content'][0]['text']
-            # dc - 2024-12-04 - Check if any forbidden SQL operations were found in the response
-            prompt_check = sql_injection_guardrail(sql_from_bedrock, 'SQL from AI model')
-            if  prompt_check == 'forbidden':
-                columns = ['Error message']
-                data = [(0, 'I cannot execute any statement that modifies the database.')]
+            return method(**kwargs)
+        except botocore.exceptions.ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in BEDROCK_RETRYABLE_ERRORS or attempt == BEDROCK_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(BEDROCK_BACKOFF_MAX, BEDROCK_BACKOFF_BASE * 2 ** attempt))
+            log('bedrock_retry', 'warning', code=code, delay_s=round(delay, 2), attempt=attempt + 1, max_retries=BEDROCK_MAX_RETRIES)
+            time.sleep(delay)
+
+
+
+class StreamingSqlGuard:
+    """Incremental guardrail applied to SQL as it streams from the model.
+
+    ``feed`` returns 'continue' while more text is needed, 'forbidden' once a
+    forbidden keyword is complete, 'non_select' as soon as the text cannot
+    start with SELECT, and 'complete' at the end of the first statement.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.chunks = 0
+        self._scanner = SqlScanner()
+
+    def feed(self, delta):
+        self.chunks += 1
+        self.text += delta
+        # dc - 2026-10-18 - The scanner resumes where it stopped, so the whole stream is lexed once
+        return self._decide(self._scanner.scan(self.text, final=False, first_statement=True), final=False)
+
+    def finish(self):
+        return self._decide(self._scanner.scan(self.text, first_statement=True), final=True)
+
+    def _decide(self, scanner, final):
+        if scanner.forbidden:
+            return 'forbidden'
+        if scanner.kinds and scanner.kinds[0] not in SQL_READ_KINDS:
+            return 'non_select'
+        if scanner.statement_end is not None:
+            # dc - 2026-10-18 - Anything after the first statement is commentary or a second statement; drop it
+            self.text = self.text[:scanner.statement_end]
+            return 'complete'
+        if final:
+            return 'complete' if scanner.verdict().allowed else 'non_select'
+        return 'continue'
+
+
+
+def sql_cache_key(input_prompt, schema_name=SCHEMA_NAME):
+    # dc - 2026-10-18 - Fold whitespace and case so trivially different prompts share an entry
+    normalized = ' '.join(input_prompt.split()).casefold()
+    # dc - 2026-10-18 - The schema fingerprint retires cached SQL as soon as the tables change
+    fingerprint = schema_fingerprint(schema_name)
+    return hashlib.sha256('\0'.join([BEDROCK_MODEL_ID, schema_name, fingerprint, normalized]).encode('utf-8')).hexdigest()
+
+
+
+def schema_fingerprint(schema_name=SCHEMA_NAME):
+    # dc - 2026-10-18 - Fingerprint of the cached schema, or '' before it has been loaded
+    entry = schema_cache.peek(schema_name)
+    return entry['fingerprint'] if entry is not None else ''
+
+
+
+def is_cacheable_sql(sql_from_bedrock):
+    # dc - 2026-10-18 - Only SQL that would pass the guardrails is worth keeping
+    return inspect_sql(sql_from_bedrock).allowed
+
+
+
+class _InFlight:
+    """A Bedrock call in progress that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+
+class SqliteSqlCacheBackend:
+    """Persists prompt-to-SQL cache entries in a SQLite file so they survive restarts."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS sql_cache (key TEXT PRIMARY KEY, sql TEXT NOT NULL, expires_at REAL NOT NULL)')
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT sql, expires_at FROM sql_cache WHERE key = ?', (key,)).fetchone()
+        return row
+
+    def set(self, key, sql, expires_at):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO sql_cache (key, sql, expires_at) VALUES (?, ?, ?)', (key, sql, expires_at))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM sql_cache WHERE key = ?', (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM sql_cache')
+            self._db.commit()
+
+
+
+class SqlCache:
+    """LRU/TTL cache of validated SQL with in-flight request coalescing.
+
+    Bounded by entry count and by the bytes of keys plus SQL text. An
+    optional backend (see SqliteSqlCacheBackend) is written through and
+    consulted on local misses.
+    """
+
+    def __init__(self, max_entries=SQL_CACHE_MAX_ENTRIES, max_bytes=SQL_CACHE_MAX_BYTES,
+                 ttl=SQL_CACHE_TTL, backend=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+        self._stats = {
+            'hits': 0,
+            'backend_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def get_or_generate(self, key, generate, cacheable=lambda value: True):
+        with self._lock:
+            sql = self._lookup(key)
+            if sql is not None:
+                self._stats['hits'] += 1
+                return sql
+            waiter = self._in_flight.get(key)
+            if waiter is not None:
+                self._stats['coalesced'] += 1
             else:
-                # dc - 2024-12-04 - Verify if the SQL is a SELECT statement and execute if valid
-                if sql_from_bedrock.lower().startswith('select'):
-                    # dc - 2024-12-04 - Execute the validated SELECT query and retrieve results
-                    columns, data = execute_sql(conn, sql_from_bedrock)
-                else:
-                    # dc - 2024-12-04 - Return error message if query is not a SELECT statement
-                    columns = ['Error message']
-                    data = [(0, 'I can only execute SELECT statements.')]
-                # dc - 2024-12-04 - Return the query results or error message to the caller                    
-            return columns, data
+                leader = self._in_flight[key] = _InFlight()
+
+        if waiter is not None:
+            # dc - 2026-10-18 - Another request is already asking Bedrock the same question; share its answer
+            waiter.done.wait()
+            if waiter.error is not None:
+                raise waiter.error
+            return waiter.value
+
+        try:
+            sql = self._backend_get(key)
+            if sql is None:
+                with self._lock:
+                    self._stats['misses'] += 1
+                sql = generate()
+                if cacheable(sql):
+                    self.put(key, sql)
+            leader.value = sql
+            return sql
+        except Exception as e:
+            leader.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            leader.done.set()
+
+    def put(self, key, sql, expires_at=None, write_through=True):
+        expires_at = time.time() + self.ttl if expires_at is None else expires_at
+        size = len(key) + len(sql.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (sql, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+        if write_through and self.backend is not None:
+            try:
+                self.backend.set(key, sql, expires_at)
+            except Exception as e:
+                log('sql_cache_backend_error', 'error', operation='write', error=str(e))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['backend_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['backend_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _lookup(self, key):
+        # dc - 2026-10-18 - Caller must hold self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self._remove(key)
+            self._stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _remove(self, key):
+        # dc - 2026-10-18 - Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _backend_get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            row = self.backend.get(key)
         except Exception as e:
-            print(f"Error calling Claude: {str(e)}")
-            return None            
+            log('sql_cache_backend_error', 'error', operation='read', error=str(e))
+            return None
+        if row is None:
+            return None
+        sql, expires_at = row
+        if expires_at <= time.time():
+            self.backend.delete(key)
+            return None
+        with self._lock:
+            self._stats['backend_hits'] += 1
+        self.put(key, sql, expires_at, write_through=False)
+        return sql
+
+
+
+sql_cache = SqlCache(backend=SqliteSqlCacheBackend(SQL_CACHE_PATH) if SQL_CACHE_PATH else None)
+
+
+
+# dc - 2026-10-18 - PostgreSQL nests /* */ comments; a comment holding another /* lexes as 'open' and is rejected
+_SQL_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<comment>--[^\n]*|/\*(?:[^*/]|\*(?!/)|/(?!\*))*\*/)
+      | (?P<string>[Ee]'(?:[^'\\]|\\[\s\S]|'')*'|'(?:[^']|'')*')
+      | (?P<dollar>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$[\s\S]*?\$(?P=tag)\$)
+      | (?P<ident>"(?:[^"]|"")*")
+      | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+      | (?P<param>\$\d+)
+      | (?P<number>\d+(?:\.\d*)?(?:[Ee][+-]?\d+)?|\.\d+(?:[Ee][+-]?\d+)?)
+      | (?P<semicolon>;)
+      | (?P<punct>::|[(),.\[\]])
+      | (?P<open>['"]|\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$|/\*)
+      | (?P<operator>(?:[+*<>=~!@#%^&|`?:]|-(?!-)|/(?!\*))+)
+      | (?P<other>\S)
+    )
+""", re.VERBOSE)
+
+# dc - 2026-10-18 - Natural-language prompts are split into words only; apostrophes are not string quotes there
+_PROMPT_WORD_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*')
+
+# dc - 2026-10-18 - Words the user may not type in a prompt, as shown in the page's warning box
+PROMPT_FORBIDDEN_WORDS = frozenset(['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER'])
+
+# dc - 2026-10-18 - Keywords that never belong in a read-only query, wherever they appear outside literals
+SQL_FORBIDDEN_KEYWORDS = frozenset([
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'MERGE',
+    'GRANT', 'REVOKE', 'COPY', 'INTO',
+])
+
+# dc - 2026-10-18 - Functions with side effects that a SELECT could otherwise smuggle in
+SQL_FORBIDDEN_FUNCTIONS = frozenset([
+    'nextval', 'setval', 'set_config', 'pg_sleep', 'pg_cancel_backend', 'pg_terminate_backend',
+    'pg_reload_conf', 'pg_read_file', 'pg_read_binary_file', 'pg_ls_dir', 'lo_import', 'lo_export',
+    'lo_unlink', 'lo_create', 'lo_creat', 'lo_from_bytea', 'lo_put', 'lo_open', 'lo_truncate', 'lowrite',
+    'dblink', 'dblink_exec', 'dblink_connect', 'dblink_connect_u', 'dblink_open', 'dblink_send_query',
+    'dblink_disconnect', 'pg_advisory_lock', 'pg_advisory_xact_lock', 'pg_advisory_lock_shared',
+    'pg_advisory_xact_lock_shared', 'pg_try_advisory_lock', 'pg_try_advisory_xact_lock',
+    'pg_try_advisory_lock_shared', 'pg_try_advisory_xact_lock_shared', 'pg_notify', 'pg_logical_emit_message',
+    'pg_switch_wal', 'pg_create_restore_point', 'pg_rotate_logfile', 'pg_promote', 'pg_stat_reset',
+    'pg_file_write', 'pg_file_rename', 'pg_file_unlink', 'pg_create_logical_replication_slot',
+    'pg_create_physical_replication_slot', 'pg_drop_replication_slot',
+    # dc - 2026-10-18 - These run an arbitrary query string, which never passes through this scanner
+    'query_to_xml', 'query_to_xml_and_xmlschema', 'query_to_xmlschema',
+])
+
+# dc - 2026-10-18 - Leading keywords of statements that only read
+SQL_READ_KINDS = frozenset(['select', 'with', 'values', 'table'])
+
+# dc - 2026-10-18 - Words that end a FROM/JOIN relation instead of aliasing it
+_RELATION_TERMINATORS = frozenset([
+    'where', 'join', 'inner', 'left', 'right', 'full', 'cross', 'natural', 'on', 'using', 'group', 'order',
+    'having', 'limit', 'offset', 'fetch', 'for', 'union', 'intersect', 'except', 'window', 'lateral',
+    'tablesample', 'returning', 'into', 'only', 'outer',
+])
+
+
+
+# dc - 2026-10-18 - Functions whose arguments use FROM as a keyword
+_FROM_FUNCTIONS = frozenset(['extract', 'substring', 'trim', 'overlay'])
+
+
+
+SqlVerdict = namedtuple('SqlVerdict', ['allowed', 'kind', 'statement_count', 'relations', 'forbidden'])
+
+
+
+class SqlScanner:
+    """Single-pass, token-level read-only validator for PostgreSQL text.
+
+    Understands quoted strings (including E'' and dollar quoting), quoted
+    identifiers, comments and statement separators, so keywords inside
+    literals are ignored. Tokens can be fed incrementally with ``scan``;
+    ``verdict`` summarizes statement count, statement kind, referenced
+    relations and anything forbidden.
+    """
+
+    def __init__(self):
+        self.position = 0
+        self.statement_count = 0
+        self.statement_end = None
+        self.kinds = []
+        self.relations = []
+        self.forbidden = []
+        self.error = None
+        self._ctes = set()
+        self._statement_started = False
+        self._previous = deque(maxlen=4)
+        self._parens = []
+        self._relation_state = None
+        self._relation = None
+
+    def scan(self, text, final=True, first_statement=False):
+        # dc - 2026-10-18 - Consume complete tokens from self.position; a token touching the end waits for more text unless final
+        length = len(text)
+        if first_statement and self.statement_end is not None:
+            return self
+        for match in _SQL_TOKEN_PATTERN.finditer(text, self.position):
+            kind = match.lastgroup
+            if not final and (match.end() == length or kind == 'open'):
+                break
+            if kind == 'open':
+                self.error = 'unterminated quote or comment, or nested comment'
+                self.position = length
+                break
+            self.position = match.end()
+            if kind != 'comment':
+                self._token(kind, match.group(kind))
+            if first_statement and self.statement_end is not None:
+                return self
+        if final:
+            self.position = length
+            self._end_relation()
+        return self
+
+    def verdict(self):
+        kind = 'empty'
+        if self.error:
+            kind = 'error'
+        elif self.statement_count > 1:
+            kind = 'multiple'
+        elif self.kinds:
+            kind = 'select' if self.kinds[0] in SQL_READ_KINDS else self.kinds[0]
+        relations = []
+        for relation in self.relations:
+            if relation not in self._ctes and relation not in relations:
+                relations.append(relation)
+        return SqlVerdict(
+            allowed=kind == 'select' and not self.forbidden,
+            kind=kind,
+            statement_count=self.statement_count,
+            relations=relations,
+            forbidden=list(self.forbidden)
+        )
+
+    def _token(self, kind, value):
+        if kind == 'semicolon':
+            self._end_relation()
+            if self._statement_started and self.statement_end is None:
+                self.statement_end = self.position
+            self._statement_started = False
+            self._relation_state = None
+            self._previous.clear()
+            self._parens = []
+            return
+
+        if not self._statement_started:
+            self._statement_started = True
+            self.statement_count += 1
+        word = value.lower() if kind == 'word' else None
+
+        if word is not None:
+            if len(self.kinds) < self.statement_count:
+                self.kinds.append(word)
+            upper = value.upper()
+            if upper in SQL_FORBIDDEN_KEYWORDS and upper not in self.forbidden:
+                self.forbidden.append(upper)
+
+        if value == '(':
+            self._open_paren()
+        elif value == ')' and self._parens:
+            self._parens.pop()
+
+        self._relations(kind, value, word)
+        self._previous.append((kind, word if word is not None else value))
+
+    def _open_paren(self):
+        previous = self._previous
+        # dc - 2026-10-18 - "pg_sleep"(5) calls the same function as pg_sleep(5)
+        opener = self._identifier(*previous[-1]) if previous and previous[-1][0] in ('word', 'ident') else None
+        self._parens.append(opener)
+        if opener in SQL_FORBIDDEN_FUNCTIONS and opener + '()' not in self.forbidden:
+            self.forbidden.append(opener + '()')
+        # dc - 2026-10-18 - "name AS (" and "name AS [NOT] MATERIALIZED (" define a CTE, not a relation
+        words = [token[1] for token in previous]
+        previous = list(previous)
+        for modifiers in ([], ['materialized'], ['not', 'materialized']):
+            size = len(modifiers) + 2
+            if len(previous) >= size and words[-size + 1:] == ['as'] + modifiers \
+                    and previous[-size][0] in ('word', 'ident'):
+                self._ctes.add(self._identifier(*previous[-size]))
+                break
+
+    def _relations(self, kind, value, word):
+        # dc - 2026-10-18 - Collect schema-qualified names that follow FROM and JOIN, including comma-separated lists
+        state = self._relation_state
+        if state is None and word != 'from' and word != 'join':
+            return
+        name_token = kind == 'ident' or (word is not None and word not in _RELATION_TERMINATORS)
+        if state == 'expect':
+            if word in ('lateral', 'only'):
+                return
+            if kind in ('word', 'ident'):
+                self._relation = [self._identifier(kind, value)]
+                self._relation_state = 'name'
+            else:
+                self._relation_state = None
+            return
+        if state == 'dot':
+            if kind in ('word', 'ident'):
+                self._relation.append(self._identifier(kind, value))
+                self._relation_state = 'name'
+            else:
+                self._relation = None
+                self._relation_state = None
+            return
+        if state == 'name':
+            if value == '.':
+                self._relation_state = 'dot'
+                return
+            self._end_relation()
+            state = 'after'
+        if state == 'after':
+            if value == ',':
+                self._relation_state = 'expect'
+                return
+            if word == 'as':
+                self._relation_state = 'alias'
+                return
+            if name_token:
+                self._relation_state = 'aliased'
+                return
+        elif state == 'alias':
+            self._relation_state = 'aliased'
+            return
+        elif state == 'aliased':
+            if value == ',':
+                self._relation_state = 'expect'
+                return
+        self._relation_state = None
+
+        # dc - 2026-10-18 - FROM inside EXTRACT(...), SUBSTRING(...) and IS DISTINCT FROM does not name a relation
+        if word == 'join' or (word == 'from' and not (self._parens and self._parens[-1] in _FROM_FUNCTIONS)
+                              and not (self._previous and self._previous[-1][1] == 'distinct')):
+            self._relation_state = 'expect'
+
+    def _end_relation(self):
+        if self._relation_state == 'name' and self._relation:
+            self.relations.append('.'.join(self._relation))
+            self._relation_state = 'after'
+        self._relation = None
+
+    @staticmethod
+    def _identifier(kind, value):
+        if kind == 'ident':
+            return value[1:-1].replace('""', '"')
+        return value.lower()
+
+
+
+def inspect_sql(sql):
+    # dc - 2026-10-18 - Structured read-only verdict for a complete SQL text
+    return SqlScanner().scan(sql).verdict()
+
+
+
+def find_prompt_forbidden_words(prompt):
+    # dc - 2026-10-18 - One pass over the words of the prompt with a precompiled pattern
+    found = []
+    for match in _PROMPT_WORD_PATTERN.finditer(prompt):
+        word = match.group().upper()
+        if word in PROMPT_FORBIDDEN_WORDS and word not in found:
+            found.append(word)
+    return found
 
 
 
 def sql_injection_guardrail(prompt, caller):
     # dc - 2024-12-04 - Security check for forbidden SQL operations
-    forbidden_words = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER']
-    upper_response = prompt.upper()
-    found_words = []
-    for word in forbidden_words:
-        pattern = r'\b' + re.escape(word) + r'\b'
-        if re.search(pattern, upper_response):
-            found_words.append(word)
+    found_words = find_prompt_forbidden_words(prompt)
     if found_words:
-        print('Prohibited words found in', caller)
-        print(prompt)
-        print(found_words)
+        log('guardrail', 'warning', caller=caller, verdict='forbidden', words=found_words, prompt=prompt)
         return('forbidden')
     else:
-        print('No prohibited words found in', caller)        
+        log('guardrail', 'debug', caller=caller, verdict='allowed')
         return('allowed')
 
 
 
-def get_metadata():
+def get_metadata(schema_name=SCHEMA_NAME):
+    try:
+        # dc - 2026-10-18 - Serve the table structure from the schema cache, reloading only when it changed
+        return schema_cache.get(
+            schema_name,
+            lambda: load_metadata(schema_name),
+            lambda: get_schema_fingerprint(schema_name)
+        )
+        
+    except Exception as e:
+        # dc - 2024-12-04 - Log and handle any database connection or query errors
+        log('metadata_error', 'error', schema=schema_name, error=str(e))
+        return None
+
+
+
+def load_metadata(schema_name):
+    pool = None
+    conn = None
     try:
         # dc - 2024-12-04 - Log the start of database metadata retrieval
-        print('Executing SQL')
+        log('metadata_load', schema=schema_name)
         
-        # dc - 2024-12-04 - Get database connection credentials from secure storage
-        credentials = get_db_credentials()
-        
-        # dc - 2024-12-04 - Establish connection to PostgreSQL database using credentials
-        conn = psycopg2.connect(
-            dbname=credentials['db_name'],
-            user=credentials['db_user'],
-            password=credentials['db_password'],
-            host=credentials['db_host'],
-            port=credentials['db_port']
-        )
-        print("Connection successful!")
+        # dc - 2026-10-18 - Borrow a pooled connection instead of opening a new one per request
+        pool = get_db_pool()
+        conn = pool.getconn()
+        log('db_connected', 'debug')
         
         # dc - 2024-12-04 - Create database cursor for executing queries
         cur = conn.cursor()
@@ -357,7 +1161,8 @@ def get_metadata():
         # dc - 2024-12-04 - SQL query to retrieve comprehensive schema metadata
         sql_metadata = """
             SELECT  Json_agg(Json_build_object('table_schema', table_schema, 'table_name', table_name, 'column_name', column_name, 
-                                               'data_type', data_type, 'size', size, 'key_type', key_type))
+                                               'data_type', data_type, 'size', size, 'key_type', key_type,
+                                               'references', references_target))
             FROM   (
                         SELECT  
                                     t.table_schema,
@@ -373,7 +1178,11 @@ def get_metadata():
                                         WHEN tc.constraint_type = 'PRIMARY KEY' THEN 'PK'
                                         WHEN tc.constraint_type = 'FOREIGN KEY' THEN 'FK'
                                         ELSE 'Not a key'
-                                    END AS key_type
+                                    END AS key_type,
+                                    CASE
+                                        WHEN rku.table_name IS NOT NULL THEN Json_build_object('table_name', rku.table_name, 'column_name', rku.column_name)
+                                        ELSE NULL
+                                    END AS references_target
                         FROM        information_schema.tables t
                         JOIN        information_schema.columns c
                         ON        t.table_name = c.table_name
@@ -386,7 +1195,15 @@ def get_metadata():
                         ON        kcu.constraint_name = tc.constraint_name
                         AND        kcu.table_name = tc.table_name
                         AND        kcu.table_schema = tc.table_schema
-                        WHERE       t.table_schema = 'dc_ai_test'
+                        LEFT JOIN   information_schema.referential_constraints rc
+                        ON        tc.constraint_type = 'FOREIGN KEY'
+                        AND        tc.constraint_name = rc.constraint_name
+                        AND        tc.constraint_schema = rc.constraint_schema
+                        LEFT JOIN   information_schema.key_column_usage rku
+                        ON        rc.unique_constraint_name = rku.constraint_name
+                        AND        rc.unique_constraint_schema = rku.constraint_schema
+                        AND        kcu.position_in_unique_constraint = rku.ordinal_position
+                        WHERE       t.table_schema = %s
                         AND       t.table_type = 'BASE TABLE'
                         ORDER BY    t.table_name,
                                     c.ordinal_position
@@ -395,117 +1212,3039 @@ def get_metadata():
         """
         
         # dc - 2024-12-04 - Execute the metadata query
-        cur.execute(sql_metadata)
-        print('SQL executed successfully')            
+        cur.execute(sql_metadata, (schema_name,))
+        log('metadata_query_done', 'debug', schema=schema_name)
         
         # dc - 2024-12-04 - Convert query results to JSON format
         metadata = json.dumps(cur.fetchall())
         
         # dc - 2024-12-04 - Close cursor to free up database resources
         cur.close()
+
+        # dc - 2026-10-18 - Fingerprint on the same connection so the cache entry and its version match
+        fingerprint = _query_schema_fingerprint(conn, schema_name)
+        
+        # dc - 2026-10-18 - Errors propagate so that a failed load is never cached
+        return fingerprint, metadata
+
+    finally:
+        # dc - 2026-10-18 - Hand the connection back to the pool on every path
+        if conn is not None:
+            pool.putconn(conn)
+
+
+
+def get_schema_fingerprint(schema_name):
+    # dc - 2026-10-18 - Cheap catalog probe used to detect schema changes without re-running the metadata join
+    with get_db_pool().connection() as conn:
+        return _query_schema_fingerprint(conn, schema_name)
+
+
+
+def _query_schema_fingerprint(conn, schema_name):
+    # dc - 2026-10-18 - Hash table, column and constraint definitions straight from pg_catalog
+    sql_fingerprint = """
+        SELECT  md5(
+                    coalesce((
+                        SELECT  string_agg(c.oid || ':' || c.relname || ':' || a.attnum || ':' || a.attname || ':'
+                                           || a.atttypid || ':' || a.atttypmod, ',' ORDER BY c.oid, a.attnum)
+                        FROM        pg_class c
+                        JOIN        pg_namespace n
+                        ON        n.oid = c.relnamespace
+                        JOIN        pg_attribute a
+                        ON        a.attrelid = c.oid
+                        AND       a.attnum > 0
+                        AND       NOT a.attisdropped
+                        WHERE       n.nspname = %s
+                        AND       c.relkind IN ('r', 'p')
+                    ), '')
+                    || '|' ||
+                    coalesce((
+                        SELECT  string_agg(con.conname || ':' || con.contype || ':' || con.conrelid || ':'
+                                           || array_to_string(con.conkey, ' '), ',' ORDER BY con.oid)
+                        FROM        pg_constraint con
+                        JOIN        pg_namespace n
+                        ON        n.oid = con.connamespace
+                        WHERE       n.nspname = %s
+                    ), '')
+                )
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(sql_fingerprint, (schema_name, schema_name))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+
+class SchemaCache:
+    """In-process cache of schema metadata keyed by schema name.
+
+    Entries live for ``ttl`` seconds. Every ``check_interval`` seconds a hit
+    re-checks the catalog fingerprint and reloads the metadata only when the
+    fingerprint has changed.
+    """
+
+    def __init__(self, ttl=SCHEMA_CACHE_TTL, check_interval=SCHEMA_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._entries = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'fingerprint_checks': 0,
+            'invalidations': 0,
+            'loads': 0,
+            'load_failures': 0,
+        }
+
+    def get(self, schema_name, load, fingerprint):
+        entry = self._fresh_entry(schema_name, fingerprint)
+        if entry is not None:
+            return entry['metadata']
+
+        # dc - 2026-10-18 - One loader per schema; concurrent misses wait and reuse its result
+        with self._lock:
+            load_lock = self._load_locks.setdefault(schema_name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(schema_name)
+                if entry is not None and self._alive(entry, time.monotonic()):
+                    self._stats['hits'] += 1
+                    return entry['metadata']
+                self._stats['misses'] += 1
+            try:
+                version, metadata = load()
+            except Exception:
+                with self._lock:
+                    self._stats['load_failures'] += 1
+                raise
+            now = time.monotonic()
+            with self._lock:
+                self._stats['loads'] += 1
+                self._entries[schema_name] = {
+                    'metadata': metadata,
+                    'fingerprint': version,
+                    'loaded_at': now,
+                    'checked_at': now,
+                }
+            return metadata
+
+    def peek(self, schema_name):
+        # dc - 2026-10-18 - Current entry without touching the database or the counters
+        with self._lock:
+            entry = self._entries.get(schema_name)
+            return dict(entry) if entry is not None else None
+
+    def invalidate(self, schema_name=None):
+        with self._lock:
+            if schema_name is None:
+                self._stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(schema_name, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['schemas'] = sorted(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _alive(self, entry, now):
+        return now - entry['loaded_at'] < self.ttl
+
+    def _fresh_entry(self, schema_name, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(schema_name)
+            if entry is None or not self._alive(entry, now):
+                return None
+            if now - entry['checked_at'] < self.check_interval:
+                self._stats['hits'] += 1
+                return entry
+            # dc - 2026-10-18 - Claim the check so concurrent requests keep serving the entry meanwhile
+            entry['checked_at'] = now
+            self._stats['fingerprint_checks'] += 1
+
+        try:
+            version = fingerprint()
+        except Exception as e:
+            # dc - 2026-10-18 - A failed probe keeps the cached metadata; the TTL still bounds staleness
+            log('schema_fingerprint_error', 'error', schema=schema_name, error=str(e))
+            with self._lock:
+                self._stats['hits'] += 1
+            return entry
+
+        with self._lock:
+            if version == entry['fingerprint']:
+                self._stats['hits'] += 1
+                return entry
+            log('schema_changed', schema=schema_name)
+            if self._entries.get(schema_name) is entry:
+                del self._entries[schema_name]
+                self._stats['invalidations'] += 1
+        return None
+
+
+
+schema_cache = SchemaCache()
+
+
+
+def metadata_columns(metadata):
+    # dc - 2026-10-18 - get_metadata returns the json_agg row as [[[column, ...]]]; unwrap it to the column list
+    rows = json.loads(metadata) if metadata else []
+    if not rows or not rows[0] or rows[0][0] is None:
+        return []
+    return rows[0][0]
+
+
+
+def approx_tokens(text):
+    # dc - 2026-10-18 - Roughly four characters per token for English text and SQL identifiers
+    return (len(text) + 3) // 4
+
+
+
+def _index_terms(text):
+    # dc - 2026-10-18 - Split snake_case and camelCase identifiers and fold simple plurals
+    words = re.findall(r'[a-z0-9]+', re.sub(r'([a-z])([A-Z])', r'\1 \2', text).lower())
+    terms = []
+    for word in words:
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+
+class SchemaIndex:
+    """BM25 index over tables built from get_metadata output.
+
+    Each table is a document made of its name (weighted double), column
+    names and optional comments. Foreign-key adjacency comes from a
+    column's ``references`` entry when present, otherwise from naming
+    (``customer_id`` -> ``customer``/``customers`` or a matching PK column).
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, columns):
+        self.tables = OrderedDict()
+        for column in columns:
+            self.tables.setdefault(column['table_name'], []).append(column)
+
+        self.terms = {}
+        for table, table_columns in self.tables.items():
+            terms = _index_terms(table) * 2
+            for column in table_columns:
+                terms += _index_terms(column['column_name'])
+                if column.get('comment'):
+                    terms += _index_terms(column['comment'])
+            self.terms[table] = Counter(terms)
+
+        document_frequency = Counter()
+        for terms in self.terms.values():
+            document_frequency.update(terms.keys())
+        count = len(self.tables)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self.lengths = {table: sum(terms.values()) for table, terms in self.terms.items()}
+        self.average_length = sum(self.lengths.values()) / count if count else 0.0
+        self.neighbours = self._foreign_key_graph()
+        self._fragments = {}
+        self._rendered = {}
+
+    def rank(self, prompt):
+        query = set(_index_terms(prompt))
+        scores = []
+        for table, terms in self.terms.items():
+            score = 0.0
+            norm = self.K1 * (1 - self.B + self.B * self.lengths[table] / self.average_length)
+            for term in query:
+                frequency = terms.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.K1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((score, table))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [(table, score) for score, table in scores]
+
+    def select(self, prompt, top_k=PRUNE_TOP_K, token_budget=PRUNE_TOKEN_BUDGET, min_score=PRUNE_MIN_SCORE,
+               fmt=SCHEMA_FORMAT):
+        # dc - 2026-10-18 - Returns the chosen table names, or None when the match is too weak to trust
+        ranked = self.rank(prompt)
+        if not ranked or ranked[0][1] < min_score:
+            return None
+        scores = dict(ranked)
+        tokens = self.fragments(fmt)[1]
+        chosen = []
+        used = 0
+
+        def add(table):
+            nonlocal used
+            if table in chosen:
+                return
+            if chosen and used + tokens[table] > token_budget:
+                return
+            chosen.append(table)
+            used += tokens[table]
+
+        for table, _ in ranked[:top_k]:
+            add(table)
+        # dc - 2026-10-18 - Pull in join partners of the matched tables so the model can write the joins
+        for table in list(chosen):
+            for neighbour in sorted(self.neighbours[table], key=lambda name: (-scores.get(name, 0.0), name)):
+                add(neighbour)
+        return chosen
+
+    def fragments(self, fmt=SCHEMA_FORMAT):
+        # dc - 2026-10-18 - Serialize each table once per schema version and format; renders reuse the pieces
+        cached = self._fragments.get(fmt)
+        if cached is None:
+            serializer = SCHEMA_SERIALIZERS[fmt]
+            text = OrderedDict((table, serializer.table(table, cols)) for table, cols in self.tables.items())
+            cached = (text, {table: approx_tokens(fragment) for table, fragment in text.items()})
+            self._fragments[fmt] = cached
+        return cached
+
+    def render(self, tables=None, fmt=SCHEMA_FORMAT):
+        # dc - 2026-10-18 - tables=None renders the whole schema, which is cached as well
+        if tables is None:
+            rendered = self._rendered.get(fmt)
+            if rendered is None:
+                rendered = self._rendered[fmt] = self.render(list(self.tables), fmt)
+            return rendered
+        text = self.fragments(fmt)[0]
+        return SCHEMA_SERIALIZERS[fmt].join([text[table] for table in tables])
+
+    def _foreign_key_graph(self):
+        neighbours = {table: set() for table in self.tables}
+        primary_keys = {}
+        for table, table_columns in self.tables.items():
+            for column in table_columns:
+                if column.get('key_type') == 'PK':
+                    primary_keys.setdefault(column['column_name'], set()).add(table)
+        for table, table_columns in self.tables.items():
+            for column in table_columns:
+                if column.get('key_type') != 'FK':
+                    continue
+                targets = set()
+                reference = column.get('references')
+                if reference and reference.get('table_name') in self.tables:
+                    targets.add(reference['table_name'])
+                else:
+                    name = column['column_name']
+                    if name.endswith('_id'):
+                        base = name[:-3]
+                        targets.update(t for t in (base, base + 's', base + 'es') if t in self.tables)
+                    targets.update(primary_keys.get(name, ()))
+                targets.discard(table)
+                for target in targets:
+                    neighbours[table].add(target)
+                    neighbours[target].add(table)
+        return neighbours
+
+
+
+class SchemaSerializer:
+    """Turns one table's get_metadata columns into prompt text.
+
+    ``table`` renders a single table and ``join`` combines rendered tables,
+    so a subset of the schema can be assembled from cached pieces.
+    """
+
+    def table(self, table_name, columns):
+        raise NotImplementedError
+
+    def join(self, fragments):
+        return '\n'.join(fragments)
+
+
+
+class JsonSchemaSerializer(SchemaSerializer):
+    """The original get_metadata JSON: one object per column."""
+
+    def table(self, table_name, columns):
+        return ', '.join(json.dumps({key: value for key, value in column.items() if key != 'references' or value})
+                         for column in columns)
+
+    def join(self, fragments):
+        return '[[[' + ', '.join(fragment for fragment in fragments if fragment) + ']]]'
+
+
+
+_TYPE_ABBREVIATIONS = {
+    'character varying': 'varchar',
+    'character': 'char',
+    'timestamp without time zone': 'timestamp',
+    'timestamp with time zone': 'timestamptz',
+    'time without time zone': 'time',
+    'time with time zone': 'timetz',
+    'double precision': 'float8',
+}
+
+
+
+def _column_type(column):
+    data_type = column.get('data_type') or ''
+    short = _TYPE_ABBREVIATIONS.get(data_type, data_type)
+    # dc - 2026-10-18 - Only lengths and numeric precision carry meaning; integer precision is noise
+    if column.get('size') is not None and data_type in ('character varying', 'character', 'numeric'):
+        return '%s(%s)' % (short, column['size'])
+    return short
+
+
+
+def _column_key(column):
+    if column.get('key_type') == 'PK':
+        return 'PK'
+    if column.get('key_type') == 'FK':
+        reference = column.get('references')
+        if reference:
+            return 'FK->%s.%s' % (reference['table_name'], reference['column_name'])
+        return 'FK'
+    return ''
+
+
+
+class CompactSchemaSerializer(SchemaSerializer):
+    """DDL-like listing, one line per table: orders(order_id integer PK, customer_id integer FK->customers.customer_id)."""
+
+    def table(self, table_name, columns):
+        parts = []
+        for column in columns:
+            key = _column_key(column)
+            parts.append(' '.join(part for part in (column['column_name'], _column_type(column), key) if part))
+        return '%s(%s)' % (table_name, ', '.join(parts))
+
+
+
+class ColumnarSchemaSerializer(SchemaSerializer):
+    """Per-table column and type lists followed by PK/FK annotations."""
+
+    def table(self, table_name, columns):
+        lines = [
+            'table ' + table_name,
+            '  columns: ' + ', '.join(column['column_name'] for column in columns),
+            '  types: ' + ', '.join(_column_type(column) for column in columns),
+        ]
+        primary = [column['column_name'] for column in columns if column.get('key_type') == 'PK']
+        if primary:
+            lines.append('  pk: ' + ', '.join(primary))
+        foreign = [column['column_name'] + ' ' + _column_key(column) for column in columns if column.get('key_type') == 'FK']
+        if foreign:
+            lines.append('  fk: ' + ', '.join(foreign))
+        return '\n'.join(lines)
+
+
+
+SCHEMA_SERIALIZERS = {
+    'json': JsonSchemaSerializer(),
+    'compact': CompactSchemaSerializer(),
+    'columnar': ColumnarSchemaSerializer(),
+}
+
+
+
+_schema_index = (None, None)
+_schema_index_lock = threading.Lock()
+_pruning_stats = {
+    'requests': 0,
+    'pruned': 0,
+    'fallbacks': 0,
+    'full_schema_tokens': 0,
+    'prompt_schema_tokens': 0,
+}
+
+
+
+def get_schema_index(metadata):
+    # dc - 2026-10-18 - Rebuild the index only when get_metadata hands back a different schema
+    global _schema_index
+    key, index = _schema_index
+    if key is not metadata:
+        index = SchemaIndex(metadata_columns(metadata))
+        with _schema_index_lock:
+            _schema_index = (metadata, index)
+    return index
+
+
+
+def prompt_schema(input_prompt, metadata, fmt=SCHEMA_FORMAT):
+    # dc - 2026-10-18 - Schema text for the Bedrock prompt in the configured format, pruned when enabled
+    if not metadata:
+        return metadata
+    if SCHEMA_PRUNING:
+        return prune_schema(input_prompt, metadata, fmt)
+    return get_schema_index(metadata).render(fmt=fmt)
+
+
+
+def prune_schema(input_prompt, metadata, fmt=SCHEMA_FORMAT):
+    if not metadata:
+        return metadata
+    index = get_schema_index(metadata)
+    tables = index.select(input_prompt, fmt=fmt)
+    full = index.render(fmt=fmt)
+    pruned = index.render(tables, fmt) if tables else full
+    full_tokens = approx_tokens(full)
+    with _schema_index_lock:
+        _pruning_stats['requests'] += 1
+        _pruning_stats['pruned' if tables else 'fallbacks'] += 1
+        _pruning_stats['full_schema_tokens'] += full_tokens
+        _pruning_stats['prompt_schema_tokens'] += approx_tokens(pruned)
+    log('schema_pruned', tables=tables if tables else 'all (low confidence)', tokens=approx_tokens(pruned), full_tokens=full_tokens)
+    return pruned
+
+
+
+def pruning_stats():
+    with _schema_index_lock:
+        stats = dict(_pruning_stats)
+    full = stats['full_schema_tokens']
+    stats['token_reduction'] = 1 - stats['prompt_schema_tokens'] / full if full else 0.0
+    return stats
+
+
+
+# dc - 2026-10-18 - Prompt values: quoted strings (apostrophes inside words are not quotes), numbers and words
+_PROMPT_VALUE_PATTERN = re.compile(r"""(?<!\w)'(?P<single>[^']*)'(?!\w)|"(?P<double>[^"]*)"|(?P<number>\d+(?:\.\d+)?)|(?P<word>[A-Za-z_][A-Za-z0-9_]*)""")
+
+# dc - 2026-10-18 - Month names and abbreviations mapped to their number
+_MONTHS = {'sept': 9}
+for _number, _name in enumerate(['january', 'february', 'march', 'april', 'may', 'june', 'july',
+                                 'august', 'september', 'october', 'november', 'december'], 1):
+    _MONTHS[_name] = _MONTHS[_name[:3]] = _number
+
+# dc - 2026-10-18 - Year-month of date literals whose day exists in every month, days that do not, and literals that are
+# a date or timestamp as a whole
+_DATE_MONTH_PATTERN = re.compile(r'(?<!\d)(\d{4})-(\d{2})(?=-(?:0[1-9]|1\d|2[0-8])(?!\d)|(?![\d-]))')
+_DATE_LATE_DAY_PATTERN = re.compile(r'(?<!\d)\d{4}-\d{2}-(?:29|30|31)(?!\d)')
+_DATE_LITERAL_PATTERN = re.compile(r'\d{4}-\d{2}(?:-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?)?')
+
+Example = namedtuple('Example', ['prompt', 'sql', 'similarity'])
+
+
+
+def _prompt_tokens(text):
+    tokens = []
+    for match in _PROMPT_VALUE_PATTERN.finditer(text):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ('single', 'double'):
+            kind = 'string'
+        elif kind == 'word' and value.lower() in _MONTHS:
+            kind = 'month'
+        tokens.append((kind, value))
+    return tokens
+
+
+
+def import_numpy():
+    # dc - 2026-10-18 - Bind the module-level numpy on first use; raises ImportError when it is not installed
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+
+
+def embed_prompt(text, dimensions=EXAMPLE_DIMENSIONS):
+    # dc - 2026-10-18 - Hashed bag of words and word pairs; values are masked so "sales for March" matches "sales for April"
+    import_numpy()
+    terms = []
+    for kind, value in _prompt_tokens(text):
+        terms.extend(_index_terms(value) if kind == 'word' else ['<%s>' % kind])
+    features = terms + [first + ' ' + second for first, second in zip(terms, terms[1:])]
+    vector = numpy.zeros(dimensions, dtype=numpy.float32)
+    if features:
+        hashes = numpy.array([zlib.crc32(feature.encode('utf-8')) for feature in features], dtype=numpy.uint32)
+        numpy.add.at(vector, hashes % dimensions, numpy.where(hashes & 0x80000000, 1.0, -1.0).astype(numpy.float32))
+        norm = numpy.linalg.norm(vector)
+        if norm:
+            vector /= norm
+    return vector
+
+
+
+def _match_case(template, word):
+    if template.isupper():
+        return word.upper()
+    if template.islower():
+        return word.lower()
+    if template.istitle():
+        return word.title()
+    return word
+
+
+
+def _shift_month(found, delta):
+    months = int(found.group(1)) * 12 + int(found.group(2)) - 1 + delta
+    return '%04d-%02d' % (months // 12, months % 12 + 1)
+
+
+
+def _substitute_token(kind, value, change, since_month, month_delta):
+    # dc - 2026-10-18 - The SQL token with one change applied to its original text, the token unchanged when the change
+    # does not apply, or None when it cannot be applied safely
+    change_kind, old_value, new_value = change
+    if kind == 'string' and value.startswith("'"):
+        text = value[1:-1].replace("''", "'")
+        if change_kind == 'month':
+            # dc - 2026-10-18 - Only a literal that is a date as a whole is shifted, and only when the day exists in every month
+            if text.lower() == old_value.lower():
+                return "'%s'" % _match_case(text, new_value)
+            if not _DATE_LITERAL_PATTERN.fullmatch(text):
+                return value
+            if _DATE_LATE_DAY_PATTERN.search(text):
+                return None
+            return "'%s'" % _DATE_MONTH_PATTERN.sub(lambda found: _shift_month(found, month_delta), text)
+        if change_kind in ('string', 'word') and text.lower() == old_value.lower():
+            return "'%s'" % _match_case(text, new_value).replace("'", "''")
+    elif kind == 'number' and change_kind == 'number' and value == old_value:
+        return new_value
+    elif kind == 'number' and change_kind == 'month' and since_month is not None and since_month <= 6 \
+            and value == str(_MONTHS[old_value.lower()]):
+        # dc - 2026-10-18 - EXTRACT(MONTH FROM order_date) = 3 or date_part('month', order_date) = 3
+        return str(_MONTHS[new_value.lower()])
+    return value
+
+
+
+def substitute_parameters(example_prompt, example_sql, input_prompt):
+    # dc - 2026-10-18 - The example's SQL with the new prompt's values swapped in; None unless the prompts differ
+    # only in values (numbers, quoted strings, months, words quoted in the SQL) and every changed value is found
+    old_tokens = _prompt_tokens(example_prompt)
+    new_tokens = _prompt_tokens(input_prompt)
+    if len(old_tokens) != len(new_tokens):
+        return None
+    changes = []
+    for (old_kind, old_value), (new_kind, new_value) in zip(old_tokens, new_tokens):
+        if old_kind != new_kind:
+            return None
+        if old_value == new_value or old_kind == 'month' and _MONTHS[old_value.lower()] == _MONTHS[new_value.lower()]:
+            continue
+        changes.append((old_kind, old_value, new_value))
+    if not changes:
+        return example_sql
+    month_delta = 0
+    for kind, old_value, new_value in changes:
+        # dc - 2026-10-18 - A changed value that occurs twice in the example prompt has no single place in the SQL
+        if sum(1 for token in old_tokens if token[1].lower() == old_value.lower()) > 1:
+            return None
+        if kind == 'month':
+            # dc - 2026-10-18 - Date literals are shifted as a whole, which is only unambiguous with one month in the prompt
+            if sum(1 for token in old_tokens if token[0] == 'month') > 1:
+                return None
+            month_delta = _MONTHS[new_value.lower()] - _MONTHS[old_value.lower()]
+    numbers = [re.compile(r'(?<![\d.])%s(?![\d.])' % re.escape(old_value)) for kind, old_value, _ in changes if kind == 'number']
+
+    # dc - 2026-10-18 - One pass over the SQL: every token is rewritten at most once, from its original text, so one
+    # substitution can never feed another (10 -> 20 after 5 -> 10), and text inside literals is never edited piecemeal
+    counts = [0] * len(changes)
+    pieces = []
+    end = 0
+    since_month = None
+    for match in _SQL_TOKEN_PATTERN.finditer(example_sql):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'word' and value.lower() == 'month' or kind == 'string' and value.lower() == "'month'":
+            since_month = 0
+        elif since_month is not None:
+            since_month += 1
+        # dc - 2026-10-18 - A changed number that also appears inside a literal (a date, a code) plays two roles
+        if kind in ('string', 'dollar', 'ident') and any(number.search(value) for number in numbers):
+            return None
+        replaced = value
+        for index, change in enumerate(changes):
+            candidate = _substitute_token(kind, value, change, since_month, month_delta)
+            if candidate is None:
+                return None
+            if candidate != value:
+                if replaced != value:
+                    return None
+                replaced = candidate
+                counts[index] += 1
+        pieces.append(example_sql[end:match.start(kind)] + replaced)
+        end = match.end()
+    # dc - 2026-10-18 - Every changed value must be found, and anything but a month shift exactly once
+    for (kind, _, _), found in zip(changes, counts):
+        if found == 0 or found > 1 and kind != 'month':
+            return None
+    pieces.append(example_sql[end:])
+    return ''.join(pieces)
+
+
+
+class ExampleStore:
+    """Prompt/SQL pairs that ran successfully, searchable by prompt similarity.
+
+    Embeddings are rows of a float32 matrix of ``capacity`` x ``dimensions``,
+    memory-mapped from ``<path>/vectors.f32`` so worker processes share one
+    copy and it survives restarts; prompts and SQL live in
+    ``<path>/examples.sqlite``, whose write lock also serializes writers.
+    A row becomes visible once its SQLite record is committed, which
+    happens after its vector is written. When full, the oldest row is
+    reused. Examples only match prompts against the schema fingerprint
+    they ran on. Without a path both parts are kept in memory.
+    """
+
+    def __init__(self, path=EXAMPLE_STORE_PATH, capacity=EXAMPLE_CAPACITY, dimensions=EXAMPLE_DIMENSIONS):
+        import_numpy()
+        self.path = path
+        self.capacity = capacity
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, 'examples.sqlite') if path else ':memory:',
+                                   isolation_level=None, check_same_thread=False)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS examples (id INTEGER PRIMARY KEY, slot INTEGER NOT NULL, '
+                         'key TEXT NOT NULL UNIQUE, fingerprint TEXT NOT NULL, prompt TEXT NOT NULL, sql TEXT NOT NULL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._vectors = self._open_vectors()
+        self._slots = {}
+        self._keys = {}
+        self._groups = numpy.full(capacity, -1, dtype=numpy.int32)
+        self._group_codes = {}
+        self._last_id = 0
+        self._stats = {
+            'searches': 0,
+            'added': 0,
+            'duplicates': 0,
+            'few_shot': 0,
+            'reused': 0,
+            'reuse_misses': 0,
+        }
+
+    def search(self, prompt, fingerprint, k=FEW_SHOT_K):
+        vector = embed_prompt(prompt, self.dimensions)
+        with self._lock:
+            self._refresh()
+            self._stats['searches'] += 1
+            group = self._group_codes.get(fingerprint)
+            if group is None or k <= 0:
+                return []
+            other = self._groups != group
+        # dc - 2026-10-18 - One matrix-vector product over the mapped rows; rows are unit length, so this is cosine similarity
+        scores = self._vectors @ vector
+        scores[other] = -numpy.inf
+        top = numpy.argpartition(-scores, k - 1)[:k] if k < len(scores) else numpy.arange(len(scores))
+        top = top[numpy.argsort(-scores[top])]
+        examples = []
+        with self._lock:
+            for slot in top:
+                entry = self._slots.get(int(slot))
+                if entry is None or scores[slot] == -numpy.inf:
+                    continue
+                examples.append(Example(entry[1], entry[2], float(scores[slot])))
+        return examples
+
+    def add(self, prompt, sql, fingerprint):
+        key = hashlib.sha256('\0'.join([fingerprint, ' '.join(prompt.split()).casefold()]).encode('utf-8')).hexdigest()
+        vector = embed_prompt(prompt, self.dimensions)
+        with self._lock:
+            self._refresh()
+            if key in self._keys:
+                self._stats['duplicates'] += 1
+                return False
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if self._db.execute('SELECT 1 FROM examples WHERE key = ?', (key,)).fetchone() is not None:
+                    self._db.execute('ROLLBACK')
+                    self._stats['duplicates'] += 1
+                    return False
+                row_id = self._db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM examples').fetchone()[0]
+                slot = (row_id - 1) % self.capacity
+                # dc - 2026-10-18 - The mapping is shared, so other workers see the vector at once; the kernel writes it back
+                self._vectors[slot] = vector
+                self._db.execute('DELETE FROM examples WHERE slot = ?', (slot,))
+                self._db.execute('INSERT INTO examples (id, slot, key, fingerprint, prompt, sql) VALUES (?, ?, ?, ?, ?, ?)',
+                                 (row_id, slot, key, fingerprint, prompt, sql))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._refresh()
+            self._stats['added'] += 1
+        return True
+
+    def record(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            stats = dict(self._stats)
+            stats['entries'] = len(self._slots)
+        stats['capacity'] = self.capacity
+        stats['dimensions'] = self.dimensions
+        stats['persistent'] = bool(self.path)
+        return stats
+
+    def _open_vectors(self):
+        if not self.path:
+            return numpy.zeros((self.capacity, self.dimensions), dtype=numpy.float32)
+        filename = os.path.join(self.path, 'vectors.f32')
+        shape = '%dx%d' % (self.capacity, self.dimensions)
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'shape'").fetchone()
+            if row is None or row[0] != shape or not os.path.exists(filename):
+                # dc - 2026-10-18 - Vectors of another capacity or dimension cannot be reused; start an empty store
+                self._db.execute('DELETE FROM examples')
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('shape', ?)", (shape,))
+                vectors = numpy.memmap(filename, dtype=numpy.float32, mode='w+', shape=(self.capacity, self.dimensions))
+            else:
+                vectors = numpy.memmap(filename, dtype=numpy.float32, mode='r+', shape=(self.capacity, self.dimensions))
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        return vectors
+
+    def _refresh(self):
+        # dc - 2026-10-18 - Caller must hold self._lock; picks up rows other workers committed since the last call
+        rows = self._db.execute('SELECT id, slot, key, fingerprint, prompt, sql FROM examples WHERE id > ? ORDER BY id',
+                                (self._last_id,)).fetchall()
+        for row_id, slot, key, fingerprint, prompt, sql in rows:
+            previous = self._slots.get(slot)
+            if previous is not None:
+                self._keys.pop(previous[0], None)
+            self._slots[slot] = (key, prompt, sql)
+            self._keys[key] = slot
+            self._groups[slot] = self._group_codes.setdefault(fingerprint, len(self._group_codes))
+            self._last_id = row_id
+
+
+
+_example_store = None
+_example_store_lock = threading.Lock()
+_numpy_missing = False
+
+
+
+def get_example_store():
+    # dc - 2026-10-18 - Opened on first use; None when disabled or numpy is not installed
+    global _example_store, _numpy_missing
+    if _example_store is None and EXAMPLES_ENABLED and not _numpy_missing:
+        with _example_store_lock:
+            if _example_store is None and not _numpy_missing:
+                try:
+                    import_numpy()
+                except ImportError:
+                    _numpy_missing = True
+                    return None
+                _example_store = ExampleStore()
+    return _example_store
+
+
+
+def find_examples(input_prompt, schema_name=SCHEMA_NAME):
+    # dc - 2026-10-18 - Most similar earlier prompts for the current schema, best first
+    try:
+        store = get_example_store()
+        if store is None:
+            return []
+        examples = store.search(input_prompt, schema_fingerprint(schema_name))
+    except Exception as e:
+        log('example_store_error', 'error', operation='search', error=str(e))
+        return []
+    return [example for example in examples if example.similarity >= FEW_SHOT_MIN_SIMILARITY]
+
+
+
+def reuse_example(input_prompt, examples, threshold=EXAMPLE_REUSE_THRESHOLD):
+    # dc - 2026-10-18 - SQL of a near-identical earlier prompt with this prompt's values substituted, or None
+    if not examples or examples[0].similarity < threshold:
+        return None
+    store = get_example_store()
+    best = examples[0]
+    # dc - 2026-10-18 - Re-score from the stored text in case another worker recycled the row during the search
+    if float(embed_prompt(best.prompt, store.dimensions) @ embed_prompt(input_prompt, store.dimensions)) < threshold:
+        return None
+    sql = substitute_parameters(best.prompt, best.sql, input_prompt)
+    if sql is None:
+        store.record('reuse_misses')
+        return None
+    store.record('reused')
+    log('example_reused', example=best.prompt, similarity=round(best.similarity, 3))
+    return sql
+
+
+
+def record_example(input_prompt, details, result):
+    # dc - 2026-10-18 - Only SQL that ran without an error becomes an example; rejections and failures are skipped
+    if not result or not result[0] or result[0] == ['Error message'] or 'sql' not in details:
+        return
+    try:
+        store = get_example_store()
+        if store is not None:
+            store.add(input_prompt, details['sql'], schema_fingerprint())
+    except Exception as e:
+        log('example_store_error', 'error', operation='write', error=str(e))
+
+
+
+_aws_clients = {}
+_aws_clients_lock = threading.Lock()
+
+
+
+def get_aws_client(service_name, region_name=AWS_REGION):
+    # dc - 2026-10-18 - boto3 clients are thread-safe, so build each one once per process and share it
+    key = (service_name, region_name)
+    client = _aws_clients.get(key)
+    if client is None:
+        with _aws_clients_lock:
+            client = _aws_clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.client(service_name, region_name=region_name)
+                _aws_clients[key] = client
+    return client
+
+
+
+def set_aws_client(service_name, client, region_name=AWS_REGION):
+    # dc - 2026-10-18 - Register a prebuilt client, e.g. one wrapped in a botocore Stubber
+    with _aws_clients_lock:
+        _aws_clients[(service_name, region_name)] = client
+
+
+
+class SecretCache:
+    """Caches Secrets Manager secret strings for ``ttl`` seconds.
+
+    ``get(..., force_refresh=True)`` bypasses the cache, which is how a
+    rotated password is picked up after an authentication failure.
+    """
+
+    def __init__(self, client_factory=lambda: get_aws_client('secretsmanager'), ttl=SECRET_CACHE_TTL):
+        self._client_factory = client_factory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {'hits': 0, 'fetches': 0, 'forced_refreshes': 0}
+
+    def get(self, secret_id, force_refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(secret_id)
+            if entry is not None and not force_refresh and now - entry[1] < self.ttl:
+                self._stats['hits'] += 1
+                return entry[0]
+
+            # dc - 2026-10-18 - Fetch under the lock so a rotation triggers a single Secrets Manager call
+            response = self._client_factory().get_secret_value(SecretId=secret_id)
+            self._entries[secret_id] = (response['SecretString'], time.monotonic())
+            self._stats['fetches'] += 1
+            if force_refresh:
+                self._stats['forced_refreshes'] += 1
+            return response['SecretString']
+
+    def invalidate(self, secret_id=None):
+        with self._lock:
+            if secret_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(secret_id, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+
+secret_cache = SecretCache()
+
+
+
+def get_db_credentials(force_refresh=False):
+    try:
+        # dc - 2026-10-18 - Retrieve the AuroraAI secret through the cache instead of calling Secrets Manager each time
+        with stage('credentials'):
+            secret_string = secret_cache.get(SECRET_ID, force_refresh=force_refresh)
         
-        # dc - 2024-12-04 - Return both the database connection and metadata
-        return conn, metadata
+        # dc - 2024-12-04 - Parse the secret string into a Python dictionary
+        secret_dict = json.loads(secret_string)
         
+        # dc - 2024-12-04 - Return formatted credentials dictionary for database connection
+        return {
+            'db_name': secret_dict['DB_NAME'],
+            'db_user': secret_dict['DB_USER'],
+            'db_password': secret_dict['DB_PASSWORD'],
+            'db_host': secret_dict['DB_HOST'],
+            'db_port': secret_dict['DB_PORT']
+        }
     except Exception as e:
-        # dc - 2024-12-04 - Log and handle any database connection or query errors
-        print(f"Error: {str(e)}")
+        # dc - 2024-12-04 - Log any errors in retrieving or processing credentials
+        log('secret_error', 'error', error=str(e))
+        return None
+
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are created lazily through ``connect`` up to ``max_size``,
+    validated on checkout and recycled once they exceed ``max_age`` seconds of
+    life or ``max_idle`` seconds without use.
+    """
+
+    def __init__(self, connect, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 max_age=POOL_MAX_AGE, max_idle=POOL_MAX_IDLE,
+                 ping_after=POOL_PING_AFTER, checkout_timeout=POOL_CHECKOUT_TIMEOUT):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError('Invalid pool size: min_size=%s max_size=%s' % (min_size, max_size))
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        # dc - 2026-10-18 - Idle connections as [conn, created_at, last_used], most recently used last
+        self._idle = []
+        self._created_at = {}
+        self._generation_of = {}
+        self._generation = 0
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'connections_discarded': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def warm(self):
+        # dc - 2026-10-18 - Open connections up to min_size so the first requests skip connection setup
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                now = time.monotonic()
+                self._idle.append([conn, self._created_at[id(conn)], now])
+                self._cond.notify()
+
+    def getconn(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout('Connection pool is closed')
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        now = time.monotonic()
+                        if self._expired(created_at, last_used, now):
+                            self._drop(conn, 'connections_recycled')
+                            conn = None
+                            continue
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['checkout_failures'] += 1
+                        raise PoolTimeout('Timed out after %.1fs waiting for a database connection' % timeout)
+                    self._cond.wait(remaining)
+
+            # dc - 2026-10-18 - Connect and health-check outside the lock so other threads are not blocked
+            if create:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._stats['checkout_failures'] += 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, now - last_used):
+                with self._cond:
+                    self._drop(conn, 'connections_discarded')
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        # dc - 2026-10-18 - Leave the connection clean for the next borrower, or throw it away if that fails
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception as e:
+                log('pool_discard', 'warning', error=str(e))
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            created_at = self._created_at.get(id(conn), 0.0)
+            stale = self._generation_of.get(id(conn)) != self._generation
+            now = time.monotonic()
+            if discard or conn.closed or self._closed or stale or now - created_at > self.max_age:
+                self._drop(conn, 'connections_recycled' if not discard and not conn.closed else 'connections_discarded')
+            else:
+                self._idle.append([conn, created_at, now])
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def recycle(self):
+        # dc - 2026-10-18 - Close idle connections now and borrowed ones when they come back, e.g. after credential rotation
+        with self._cond:
+            self._generation += 1
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._drop(conn, 'connections_recycled')
+            self._cond.notify_all()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._drop(conn, 'connections_recycled')
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._generation_of[id(conn)] = self._generation
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _expired(self, created_at, last_used, now):
+        if now - created_at > self.max_age:
+            return True
+        # dc - 2026-10-18 - Idle recycling never shrinks the pool below min_size
+        return now - last_used > self.max_idle and self._size > self.min_size
+
+    def _healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        # dc - 2026-10-18 - Only pay for a round trip when the connection has been idle long enough to go stale
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            log('pool_health_check_failed', 'warning', error=str(e))
+            return False
+
+    def _drop(self, conn, reason):
+        # dc - 2026-10-18 - Caller must hold self._cond
+        self._size -= 1
+        self._created_at.pop(id(conn), None)
+        self._generation_of.pop(id(conn), None)
+        self._stats[reason] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+
+def connect_to_database(host=None, port=None):
+    # dc - 2024-12-04 - Get database connection credentials from secure storage
+    credentials = get_db_credentials()
+    if credentials is None:
+        raise RuntimeError('Database credentials are not available')
+
+    try:
+        # dc - 2026-10-18 - host and port select a reader; the credentials are shared by every instance of the cluster
+        return _connect_with(credentials, host, port)
+    except psycopg2.OperationalError as e:
+        if not _is_auth_failure(e):
+            raise
+        # dc - 2026-10-18 - The secret may have been rotated: refetch it once and retry with the new password
+        log('db_auth_failed', 'warning', action='refreshing credentials')
+        refreshed = get_db_credentials(force_refresh=True)
+        if refreshed is None or refreshed == credentials:
+            raise
+        conn = _connect_with(refreshed, host, port)
+        # dc - 2026-10-18 - Retire connections opened with the old credentials
+        recycle_pools()
+        return conn
+
+
+
+# dc - 2026-10-18 - Driver used to open new connections; set_db_connect swaps it, e.g. for fakes.FakeDatabase
+_db_connect = psycopg2.connect
+
+
+
+def set_db_connect(connect):
+    global _db_connect
+    _db_connect = connect
+    # dc - 2026-10-18 - Retire connections opened through the previous driver
+    recycle_pools()
+
+
+
+def _connect_with(credentials, host=None, port=None):
+    # dc - 2024-12-04 - Establish connection to PostgreSQL database using credentials
+    return _db_connect(
+        dbname=credentials['db_name'],
+        user=credentials['db_user'],
+        password=credentials['db_password'],
+        host=host or credentials['db_host'],
+        port=port or credentials['db_port']
+    )
+
+
+
+def _is_auth_failure(error):
+    # dc - 2026-10-18 - Connection-time errors carry no SQLSTATE, so match the server message as well
+    message = str(error).lower()
+    return getattr(error, 'pgcode', None) == '28P01' or 'password authentication failed' in message
+
+
+
+def get_db_pool():
+    # dc - 2026-10-18 - Create the process-wide pool on first use so importing the module stays offline
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(connect_to_database)
+    return _db_pool
+
+
+
+# dc - 2026-10-18 - Replication lag in seconds: Aurora's own report first, then a streaming replica's replay delay,
+# which is 0 when everything received has been replayed so an idle primary does not look behind
+REPLICA_LAG_QUERIES = (
+    'SELECT replica_lag_in_msec / 1000.0 FROM aurora_replica_status() WHERE server_id = aurora_db_instance_identifier()',
+    """
+        SELECT  CASE
+                    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+    """,
+)
+
+
+
+def parse_host(item):
+    # dc - 2026-10-18 - "host[:port]" as (host, port); a missing port is None, meaning the port from the secret
+    host, _, port = item.rpartition(':') if ':' in item else (item, '', '')
+    return host, int(port) if port else None
+
+
+
+def reader_pools(hosts):
+    # dc - 2026-10-18 - One pool per "host[:port]" in a comma-separated list, named by the item
+    pools = []
+    for item in hosts.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, port = parse_host(item)
+        pools.append((item, ConnectionPool(lambda host=host, port=port: connect_to_database(host, port))))
+    return pools
+
+
+
+class Endpoint:
+    """One database instance: its connection pool and the health the router tracks for it."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.outstanding = 0
+        self.latency = None
+        self.healthy = True
+        self.lag = None
+        self.failures = 0
+        self.successes = 0
+        self.checked_at = float('-inf')
+        self.checking = False
+        self.lag_query = 0
+        self.checkouts = 0
+        self.ejections = 0
+        self.readmissions = 0
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'lag_seconds': self.lag,
+            'outstanding': self.outstanding,
+            'latency_ms': round(self.latency * 1000, 2) if self.latency is not None else None,
+            'checkouts': self.checkouts,
+            'ejections': self.ejections,
+            'readmissions': self.readmissions,
+            'pool': self.pool.stats(),
+        }
+
+
+
+class ReplicaRouter:
+    """Spreads read-only queries over reader endpoints, each with its own ConnectionPool.
+
+    Has the getconn/putconn/connection interface of ConnectionPool. A
+    reader is picked by fewest outstanding borrows ('least_outstanding') or
+    by outstanding borrows weighted with a moving average of how long each
+    borrow lasted ('latency'). Every ``check_interval`` seconds each
+    reader's replication lag is measured in the background; a reader is
+    ejected after ``eject_after`` failed or lagging checks or checkouts in a
+    row and re-admitted after ``readmit_after`` good checks. With no
+    healthy reader, queries go to the writer.
+
+    Callers with their own driver (asgi.py) route with ``choose()``,
+    ``checkout_failed()``, ``checked_out()`` and ``release()`` and open
+    connections to the chosen endpoint's name themselves.
+    """
+
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, writer_pool, readers, policy=READER_POLICY, max_lag=READER_MAX_LAG,
+                 check_interval=READER_CHECK_INTERVAL, eject_after=READER_EJECT_AFTER, readmit_after=READER_READMIT_AFTER):
+        if policy not in ('least_outstanding', 'latency'):
+            raise ValueError('Unknown reader policy: %s' % policy)
+        self.policy = policy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self.writer = Endpoint('writer', writer_pool)
+        self.readers = [Endpoint(name, pool) for name, pool in readers]
+        self._lock = threading.Lock()
+        self._borrowed = {}
+        self._checker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='auroraai-replica-check')
+        self._writer_fallbacks = 0
+
+    def getconn(self, timeout=None):
+        endpoint = self.choose()
+        try:
+            conn = endpoint.pool.getconn(timeout)
+        except Exception as e:
+            endpoint = self.checkout_failed(endpoint, e, busy=isinstance(e, PoolTimeout))
+            try:
+                conn = endpoint.pool.getconn(timeout)
+            except Exception:
+                self.release(endpoint)
+                raise
+        with self._lock:
+            self._borrowed[id(conn)] = (endpoint, time.monotonic())
+            endpoint.checkouts += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._lock:
+            endpoint, borrowed_at = self._borrowed.pop(id(conn))
+        self.release(endpoint, time.monotonic() - borrowed_at)
+        endpoint.pool.putconn(conn, discard)
+
+    def choose(self):
+        # dc - 2026-10-18 - Endpoint for the next query, counted as outstanding until release()
+        self._schedule_checks()
+        return self._choose()
+
+    def checkout_failed(self, endpoint, error, busy=False):
+        # dc - 2026-10-18 - Give up a reader that could not lend a connection and fall back to the writer; a busy
+        # reader is skipped for this query, one that cannot connect also counts against it. Re-raises for the writer
+        self.release(endpoint)
+        if endpoint is self.writer:
+            raise error
+        log('replica_checkout_failed', 'warning', endpoint=endpoint.name, error=str(error))
+        if not busy:
+            self._record(endpoint, False)
+        return self._choose(self.writer)
+
+    def checked_out(self, endpoint):
+        with self._lock:
+            endpoint.checkouts += 1
+
+    def release(self, endpoint, held=None):
+        # dc - 2026-10-18 - held is how long the connection was borrowed; None when it never was
+        with self._lock:
+            endpoint.outstanding -= 1
+            if held is None:
+                return
+            if endpoint.latency is None:
+                endpoint.latency = held
+            else:
+                endpoint.latency += self.LATENCY_SMOOTHING * (held - endpoint.latency)
+
+    def endpoint_lag(self, endpoint):
+        # dc - 2026-10-18 - Last measured lag behind the writer; None if not measured yet
+        return 0.0 if endpoint is self.writer else endpoint.lag
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def pool_of(self, conn):
+        # dc - 2026-10-18 - The pool of the instance a borrowed connection points at, e.g. for pg_cancel_backend
+        with self._lock:
+            return self._borrowed[id(conn)][0].pool
+
+    def lag_of(self, conn):
+        # dc - 2026-10-18 - Last measured lag behind the writer of a borrowed connection's instance; None if not measured yet
+        with self._lock:
+            endpoint = self._borrowed[id(conn)][0]
+            return self.endpoint_lag(endpoint)
+
+    def recycle(self):
+        for endpoint in self.readers:
+            endpoint.pool.recycle()
+
+    def closeall(self):
+        for endpoint in self.readers:
+            endpoint.pool.closeall()
+
+    def check(self, endpoint):
+        # dc - 2026-10-18 - Measure one reader's lag; errors and excessive lag both count as failed checks
+        lag = None
+        try:
+            with endpoint.pool.connection() as conn:
+                lag = self._measure_lag(endpoint, conn)
+            ok = lag <= self.max_lag
+        except Exception as e:
+            log('replica_check_failed', 'warning', endpoint=endpoint.name, error=str(e))
+            ok = False
+        with self._lock:
+            endpoint.lag = lag
+            endpoint.checked_at = time.monotonic()
+            endpoint.checking = False
+        self._record(endpoint, ok)
+        return ok
+
+    def stats(self):
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'writer_fallbacks': self._writer_fallbacks,
+                'writer': self.writer.describe(),
+                'readers': [endpoint.describe() for endpoint in self.readers],
+            }
+
+    def _choose(self, endpoint=None):
+        with self._lock:
+            if endpoint is None:
+                healthy = [reader for reader in self.readers if reader.healthy]
+                if healthy:
+                    endpoint = min(healthy, key=lambda reader: (self._load(reader), random.random()))
+                else:
+                    endpoint = self.writer
+            if endpoint is self.writer:
+                self._writer_fallbacks += 1
+            endpoint.outstanding += 1
+        return endpoint
+
+    def _load(self, endpoint):
+        # dc - 2026-10-18 - Caller must hold self._lock; readers without a latency sample yet score 0 to get one
+        if self.policy == 'latency':
+            return (endpoint.outstanding + 1) * (endpoint.latency or 0.0)
+        return endpoint.outstanding
+
+    def _record(self, endpoint, ok):
+        with self._lock:
+            if ok:
+                endpoint.failures = 0
+                endpoint.successes += 1
+                changed = not endpoint.healthy and endpoint.successes >= self.readmit_after
+                if changed:
+                    endpoint.healthy = True
+                    endpoint.readmissions += 1
+            else:
+                endpoint.successes = 0
+                endpoint.failures += 1
+                changed = endpoint.healthy and endpoint.failures >= self.eject_after
+                if changed:
+                    endpoint.healthy = False
+                    endpoint.ejections += 1
+        if changed:
+            log('replica_readmitted' if ok else 'replica_ejected', 'info' if ok else 'warning',
+                endpoint=endpoint.name, lag_seconds=endpoint.lag)
+            if not ok:
+                # dc - 2026-10-18 - Idle connections to an ejected reader are likely broken; open fresh ones on re-admission
+                endpoint.pool.recycle()
+
+    def _schedule_checks(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [reader for reader in self.readers
+                   if not reader.checking and now - reader.checked_at >= self.check_interval]
+            for reader in due:
+                reader.checking = True
+        for reader in due:
+            self._checker.submit(self.check, reader)
+
+    def _measure_lag(self, endpoint, conn):
+        cur = conn.cursor()
+        try:
+            while True:
+                try:
+                    cur.execute(REPLICA_LAG_QUERIES[endpoint.lag_query])
+                    row = cur.fetchone()
+                    return max(float(row[0]), 0.0) if row is not None and row[0] is not None else 0.0
+                except psycopg2.ProgrammingError:
+                    # dc - 2026-10-18 - Not Aurora: remember and use the next query from now on
+                    if endpoint.lag_query + 1 >= len(REPLICA_LAG_QUERIES):
+                        raise
+                    conn.rollback()
+                    endpoint.lag_query += 1
+        finally:
+            cur.close()
+
+
+
+_read_router = None
+_read_router_lock = threading.Lock()
+
+
+
+def get_read_pool():
+    # dc - 2026-10-18 - Pool for generated read-only queries: a router over the readers, or the writer pool without any
+    global _read_router
+    if not DB_READER_HOSTS:
+        return get_db_pool()
+    if _read_router is None:
+        writer_pool = get_db_pool()
+        with _read_router_lock:
+            if _read_router is None:
+                _read_router = ReplicaRouter(writer_pool, reader_pools(DB_READER_HOSTS))
+    return _read_router
+
+
+
+def pool_of(pool, conn):
+    # dc - 2026-10-18 - The ConnectionPool that owns conn, looking through a ReplicaRouter
+    return pool.pool_of(conn) if isinstance(pool, ReplicaRouter) else pool
+
+
+
+def recycle_pools():
+    # dc - 2026-10-18 - Retire the connections of every pool, e.g. after the password or the driver changed
+    if _db_pool is not None:
+        _db_pool.recycle()
+    if _read_router is not None:
+        _read_router.recycle()
+
+
+
+def summarize_plan(plan):
+    # dc - 2026-10-18 - Keep the top plan node's estimates; EXPLAIN (FORMAT JSON) returns [{"Plan": {...}}]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]['Plan']
+    return {
+        'node_type': top.get('Node Type'),
+        'total_cost': top.get('Total Cost'),
+        'plan_rows': top.get('Plan Rows'),
+        'plan_width': top.get('Plan Width'),
+    }
+
+
+
+# dc - 2026-10-18 - Plan nodes that read something other than a table the result cache can track
+_UNTRACKABLE_NODES = frozenset(['Function Scan', 'Table Function Scan', 'Foreign Scan', 'Custom Scan', 'Named Tuplestore Scan'])
+
+
+
+def plan_relations(plan):
+    # dc - 2026-10-18 - Every table the plan reads, schema-qualified and sorted; views are already expanded to their tables.
+    # dc - 2026-10-18 - None when a node reads a function or an unqualified name (EXPLAIN without VERBOSE omits Schema)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    relations = set()
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node.get('Node Type') in _UNTRACKABLE_NODES:
+            return None
+        if 'Relation Name' in node:
+            if not node.get('Schema'):
+                return None
+            relations.add(node['Schema'] + '.' + node['Relation Name'])
+        nodes.extend(node.get('Plans', ()))
+    return tuple(sorted(relations))
+
+
+
+def limit_query(sql_from_bedrock, limit):
+    # dc - 2026-10-18 - Wrap instead of appending so ORDER BY, existing LIMITs and trailing comments stay valid
+    return 'SELECT * FROM (\n%s\n) AS limited_result LIMIT %d' % (strip_statement_end(sql_from_bedrock), limit)
+
+
+
+def prepare_query(cur, sql_from_bedrock, details=None, limit_rows=True):
+    # dc - 2026-10-18 - Bound the statement and check its estimated cost before it can pin the database
+    with stage('plan'):
+        cur.execute('SET LOCAL statement_timeout = %s', (STATEMENT_TIMEOUT_MS,))
+        # dc - 2026-10-18 - VERBOSE adds each scanned table's schema, which the result cache needs
+        cur.execute('EXPLAIN (VERBOSE, FORMAT JSON) ' + sql_from_bedrock)
+        explain_output = cur.fetchone()[0]
+    return gate_plan(explain_output, sql_from_bedrock, details, limit_rows)
+
+
+
+def gate_plan(explain_output, sql_from_bedrock, details=None, limit_rows=True):
+    # dc - 2026-10-18 - Decide from the EXPLAIN output alone so every database driver applies the same gate
+    details = {} if details is None else details
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    plan = summarize_plan(explain_output)
+    details['plan_relations'] = plan_relations(explain_output)
+    plan['statement_timeout_ms'] = STATEMENT_TIMEOUT_MS
+
+    sql_to_run = sql_from_bedrock
+    if plan['total_cost'] is not None and plan['total_cost'] > QUERY_MAX_COST:
+        plan['decision'] = 'reject'
+        plan['reason'] = 'estimated cost %.0f exceeds limit %.0f' % (plan['total_cost'], QUERY_MAX_COST)
+    elif limit_rows and plan['plan_rows'] is not None and plan['plan_rows'] > QUERY_MAX_ROWS:
+        if QUERY_ROWS_ACTION == 'reject':
+            plan['decision'] = 'reject'
+            plan['reason'] = 'estimated %d rows exceeds limit %d' % (plan['plan_rows'], QUERY_MAX_ROWS)
+        else:
+            plan['decision'] = 'limit'
+            plan['reason'] = 'estimated %d rows; limited to %d' % (plan['plan_rows'], QUERY_MAX_ROWS)
+            sql_to_run = limit_query(sql_from_bedrock, QUERY_MAX_ROWS)
+    else:
+        plan['decision'] = 'allow'
+
+    details['plan'] = plan
+    log('query_plan', **plan)
+    if plan['decision'] == 'reject':
+        set_outcome('rejected')
+        return None, (['Error message'], [(0, 'Query rejected: ' + plan['reason'] + '.')])
+    return sql_to_run, None
+
+
+
+def query_cancelled(e, details=None):
+    # dc - 2026-10-18 - statement_timeout and pg_cancel_backend surface as QueryCanceledError
+    set_outcome('cancelled')
+    log('query_cancelled', 'warning', error=str(e))
+    if details is not None:
+        details['cancelled'] = True
+    return ['Error message'], [(0, 'Query cancelled: it exceeded the %d ms statement timeout or was cancelled.' % STATEMENT_TIMEOUT_MS)]
+
+
+
+# dc - 2026-10-18 - Functions whose result changes between calls; queries using them are never result-cached
+VOLATILE_FUNCTIONS = frozenset([
+    'now', 'random', 'clock_timestamp', 'statement_timestamp', 'transaction_timestamp', 'timeofday',
+    'current_timestamp', 'current_time', 'current_date', 'localtime', 'localtimestamp', 'gen_random_uuid',
+    'uuid_generate_v4', 'txid_current', 'pg_current_xact_id', 'pg_backend_pid', 'current_user', 'session_user',
+])
+
+
+
+def result_cache_key(sql):
+    # dc - 2026-10-18 - Drop comments, whitespace and trailing semicolons and lower-case keywords; literals stay as written
+    tokens = []
+    for match in _SQL_TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == 'comment' or kind == 'semicolon':
+            continue
+        value = match.group(kind)
+        if kind == 'word':
+            value = value.lower()
+            if value in VOLATILE_FUNCTIONS:
+                return None
+        elif kind == 'open' or kind == 'other':
+            return None
+        tokens.append(value)
+    return hashlib.sha256(' '.join(tokens).encode('utf-8')).hexdigest() if tokens else None
+
+
+
+def get_table_versions(relations):
+    # dc - 2026-10-18 - Write counters move on every committed change and relfilenode on TRUNCATE or a rewrite
+    # dc - 2026-10-18 - Always asked of the writer: statistics are per instance and replicas do not count replayed writes
+    sql_versions = """
+        SELECT  r.name,
+                s.n_tup_ins || ':' || s.n_tup_upd || ':' || s.n_tup_del || ':' || c.relfilenode
+        FROM        unnest(%s::text[], %s::text[]) AS r(name, quoted)
+        JOIN        pg_stat_user_tables s
+        ON        s.relid = to_regclass(r.quoted)
+        JOIN        pg_class c
+        ON        c.oid = s.relid
+    """
+    quoted = ['.'.join('"%s"' % part.replace('"', '""') for part in relation.split('.')) for relation in relations]
+    with get_db_pool().connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql_versions, (list(relations), quoted))
+            return dict(cur.fetchall())
+        finally:
+            cur.close()
+
+
+
+def _estimate_size(columns, rows):
+    # dc - 2026-10-18 - Extrapolate from a sample instead of measuring every row
+    sample = rows[:100]
+    per_row = sum(len(repr(row)) for row in sample) / len(sample) if sample else 0
+    return int(per_row * len(rows)) + len(repr(columns))
+
+
+
+class ResultCache:
+    """LRU cache of query results keyed on normalized SQL.
+
+    Each entry remembers the change counters of the tables it read, taken
+    before the query ran. A hit is served only while those counters are
+    unchanged and the entry is younger than ``ttl``; counters are re-read
+    at most every ``check_interval`` seconds per table. PostgreSQL flushes
+    table statistics asynchronously, so a write can take a moment to show;
+    the TTL bounds staleness regardless. The tables come from the query
+    plan; reading anything else (functions, foreign tables) makes a result
+    uncacheable.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 ttl=RESULT_CACHE_TTL, check_interval=RESULT_CACHE_CHECK_INTERVAL, probe=get_table_versions):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._probe = probe
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._table_versions = {}
+        self._bytes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'bypasses': 0,
+            'uncacheable': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'probes': 0,
+            'probe_failures': 0,
+        }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry['stored_at'] >= self.ttl:
+                self._remove(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+        if self.versions(entry['relations']) != entry['versions']:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                self._stats['invalidations'] += 1
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+        return entry['value']
+
+    def put(self, key, relations, versions, value, size):
+        if versions is None or size > self.max_bytes:
+            self.record('uncacheable')
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                'relations': relations,
+                'versions': versions,
+                'value': value,
+                'size': size,
+                'stored_at': time.monotonic(),
+            }
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def versions(self, relations):
+        # dc - 2026-10-18 - Current counters of the given tables, or None when any of them cannot be tracked
+        if not relations:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            stale = [relation for relation in relations
+                     if now - self._table_versions.get(relation, (None, float('-inf')))[1] >= self.check_interval]
+        if stale:
+            try:
+                probed = self._probe(stale)
+            except Exception as e:
+                log('result_cache_probe_error', 'error', error=str(e))
+                self.record('probe_failures')
+                return None
+            with self._lock:
+                self._stats['probes'] += 1
+                for relation in stale:
+                    self._table_versions[relation] = (probed.get(relation), now)
+        with self._lock:
+            versions = tuple(self._table_versions.get(relation, (None,))[0] for relation in relations)
+        return None if None in versions else versions
+
+    def record(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def invalidate(self, relation=None):
+        # dc - 2026-10-18 - Drop every entry that read the relation, or everything
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if relation is None or relation in entry['relations']]
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+            if relation is None:
+                self._table_versions.clear()
+            else:
+                self._table_versions.pop(relation, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._table_versions.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['tracked_tables'] = len(self._table_versions)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key):
+        # dc - 2026-10-18 - Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry['size']
+
+
+
+result_cache = ResultCache()
+
+
+
+def lookup_result(sql_from_bedrock, details):
+    # dc - 2026-10-18 - Cache key of the SQL and, on a hit, the cached (columns, data, plan); records the status in details
+    cache_key = result_cache_key(sql_from_bedrock) if RESULT_CACHE_ENABLED else None
+    if cache_key is None:
+        result_cache.record('uncacheable')
         return None, None
+    if details.get('bypass_cache'):
+        details['result_cache'] = 'bypass'
+        result_cache.record('bypasses')
+        return cache_key, None
+    with stage('result_cache'):
+        cached = result_cache.get(cache_key)
+    details['result_cache'] = 'miss' if cached is None else 'hit'
+    if cached is not None and cached[2] is not None:
+        details['plan'] = cached[2]
+    return cache_key, cached
 
 
 
-def get_db_credentials():
-    # dc - 2024-12-04 - Initialize AWS Secrets Manager client for us-east-1 region
-    client = boto3.client('secretsmanager', region_name='us-east-1')
-    
-    try:
-        # dc - 2024-12-04 - Retrieve secret value from AWS Secrets Manager using AuroraAI secret ID
-        response = client.get_secret_value(SecretId='AuroraAI')
-        
-        # dc - 2024-12-04 - Parse the secret string into a Python dictionary
-        secret_dict = json.loads(response['SecretString'])
-        
-        # dc - 2024-12-04 - Return formatted credentials dictionary for database connection
-        return {
-            'db_name': secret_dict['DB_NAME'],
-            'db_user': secret_dict['DB_USER'],
-            'db_password': secret_dict['DB_PASSWORD'],
-            'db_host': secret_dict['DB_HOST'],
-            'db_port': secret_dict['DB_PORT']
-        }
-    except Exception as e:
-        # dc - 2024-12-04 - Log any errors in retrieving or processing credentials
-        print(f"Error retrieving secret: {str(e)}")
-        return None
+def result_versions(cache_key, details):
+    # dc - 2026-10-18 - Invalidate on the tables the plan reads, which the token scanner cannot always see (nested
+    # joins, subqueries in FROM, views); read their counters before the query so a write during it invalidates the entry
+    relations = details.get('plan_relations')
+    if cache_key is None or not relations:
+        return relations, None
+    with stage('result_cache'):
+        return relations, result_cache.versions(relations)
+
+
+
+def store_result(cache_key, relations, versions, lag, columns, data, plan):
+    # dc - 2026-10-18 - Rows from a reader further behind than the cache's own check interval may predate the counters
+    if cache_key is None:
+        return
+    if lag is None or lag > result_cache.check_interval:
+        result_cache.record('uncacheable')
+        return
+    result_cache.put(cache_key, relations, versions, (columns, data, plan), _estimate_size(columns, data))
+
+
+
+def stream_cache_writer(cache_key, relations, versions, lag, columns, plan):
+    # dc - 2026-10-18 - on_complete callback of a streamed result; rows is None when the stream outgrew what it keeps
+    def store(rows):
+        if rows is None:
+            result_cache.record('uncacheable')
+        else:
+            store_result(cache_key, relations, versions, lag, columns, rows, plan)
+    return store
 
 
 
-def execute_sql(conn, sql_from_bedrock):
+def execute_sql(sql_from_bedrock, details=None):
+    details = {} if details is None else details
+    pool = None
+    conn = None
     try:
         # dc - 2024-12-04 - Log the start of SQL execution process
-        print('Executing SQL')
-        print(sql_from_bedrock)
+        log('execute_sql', sql=sql_from_bedrock)
+
+        # dc - 2026-10-18 - Serve repeated SQL from the result cache while the tables it read are unchanged
+        cache_key, cached = lookup_result(sql_from_bedrock, details)
+        if cached is not None:
+            columns, data, _ = cached
+            log('sql_executed', rows=len(data), result_cache='hit')
+            set_outcome('success')
+            count('rows', len(data))
+            return columns, data
+
+        # dc - 2026-10-18 - Borrow a pooled connection for the query, unless the caller lends one it can cancel
+        lent = details.get('connection')
+        if lent is None:
+            pool = get_read_pool()
+            with stage('db_checkout'):
+                conn = pool.getconn()
                
         # dc - 2024-12-04 - Create cursor for executing the SQL query
-        cur = conn.cursor()
+        cur = conn.cursor() if lent is None else lent.cursor()
+
+        # dc - 2026-10-18 - Apply the statement timeout and the EXPLAIN cost gate
+        sql_to_run, rejection = prepare_query(cur, sql_from_bedrock, details)
+        if rejection is not None:
+            cur.close()
+            return rejection
+
+        relations, versions = result_versions(cache_key, details)
         
+        # dc - 2026-10-18 - A caller that can cancel (a background job) is asked right before and after the statement,
+        # since a pg_cancel_backend that arrives between statements is lost
+        cancel_requested = details.get('cancel_requested')
+        if cancel_requested is not None and cancel_requested():
+            cur.close()
+            return query_cancelled('cancelled before the query started', details)
+
         # dc - 2024-12-04 - Execute the AI-generated SQL query
-        cur.execute(sql_from_bedrock)
-        print('SQL executed successfully')            
+        with stage('execute'):
+            cur.execute(sql_to_run)
         
-        # dc - 2024-12-04 - Extract column names from the query results
-        columns = [desc[0] for desc in cur.description]
+            # dc - 2024-12-04 - Extract column names from the query results
+            columns = [desc[0] for desc in cur.description]
         
-        # dc - 2024-12-04 - Fetch all rows from the query results
-        data = cur.fetchall()   
+            # dc - 2024-12-04 - Fetch all rows from the query results
+            data = cur.fetchall()   
+        if cancel_requested is not None and cancel_requested():
+            cur.close()
+            return query_cancelled('cancelled while the query ran', details)
+        log('sql_executed', rows=len(data))
+        set_outcome('success')
+        count('rows', len(data))
         
         # dc - 2024-12-04 - Clean up database resources
         cur.close()
-        conn.close()
-        print("Connection closed")
+
+        # dc - 2026-10-18 - A lent connection comes with the lag its lender recorded; without one the rows are not cached
+        if lent is None:
+            lag = pool.lag_of(conn) if isinstance(pool, ReplicaRouter) else 0.0
+        else:
+            lag = details.get('connection_lag')
+        store_result(cache_key, relations, versions, lag, columns, data, details.get('plan'))
         
         # dc - 2024-12-04 - Return both column names and data rows
         return columns, data
+
+    except psycopg2.extensions.QueryCanceledError as e:
+        return query_cancelled(e, details)
             
     except Exception as e:
         # dc - 2024-12-04 - Log any errors and return empty result set
-        print(f"Error: {str(e)}")
+        set_outcome('error')
+        log('execute_error', 'error', error=str(e))
+        details['error'] = str(e)
+        return None, None
+
+    finally:
+        # dc - 2026-10-18 - Return the connection to the pool; putconn rolls back or discards it as needed
+        if conn is not None:
+            pool.putconn(conn)
+            log('connection_returned', 'debug')
+
+
+
+class RowStream:
+    """Rows of a server-side cursor, fetched ``itersize`` at a time.
+
+    Owns its pooled connection until the rows are exhausted or ``close()`` is
+    called, e.g. when the client disconnects mid-stream. With
+    ``collect_bytes`` the rows are also kept until their running size passes
+    it. Callbacks registered with ``on_complete`` run once the stream has
+    been read to the end, with the kept rows or None; a stream that fails or
+    is closed early never calls them.
+    """
+
+    def __init__(self, pool, conn, cur, first_batch, started, collect_bytes=0):
+        self._pool = pool
+        self._conn = conn
+        self._cur = cur
+        self._first_batch = first_batch
+        self._collect_bytes = collect_bytes
+        self._collected = [] if collect_bytes else None
+        self._collected_size = 0
+        self._callbacks = []
+        self.started = started
+        self.time_to_first_row = time.monotonic() - started if first_batch else None
+        self.row_count = 0
+
+    def __iter__(self):
+        try:
+            batch = self._first_batch
+            self._first_batch = None
+            while batch:
+                self._collect(batch)
+                for row in batch:
+                    self.row_count += 1
+                    yield row
+                batch = self._cur.fetchmany(self._cur.itersize)
+            for callback in self._callbacks:
+                callback(self._collected)
+        except psycopg2.extensions.QueryCanceledError as e:
+            # dc - 2026-10-18 - A FETCH that hits the statement timeout ends the stream; the connection is still released
+            log('query_cancelled', 'warning', error=str(e), streaming=True)
+        finally:
+            self.close()
+
+    def on_complete(self, callback):
+        self._callbacks.append(callback)
+
+    def _collect(self, batch):
+        if self._collected is None:
+            return
+        self._collected_size += sum(len(repr(row)) for row in batch)
+        if self._collected_size > self._collect_bytes:
+            self._collected = None
+            return
+        self._collected.extend(batch)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            self._cur.close()
+        except Exception as e:
+            log('cursor_close_error', 'error', error=str(e))
+        self._pool.putconn(conn)
+        log('stream_closed', rows=self.row_count)
+
+
+
+def execute_sql_stream(sql_from_bedrock, details=None, itersize=STREAM_ITERSIZE):
+    details = {} if details is None else details
+    pool = None
+    conn = None
+    try:
+        # dc - 2026-10-18 - Log the start of SQL execution process
+        log('execute_sql', sql=sql_from_bedrock, streaming=True)
+        started = time.monotonic()
+
+        # dc - 2026-10-18 - Same result cache as execute_sql: a hit is streamed from memory
+        cache_key, cached = lookup_result(sql_from_bedrock, details)
+        if cached is not None:
+            columns, data, _ = cached
+            log('sql_executed', rows=len(data), result_cache='hit', streaming=True)
+            set_outcome('success')
+            return columns, data
+
+        pool = get_read_pool()
+        with stage('db_checkout'):
+            conn = pool.getconn()
+
+        # dc - 2026-10-18 - Same cost and row gates as execute_sql
+        plan_cur = conn.cursor()
+        sql_to_run, rejection = prepare_query(plan_cur, sql_from_bedrock, details)
+        plan_cur.close()
+        if rejection is not None:
+            return rejection
+        relations, versions = result_versions(cache_key, details)
+
+        # dc - 2026-10-18 - A named cursor keeps the result on the server and ships it itersize rows at a time
+        cur = conn.cursor(name='auroraai_' + uuid.uuid4().hex)
+        cur.itersize = itersize
+        with stage('execute'):
+            cur.execute(sql_to_run)
+
+            # dc - 2026-10-18 - Fetch the first batch now so errors surface before the response starts
+            first_batch = cur.fetchmany(itersize)
+        columns = [desc[0] for desc in cur.description]
+        log('sql_executed', first_batch_rows=len(first_batch), streaming=True)
+        set_outcome('success')
+
+        # dc - 2026-10-18 - A result small enough for the cache is stored once it has been streamed in full
+        if versions is not None:
+            lag = pool.lag_of(conn) if isinstance(pool, ReplicaRouter) else 0.0
+            rows = RowStream(pool, conn, cur, first_batch, started,
+                             min(RESULT_CACHE_STREAM_MAX_BYTES, result_cache.max_bytes))
+            rows.on_complete(stream_cache_writer(cache_key, relations, versions, lag, columns, details.get('plan')))
+        else:
+            if cache_key is not None:
+                result_cache.record('uncacheable')
+            rows = RowStream(pool, conn, cur, first_batch, started)
+        conn = None
+        return columns, rows
+
+    except psycopg2.extensions.QueryCanceledError as e:
+        return query_cancelled(e, details)
+
+    except Exception as e:
+        # dc - 2026-10-18 - Log any errors and return empty result set
+        set_outcome('error')
+        log('execute_error', 'error', error=str(e), streaming=True)
         return None, None
 
+    finally:
+        # dc - 2026-10-18 - Only reached with a connection when the query failed; a RowStream owns it otherwise
+        if conn is not None:
+            pool.putconn(conn)
+
+
+
+def stream_result(columns, rows, fmt='ndjson', plan=None):
+    # dc - 2026-10-18 - Encode rows one at a time so memory stays flat regardless of result size
+    # dc - 2026-10-18 - Same typed encoder as the buffered response, so bytea, dates and Decimal stream as they are returned
+    started = getattr(rows, 'started', time.monotonic())
+    row_count = 0
+    if fmt == 'json':
+        yield b'{"columns": ' + dumps_bytes(columns) + b', "plan": ' + dumps_bytes(plan) + b', "rows": ['
+    else:
+        yield dumps_bytes({'columns': columns, 'plan': plan}) + b'\n'
+    for row in rows:
+        if fmt == 'json':
+            yield (b',' if row_count else b'') + dumps_bytes(list(row))
+        else:
+            yield dumps_bytes(list(row)) + b'\n'
+        row_count += 1
+    summary = {
+        'row_count': row_count,
+        'time_to_first_row_ms': round(rows.time_to_first_row * 1000, 1) if getattr(rows, 'time_to_first_row', None) is not None else None,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+    count('rows', row_count)
+    log('stream_complete', **summary)
+    if fmt == 'json':
+        yield b'], "summary": ' + dumps_bytes(summary) + b'}'
+    else:
+        yield dumps_bytes({'summary': summary}) + b'\n'
+
+
+
+def encode_value(value):
+    # dc - 2026-10-18 - psycopg2 types the JSON encoder does not know; Decimal stays a string to keep precision
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+
+def dumps_bytes(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=encode_value, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, default=encode_value, separators=(',', ':')).encode('utf-8')
+
+
+
+def encode_result(columns, rows, layout='rows', extra=None):
+    # dc - 2026-10-18 - 'columnar' transposes rows into one list per column, which compresses far better
+    if layout == 'columnar':
+        data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+        payload = {'columns': columns, 'layout': 'columnar', 'data': data, 'row_count': len(rows)}
+    else:
+        payload = {'columns': columns, 'rows': rows}
+    if extra:
+        payload.update(extra)
+    return dumps_bytes(payload)
+
+
+
+def negotiate_encoding():
+    # dc - 2026-10-18 - Prefer brotli when both sides support it, then gzip
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=4)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=5)
+    return body
+
+
+
+def compressed_response(body, mimetype='application/json', status=200):
+    encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        with stage('compress'):
+            body = compress_body(body, encoding)
+    count('response_bytes', len(body))
+    response = Response(body, status=status, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+
+def export_sql(sql_from_bedrock, fmt, details=None):
+    pool = None
+    conn = None
+    try:
+        log('export_sql', fmt=fmt, sql=sql_from_bedrock)
+        # dc - 2026-10-18 - Fail on a missing pyarrow before the query runs, not after COPY has produced the rows
+        if fmt != 'csv':
+            import_pyarrow(fmt)
+        pool = get_read_pool()
+        with stage('db_checkout'):
+            conn = pool.getconn()
+        cur = conn.cursor()
+
+        # dc - 2026-10-18 - Same timeout and cost gate as execute_sql, including the automatic LIMIT
+        sql_to_run, rejection = prepare_query(cur, sql_from_bedrock, details)
+        if rejection is not None:
+            cur.close()
+            return rejection
+
+        # dc - 2026-10-18 - COPY formats the rows inside PostgreSQL; no Python loop over rows
+        spool = SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+        with stage('execute'):
+            cur.copy_expert('COPY (\n%s\n) TO STDOUT WITH (FORMAT csv, HEADER true)' % strip_statement_end(sql_to_run), spool)
+        cur.close()
+        set_outcome('success')
+        count('response_bytes', spool.tell())
+        spool.seek(0)
+        if fmt == 'csv':
+            return spool
+        with stage('convert'):
+            return csv_to_arrow(spool, fmt)
+
+    except psycopg2.extensions.QueryCanceledError as e:
+        return query_cancelled(e, details)
+
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
+
+
+
+def strip_statement_end(sql):
+    # dc - 2026-10-18 - Drop the terminating semicolon (and anything after it) so the SQL can be embedded
+    end = SqlScanner().scan(sql, first_statement=True).statement_end
+    return sql[:end - 1] if end is not None else sql
+
+
+
+def import_pyarrow(fmt):
+    # dc - 2026-10-18 - pyarrow is optional and heavy, so it is only imported for Arrow and Parquet exports;
+    # raises ImportError when it, or its Parquet support, is not installed
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.ipc
+    if fmt == 'parquet':
+        import pyarrow.parquet
+    return pyarrow
+
+
+
+def csv_to_arrow(spool, fmt):
+    pyarrow = import_pyarrow(fmt)
+    table = pyarrow.csv.read_csv(spool)
+    spool.close()
+    out = SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(table, out)
+    else:
+        with pyarrow.ipc.new_file(out, table.schema) as writer:
+            writer.write_table(table)
+    out.seek(0)
+    return out
+
+
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
 
+def get_batch_executor():
+    # dc - 2026-10-18 - One bounded pool per process so concurrent batches share BATCH_MAX_WORKERS threads
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='auroraai-batch')
+    return _batch_executor
+
+
+
+def run_batch_item(prompt, metadata, execute):
+    details = {}
+    try:
+        sql_from_bedrock, rejection = prepare_sql(prompt, details, metadata)
+        if rejection is None:
+            rejection = execute(sql_from_bedrock, details)
+        columns, rows = rejection
+        record_example(prompt, details, rejection)
+    except Exception as e:
+        log('batch_item_error', 'error', prompt=prompt, error=str(e))
+        return {'prompt': prompt, 'error': str(e)}
+    if not columns:
+        return {'prompt': prompt, 'sql': details.get('sql'), 'error': 'No data returned'}
+    item = {'prompt': prompt, 'sql': details.get('sql'), 'columns': columns, 'rows': rows}
+    if 'plan' in details:
+        item['plan'] = details['plan']
+    return item
+
+
+
+def run_batch(prompts, execute=None, metadata=None, executor=None):
+    # dc - 2026-10-18 - Fetch the schema once, fan prompts out to the worker pool and keep results in input order
+    execute = execute or execute_sql
+    if metadata is None:
+        metadata = get_metadata()
+    executor = executor or get_batch_executor()
+    # dc - 2026-10-18 - Run each item in a copy of this context so its stages, counters and logs belong to this request
+    futures = [executor.submit(contextvars.copy_context().run, run_batch_item, prompt, metadata, execute)
+               for prompt in prompts]
+    return [future.result() for future in futures]
+
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_MAX_QUEUED jobs are already waiting for a worker."""
+
+
+
+class Job:
+    """One /generate request running in the background; see JobManager."""
+
+    def __init__(self, prompt, layout='rows', bypass_cache=False):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.layout = layout
+        self.details = {'bypass_cache': bypass_cache}
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.body = None
+        self.spill_path = None
+        self.size = 0
+        self.backend_pid = None
+        self.backend_pool = None
+        self.cancel_requested = False
+        self.future = None
+        self.lock = threading.Lock()
+
+    def describe(self):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'created': round(self.created, 3),
+            'started': round(self.started, 3) if self.started else None,
+            'finished': round(self.finished, 3) if self.finished else None,
+        }
+        if 'sql' in self.details:
+            info['sql'] = self.details['sql']
+        if self.error is not None:
+            info['error'] = self.error
+        if self.status == 'succeeded':
+            info['result'] = '/jobs/%s/result' % self.id
+            info['bytes'] = self.size
+            info['spilled'] = self.spill_path is not None
+        return info
+
+
+
+def cancel_backend(pid, pool=None, conn=None):
+    # dc - 2026-10-18 - Sent over another connection to the same instance; the job's own connection is busy running the query
+    if conn is None:
+        with (pool or get_db_pool()).connection() as conn:
+            return cancel_backend(pid, conn=conn)
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_cancel_backend(%s)', (pid,))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+
+class JobManager:
+    """Runs /generate requests on a bounded worker pool and keeps their results for polling.
+
+    At most ``max_workers`` jobs run at once and ``max_queued`` more may
+    wait; ``submit`` raises JobQueueFull beyond that. Result bodies larger
+    than ``spill_bytes`` are written to a file in ``spill_dir`` instead of
+    being held in memory. Finished jobs are dropped ``ttl`` seconds after
+    they end. Jobs live in this process, so polls must reach the worker
+    that accepted the job.
+    """
+
+    FINISHED = frozenset(['succeeded', 'failed', 'cancelled'])
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, max_queued=JOB_MAX_QUEUED, spill_bytes=JOB_SPILL_BYTES,
+                 spill_dir=JOB_SPILL_DIR or None, ttl=JOB_RESULT_TTL):
+        self.max_queued = max_queued
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='auroraai-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queued = 0
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'spilled': 0,
+            'expired': 0,
+        }
+
+    def submit(self, prompt, layout='rows', bypass_cache=False):
+        self._expire()
+        job = Job(prompt, layout, bypass_cache)
+        with self._lock:
+            if self._queued >= self.max_queued:
+                self._stats['rejected'] += 1
+                raise JobQueueFull()
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._stats['submitted'] += 1
+        # dc - 2026-10-18 - The job runs in a copy of the submitting context; _run starts the job's own trace in it
+        job.future = self._executor.submit(contextvars.copy_context().run, self._run, job)
+        log('job_submitted', job_id=job.id)
+        return job
+
+    def get(self, job_id):
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # dc - 2026-10-18 - Queued jobs never start; running queries get pg_cancel_backend; finished jobs are deleted
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.lock:
+            if job.status in self.FINISHED:
+                self._discard(job)
+                job.status = 'deleted'
+                return job
+            job.cancel_requested = True
+            if job.status == 'queued':
+                job.future.cancel()
+                self._finish(job, 'cancelled')
+                with self._lock:
+                    self._queued -= 1
+            else:
+                job.status = 'cancelling'
+            pool = job.backend_pool
+        if pool is None:
+            return job
+        # dc - 2026-10-18 - Borrow the connection for pg_cancel_backend without the job lock, so a busy pool cannot hold up
+        # the worker; the pid is re-read under the lock, which keeps its connection from going back to the pool meanwhile
+        with pool.connection() as conn:
+            with job.lock:
+                if job.backend_pid is not None and job.backend_pool is pool:
+                    cancelled = cancel_backend(job.backend_pid, conn=conn)
+                    log('job_cancel', job_id=job.id, backend_pid=job.backend_pid, cancelled=cancelled)
+        return job
+
+    def stats(self):
+        self._expire()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = self._queued
+            stats['running'] = sum(1 for job in self._jobs.values() if job.status in ('running', 'cancelling'))
+            stats['kept'] = len(self._jobs)
+        return stats
+
+    def _run(self, job):
+        with job.lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started = time.time()
+        with self._lock:
+            self._queued -= 1
+        trace, token = start_trace('job')
+        try:
+            result = call_bedrock(job.prompt, execute=lambda sql, details: self._execute(job, sql, details),
+                                  details=job.details)
+            columns, rows = result if result else (None, None)
+            if job.cancel_requested:
+                self._finish(job, 'cancelled')
+            elif columns == ['Error message']:
+                self._finish(job, 'failed', rows[0][1])
+            elif not columns or not rows:
+                self._finish(job, 'failed', job.details.get('error', 'No data returned'))
+            else:
+                extra = {key: job.details[key] for key in ('plan', 'result_cache') if key in job.details} or None
+                with stage('encode'):
+                    body = encode_result(columns, rows, job.layout, extra)
+                self._store(job, body)
+                self._finish(job, 'succeeded')
+        except Exception as e:
+            set_outcome('error')
+            log('job_error', 'error', job_id=job.id, error=str(e))
+            self._finish(job, 'failed', str(e))
+        finally:
+            finish_trace(trace)
+            _current_trace.reset(token)
+
+    def _execute(self, job, sql_from_bedrock, details):
+        # dc - 2026-10-18 - Lend execute_sql a connection whose backend pid is known, so DELETE can cancel the query
+        pool = get_read_pool()
+        with stage('db_checkout'):
+            conn = pool.getconn()
+        try:
+            with job.lock:
+                if job.cancel_requested:
+                    return ['Error message'], [(0, 'Job cancelled.')]
+                job.backend_pid = conn.get_backend_pid()
+                job.backend_pool = pool_of(pool, conn)
+            details['connection'] = conn
+            details['connection_lag'] = pool.lag_of(conn) if isinstance(pool, ReplicaRouter) else 0.0
+            details['cancel_requested'] = lambda: job.cancel_requested
+            return execute_sql(sql_from_bedrock, details)
+        finally:
+            details.pop('connection', None)
+            details.pop('connection_lag', None)
+            details.pop('cancel_requested', None)
+            with job.lock:
+                job.backend_pid = None
+                job.backend_pool = None
+            pool.putconn(conn)
+
+    def _store(self, job, body):
+        job.size = len(body)
+        if len(body) <= self.spill_bytes:
+            job.body = body
+            return
+        with NamedTemporaryFile(prefix='auroraai-job-', suffix='.json', dir=self.spill_dir, delete=False) as f:
+            f.write(body)
+        job.spill_path = f.name
+        with self._lock:
+            self._stats['spilled'] += 1
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        with self._lock:
+            self._stats[status] += 1
+        log('job_finished', job_id=job.id, status=status, bytes=job.size, spilled=job.spill_path is not None)
+
+    def _discard(self, job):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        if job.spill_path is not None:
+            try:
+                os.unlink(job.spill_path)
+            except OSError as e:
+                log('job_spill_error', 'error', job_id=job.id, error=str(e))
+            job.spill_path = None
+        job.body = None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished is not None and job.finished < cutoff]
+            self._stats['expired'] += len(expired)
+        for job in expired:
+            self._discard(job)
+
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+
+def get_job_manager():
+    # dc - 2026-10-18 - Job workers are separate from the batch pool, so a full batch never blocks jobs
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
+
+
+
+def warm_clients():
+    get_aws_client('secretsmanager')
+    get_aws_client('bedrock-runtime')
+
+
+
+def warm_pool():
+    get_db_pool().warm()
+    get_read_pool()
+
+
+
+def warm_schema():
+    if get_metadata() is None:
+        raise RuntimeError('Schema metadata could not be loaded')
+
+
+
+def warm_examples():
+    return 'ready' if get_example_store() is not None else 'disabled'
+
+
+
+# dc - 2026-10-18 - What the first requests would otherwise set up, in order, and whether /ready waits for it;
+# the example store is optional since generation works without it
+WARM_UP_STEPS = (
+    ('clients', warm_clients, True),
+    ('pool', warm_pool, True),
+    ('schema', warm_schema, True),
+    ('examples', warm_examples, False),
+)
+
+_readiness = {name: {'status': 'pending'} for name, _, _ in WARM_UP_STEPS}
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+
+def is_ready():
+    return all(_readiness[name]['status'] == 'ready' for name, _, required in WARM_UP_STEPS if required)
+
+
+
+def warm_up():
+    # dc - 2026-10-18 - Run the steps that have not succeeded yet; a failed step is retried on the next call
+    started = time.monotonic()
+    for name, step, _ in WARM_UP_STEPS:
+        if _readiness[name]['status'] in ('ready', 'disabled'):
+            continue
+        step_started = time.monotonic()
+        try:
+            status = step() or 'ready'
+        except Exception as e:
+            _readiness[name] = {'status': 'failed', 'error': str(e),
+                                'elapsed_ms': round((time.monotonic() - step_started) * 1000, 1)}
+            log('warm_up_failed', 'warning', component=name, error=str(e))
+            continue
+        _readiness[name] = {'status': status, 'elapsed_ms': round((time.monotonic() - step_started) * 1000, 1)}
+    log('warm_up', ready=is_ready(), elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+        **{name: entry['status'] for name, entry in _readiness.items()})
+    return is_ready()
+
+
+
+def start_warm_up():
+    # dc - 2026-10-18 - Warm up on a daemon thread, unless a run is in progress or every step already succeeded
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return
+        if all(entry['status'] in ('ready', 'disabled') for entry in _readiness.values()):
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name='auroraai-warm-up', daemon=True)
+        _warm_up_thread.start()
+
+
+
+def create_app(warm=WARM_UP):
+    # dc - 2026-10-18 - Application factory, e.g. gunicorn 'AuroraAI:create_app()'; importing the module builds nothing
+    application = Flask(__name__)
+    application.register_blueprint(routes)
+    if warm == 'blocking':
+        warm_up()
+    elif warm == 'background':
+        start_warm_up()
+    return application
+
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+
+def __getattr__(name):
+    # dc - 2026-10-18 - AuroraAI.app, e.g. gunicorn AuroraAI:app, is created by the factory on first access
+    global _app
+    if name != 'app':
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+
+
+# dc - 2026-10-18 - Trace every request: stage timings, Server-Timing header and one structured log line
+@routes.before_app_request
+def begin_request_trace():
+    # dc - 2026-10-18 - Name the trace after the view, without the blueprint prefix Flask adds to the endpoint
+    g.trace, g.trace_token = start_trace((request.endpoint or 'unknown').rpartition('.')[2])
+
+@routes.after_app_request
+def end_request_trace(response):
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = trace.server_timing()
+    if response.is_streamed:
+        # dc - 2026-10-18 - Streams finish after the view returns; record them once the body has been sent
+        response.call_on_close(lambda: finish_trace(trace, response.status_code))
+    else:
+        finish_trace(trace, response.status_code)
+    return response
+
+@routes.teardown_app_request
+def reset_request_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        _current_trace.reset(token)
 
 # dc - 2024-12-04 - Route handler for the main application homepage
-@app.route('/')
+@routes.route('/')
 def home():
     return render_template('index.html')
 
 # dc - 2024-12-04 - API endpoint for handling natural language to SQL generation requests
-@app.route('/generate', methods=['POST'])
+@routes.route('/generate', methods=['POST'])
 def generate():
     try:
         # dc - 2024-12-04 - Extract JSON data from the incoming POST request
         data = request.get_json()
         prompt = data.get('prompt', '')
+        # dc - 2026-10-18 - "cache": false or Cache-Control: no-cache skips the result cache lookup and refreshes the entry
+        bypass_cache = data.get('cache') is False or 'no-cache' in request.headers.get('Cache-Control', '')
+        layout = 'columnar' if data.get('layout') == 'columnar' else 'rows'
+
+        # dc - 2026-10-18 - "async": true runs the prompt as a background job; poll /jobs/<id> and fetch /jobs/<id>/result
+        if data.get('async'):
+            try:
+                job = get_job_manager().submit(prompt, layout, bypass_cache)
+            except JobQueueFull:
+                response = jsonify({'error': 'Too many jobs waiting, retry later'})
+                response.status_code = 503
+                response.headers['Retry-After'] = '5'
+                return response
+            response = jsonify(job.describe())
+            response.status_code = 202
+            response.headers['Location'] = '/jobs/' + job.id
+            return response
+
+        # dc - 2026-10-18 - Stream rows as NDJSON (stream: true or 'ndjson') or as a chunked JSON document (stream: 'json')
+        stream = data.get('stream')
+        if stream:
+            fmt = 'json' if stream == 'json' else 'ndjson'
+            details = {'bypass_cache': bypass_cache}
+            columns, rows = call_bedrock(prompt, execute=execute_sql_stream, details=details)
+            if not columns:
+                return jsonify({'error': 'No data returned'}), 404
+            response = Response(
+                stream_result(columns, rows, fmt, details.get('plan')),
+                mimetype='application/json' if fmt == 'json' else 'application/x-ndjson'
+            )
+            # dc - 2026-10-18 - Release the pooled connection even if the client goes away before the first chunk
+            if hasattr(rows, 'close'):
+                response.call_on_close(rows.close)
+            return response
         
         # dc - 2024-12-04 - Call Bedrock AI service to generate and execute SQL query
-        columns, rows = call_bedrock(prompt)
+        details = {'bypass_cache': bypass_cache}
+        columns, rows = call_bedrock(prompt, details=details)
         
         # dc - 2024-12-04 - Return query results if data is found
         if  columns and rows:
-            return jsonify({
-                'columns': columns,
-                'rows': rows
-            })
+            # dc - 2026-10-18 - Report the plan estimates, the gate decision and the result cache status alongside the rows
+            extra = {key: details[key] for key in ('plan', 'result_cache') if key in details} or None
+            # dc - 2026-10-18 - Typed encoder, optional columnar layout and negotiated compression
+            with stage('encode'):
+                body = encode_result(columns, rows, layout, extra)
+            return compressed_response(body)
         else:
             # dc - 2024-12-04 - Return 404 error if no data is found
             return jsonify({'error': 'No data returned'}), 404
             
     except Exception as e:
         # dc - 2024-12-04 - Log and return any errors that occur during processing
-        print(f"Error: {str(e)}")
+        log('request_error', 'error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
+# dc - 2026-10-18 - API endpoint for running a list of prompts in one request
+@routes.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    try:
+        data = request.get_json()
+        prompts = data.get('prompts') or []
+        if not isinstance(prompts, list) or not all(isinstance(prompt, str) for prompt in prompts):
+            return jsonify({'error': 'prompts must be a list of strings'}), 400
+        if len(prompts) > BATCH_MAX_PROMPTS:
+            return jsonify({'error': 'At most %d prompts per batch' % BATCH_MAX_PROMPTS}), 400
+
+        started = time.monotonic()
+        results = run_batch(prompts)
+        # dc - 2026-10-18 - Items set their own outcomes on this trace; the batch succeeded even if some items did not
+        set_outcome('success')
+        return compressed_response(dumps_bytes({
+            'results': results,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }))
+
+    except Exception as e:
+        log('request_error', 'error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+# dc - 2026-10-18 - Download the result of a prompt as CSV, Arrow IPC or Parquet
+@routes.route('/export/<fmt>', methods=['POST'])
+def export(fmt):
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unsupported export format: ' + fmt}), 404
+    try:
+        # dc - 2026-10-18 - Answer 501 before calling Bedrock when the format needs pyarrow and it is missing
+        if fmt != 'csv':
+            import_pyarrow(fmt)
+        data = request.get_json()
+        prompt = data.get('prompt', '')
+        details = {}
+        sql_from_bedrock, rejection = prepare_sql(prompt, details)
+        if rejection is None:
+            result = export_sql(sql_from_bedrock, fmt, details)
+            if not isinstance(result, tuple):
+                mimetype, extension = EXPORT_FORMATS[fmt]
+                return send_file(result, mimetype=mimetype, as_attachment=True, download_name='report.' + extension)
+            rejection = result
+        return jsonify({'error': rejection[1][0][1]}), 400
+
+    except ImportError:
+        return jsonify({'error': 'pyarrow is required for %s exports' % fmt}), 501
+    except Exception as e:
+        log('request_error', 'error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+# dc - 2026-10-18 - Status of a background job
+@routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.describe())
+
+# dc - 2026-10-18 - Result of a finished job, in the same shape as a /generate response
+@routes.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    with job.lock:
+        status, body, spill_path = job.status, job.body, job.spill_path
+    if status != 'succeeded':
+        return jsonify(job.describe()), 409
+    if spill_path is not None:
+        return send_file(spill_path, mimetype='application/json')
+    return compressed_response(body)
+
+# dc - 2026-10-18 - Cancel a queued or running job (pg_cancel_backend on its query), or delete a finished one
+@routes.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    try:
+        job = get_job_manager().cancel(job_id)
+    except Exception as e:
+        log('request_error', 'error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.describe())
+
+# dc - 2026-10-18 - Expose job queue depth and outcome counters
+@routes.route('/stats/jobs')
+def job_stats():
+    return jsonify(get_job_manager().stats())
+
+# dc - 2026-10-18 - Expose connection pool statistics for monitoring
+@routes.route('/stats/pool')
+def pool_stats():
+    return jsonify(get_db_pool().stats())
+
+# dc - 2026-10-18 - Expose per-endpoint health, lag, load and pool statistics of the reader routing
+@routes.route('/stats/replicas')
+def replica_stats():
+    pool = get_read_pool()
+    return jsonify(pool.stats() if isinstance(pool, ReplicaRouter) else {'enabled': False})
+
+# dc - 2026-10-18 - Expose schema cache hit/miss counters
+@routes.route('/stats/schema')
+def schema_stats():
+    return jsonify(schema_cache.stats())
+
+# dc - 2026-10-18 - Drop the cached schema metadata and reload it from the database
+@routes.route('/schema/refresh', methods=['POST'])
+def refresh_schema():
+    data = request.get_json(silent=True) or {}
+    schema_name = data.get('schema', SCHEMA_NAME)
+    schema_cache.invalidate(schema_name)
+    if get_metadata(schema_name) is None:
+        return jsonify({'error': 'Schema metadata could not be loaded'}), 500
+    return jsonify(schema_cache.stats())
+
+# dc - 2026-10-18 - Expose prompt-to-SQL cache hit ratio, size and evictions
+@routes.route('/stats/sql_cache')
+def sql_cache_stats():
+    return jsonify(sql_cache.stats())
+
+# dc - 2026-10-18 - Expose result cache hit ratio, bytes held, evictions and invalidations
+@routes.route('/stats/result_cache')
+def result_cache_stats():
+    return jsonify(result_cache.stats())
+
+# dc - 2026-10-18 - Drop cached results, for one table ({"table": "dc_ai_test.orders"}) or all of them
+@routes.route('/result_cache/invalidate', methods=['POST'])
+def invalidate_result_cache():
+    data = request.get_json(silent=True) or {}
+    result_cache.invalidate(data.get('table'))
+    return jsonify(result_cache.stats())
+
+# dc - 2026-10-18 - Expose example store size, few-shot use and reuse counters
+@routes.route('/stats/examples')
+def example_stats():
+    store = get_example_store()
+    return jsonify(store.stats() if store is not None else {'enabled': False})
+
+# dc - 2026-10-18 - Expose how much schema pruning shrinks the Bedrock prompt
+@routes.route('/stats/schema_pruning')
+def schema_pruning_stats():
+    return jsonify(pruning_stats())
+
+# dc - 2026-10-18 - Readiness probe: 200 once the clients, the pool and the schema cache are warm, 503 with the status
+# of each step until then; a probe also restarts a warm-up that failed or never ran
+@routes.route('/ready')
+def ready():
+    start_warm_up()
+    warm = is_ready()
+    response = jsonify({'ready': warm, 'components': dict(_readiness)})
+    if not warm:
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+    return response
+
+# dc - 2026-10-18 - Prometheus scrape endpoint: stage and request latency histograms plus token, row and byte counters
+@routes.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # dc - 2024-12-04 - Application entry point with security configurations
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    create_app().run(host='0.0.0.0', port=5000, debug=False)
 
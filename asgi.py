@@ -0,0 +1,679 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import AuroraAI
+from AuroraAI import (
+    COMPRESS_MIN_BYTES, POOL_CHECKOUT_TIMEOUT, POOL_MAX_IDLE, POOL_MAX_SIZE, POOL_MIN_SIZE,
+    RESULT_CACHE_STREAM_MAX_BYTES, SERVER_TIMING, STATEMENT_TIMEOUT_MS, STREAM_ITERSIZE, brotli, compress_body, count,
+    dumps_bytes, encode_result, finish_trace, log, render_metrics, set_outcome, stage, start_trace
+)
+
+
+
+# dc - 2026-10-18 - asyncio serving path for / and /generate; run it with any ASGI server, e.g. uvicorn asgi:app
+# dc - 2026-10-18 - Results share AuroraAI's result cache, whose stats and invalidation are served here too; the other
+# endpoints stay on the Flask app in AuroraAI.py
+
+# dc - 2026-10-18 - Threads for the blocking steps: Bedrock calls, the guardrail and the schema cache
+ASYNC_OFFLOAD_WORKERS = int(os.environ.get('AURORAAI_ASYNC_OFFLOAD_WORKERS', '64'))
+
+# dc - 2026-10-18 - SQLSTATE for statement_timeout and pg_cancel_backend, as asyncpg reports it
+QUERY_CANCELED_SQLSTATE = '57014'
+
+
+
+_offload_executor = None
+_offload_executor_lock = threading.Lock()
+
+
+
+def get_offload_executor():
+    # dc - 2026-10-18 - A dedicated pool so slow Bedrock calls cannot starve the loop's default executor
+    global _offload_executor
+    if _offload_executor is None:
+        with _offload_executor_lock:
+            if _offload_executor is None:
+                _offload_executor = ThreadPoolExecutor(max_workers=ASYNC_OFFLOAD_WORKERS, thread_name_prefix='auroraai-offload')
+    return _offload_executor
+
+
+
+async def run_blocking(function, *args):
+    # dc - 2026-10-18 - Cancelling the await abandons the result; the thread finishes and still warms the SQL cache
+    # dc - 2026-10-18 - The copied context carries the request trace into the worker thread
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_offload_executor(), functools.partial(context.run, function, *args))
+
+
+
+async def call_bedrock(input_prompt, execute=None, details=None):
+    # dc - 2026-10-18 - Same steps as AuroraAI.call_bedrock: guardrail, schema, Bedrock, validation, then execute
+    execute = execute or execute_sql
+    details = {} if details is None else details
+    try:
+        sql_from_bedrock, rejection = await run_blocking(AuroraAI.prepare_sql, input_prompt, details)
+    except Exception as e:
+        set_outcome('error')
+        log('generate_error', 'error', error=str(e))
+        return None
+    if rejection is not None:
+        return rejection
+    result = await execute(sql_from_bedrock, details)
+    # dc - 2026-10-18 - Streamed SQL becomes an example only once its rows have been read to the end; the write is
+    # handed to a worker thread from the stream's callback rather than awaited
+    rows = result[1] if result else None
+    if isinstance(rows, AsyncRowStream):
+        context = contextvars.copy_context()
+        rows.on_complete(lambda data: get_offload_executor().submit(
+            context.run, AuroraAI.record_example, input_prompt, details, result))
+    else:
+        await run_blocking(AuroraAI.record_example, input_prompt, details, result)
+    return result
+
+
+
+# dc - 2026-10-18 - asyncpg pools by endpoint name; None is the writer from the secret
+_db_pools = {}
+_db_pool_lock = None
+
+
+
+async def get_db_pool(name=None):
+    # dc - 2026-10-18 - Create each asyncpg pool on first use so importing the module stays offline
+    global _db_pool_lock
+    pool = _db_pools.get(name)
+    if pool is None:
+        if _db_pool_lock is None:
+            _db_pool_lock = asyncio.Lock()
+        async with _db_pool_lock:
+            pool = _db_pools.get(name)
+            if pool is None:
+                host, port = AuroraAI.parse_host(name) if name is not None else (None, None)
+                pool = _db_pools[name] = await create_db_pool(host, port)
+    return pool
+
+
+
+async def create_db_pool(host=None, port=None):
+    # dc - 2026-10-18 - asyncpg is only needed by this module, so it is imported here rather than in AuroraAI.py
+    import asyncpg
+    credentials = await run_blocking(AuroraAI.get_db_credentials)
+    if credentials is None:
+        raise RuntimeError('Database credentials are not available')
+    return await asyncpg.create_pool(
+        database=credentials['db_name'],
+        user=credentials['db_user'],
+        # dc - 2026-10-18 - Read the password per connection so new connections pick up a rotated secret
+        password=_db_password,
+        host=host or credentials['db_host'],
+        port=port or int(credentials['db_port']),
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=POOL_MAX_IDLE
+    )
+
+
+
+async def _db_password():
+    credentials = await run_blocking(AuroraAI.get_db_credentials)
+    if credentials is None:
+        raise RuntimeError('Database credentials are not available')
+    return credentials['db_password']
+
+
+
+async def close_db_pool():
+    while _db_pools:
+        _, pool = _db_pools.popitem()
+        await pool.close()
+
+
+
+class Checkout:
+    """A pooled asyncpg connection for one generated query and the endpoint it came from.
+
+    ``router`` and ``endpoint`` are set when AuroraAI's ReplicaRouter picked
+    the instance, so ``release()`` also feeds its outstanding count and
+    latency.
+    """
+
+    def __init__(self, pool, conn, router=None, endpoint=None):
+        self.pool = pool
+        self.conn = conn
+        self.router = router
+        self.endpoint = endpoint
+        self.borrowed_at = time.monotonic()
+
+    @property
+    def lag(self):
+        # dc - 2026-10-18 - Seconds the instance was behind the writer at its last check; None if not measured yet
+        return self.router.endpoint_lag(self.endpoint) if self.router is not None else 0.0
+
+    async def release(self):
+        try:
+            await self.pool.release(self.conn)
+        finally:
+            if self.router is not None:
+                self.router.release(self.endpoint, time.monotonic() - self.borrowed_at)
+
+
+
+async def checkout():
+    # dc - 2026-10-18 - Read-only queries go where AuroraAI.get_read_pool would send them: a healthy reader picked by
+    # the router's policy, the writer when none is healthy or no readers are configured
+    router = None
+    if AuroraAI.DB_READER_HOSTS:
+        router = AuroraAI._read_router or await run_blocking(AuroraAI.get_read_pool)
+    if router is None:
+        pool = await get_db_pool()
+        with stage('db_checkout'):
+            return Checkout(pool, await pool.acquire(timeout=POOL_CHECKOUT_TIMEOUT))
+    endpoint = router.choose()
+    with stage('db_checkout'):
+        try:
+            pool = await get_db_pool(None if endpoint is router.writer else endpoint.name)
+            conn = await pool.acquire(timeout=POOL_CHECKOUT_TIMEOUT)
+        except Exception as e:
+            endpoint = router.checkout_failed(endpoint, e, busy=isinstance(e, asyncio.TimeoutError))
+            try:
+                pool = await get_db_pool()
+                conn = await pool.acquire(timeout=POOL_CHECKOUT_TIMEOUT)
+            except BaseException:
+                router.release(endpoint)
+                raise
+        except BaseException:
+            router.release(endpoint)
+            raise
+    router.checked_out(endpoint)
+    return Checkout(pool, conn, router, endpoint)
+
+
+
+def _is_query_cancelled(error):
+    return getattr(error, 'sqlstate', None) == QUERY_CANCELED_SQLSTATE
+
+
+
+async def prepare_query(conn, sql_from_bedrock, details=None, limit_rows=True):
+    # dc - 2026-10-18 - SET LOCAL takes no bind parameters over the extended protocol, set_config does
+    with stage('plan'):
+        await conn.execute("SELECT set_config('statement_timeout', $1, true)", str(STATEMENT_TIMEOUT_MS))
+        # dc - 2026-10-18 - VERBOSE, as in AuroraAI.prepare_query, so the plan names the schema of every relation
+        explain_output = await conn.fetchval('EXPLAIN (VERBOSE, FORMAT JSON) ' + sql_from_bedrock)
+    return AuroraAI.gate_plan(explain_output, sql_from_bedrock, details, limit_rows)
+
+
+
+async def execute_sql(sql_from_bedrock, details=None):
+    details = {} if details is None else details
+    try:
+        log('execute_sql', sql=sql_from_bedrock)
+
+        # dc - 2026-10-18 - Same result cache as AuroraAI.execute_sql; a lookup may probe the table counters, so it is offloaded
+        cache_key, cached = await run_blocking(AuroraAI.lookup_result, sql_from_bedrock, details)
+        if cached is not None:
+            columns, data, _ = cached
+            log('sql_executed', rows=len(data), result_cache='hit')
+            set_outcome('success')
+            count('rows', len(data))
+            return columns, data
+
+        # dc - 2026-10-18 - Cancelling the request while a query runs makes asyncpg cancel it on the server
+        borrowed = await checkout()
+        conn = borrowed.conn
+        try:
+            # dc - 2026-10-18 - asyncpg autocommits by default; SET LOCAL needs an explicit transaction
+            async with conn.transaction():
+                sql_to_run, rejection = await prepare_query(conn, sql_from_bedrock, details)
+                if rejection is not None:
+                    return rejection
+                relations, versions = await run_blocking(AuroraAI.result_versions, cache_key, details)
+                with stage('execute'):
+                    statement = await conn.prepare(sql_to_run)
+                    columns = [attribute.name for attribute in statement.get_attributes()]
+                    data = [tuple(record) for record in await statement.fetch()]
+        finally:
+            await borrowed.release()
+        log('sql_executed', rows=len(data))
+        set_outcome('success')
+        count('rows', len(data))
+        AuroraAI.store_result(cache_key, relations, versions, borrowed.lag, columns, data, details.get('plan'))
+        return columns, data
+
+    except Exception as e:
+        if _is_query_cancelled(e):
+            return AuroraAI.query_cancelled(e, details)
+        set_outcome('error')
+        log('execute_error', 'error', error=str(e))
+        return None, None
+
+
+
+class AsyncRowStream:
+    """Rows of an asyncpg cursor, fetched ``itersize`` at a time.
+
+    Owns its Checkout and transaction until the rows are exhausted or
+    ``close()`` is awaited, e.g. when the client disconnects mid-stream.
+    ``collect_bytes`` and ``on_complete`` work as in AuroraAI.RowStream.
+    """
+
+    def __init__(self, borrowed, transaction, cursor, first_batch, itersize, started, collect_bytes=0):
+        self._borrowed = borrowed
+        self._transaction = transaction
+        self._cursor = cursor
+        self._first_batch = first_batch
+        self._itersize = itersize
+        self._collect_bytes = collect_bytes
+        self._collected = [] if collect_bytes else None
+        self._collected_size = 0
+        self._callbacks = []
+        self.started = started
+        self.time_to_first_row = time.monotonic() - started if first_batch else None
+        self.row_count = 0
+
+    def __aiter__(self):
+        return self._rows()
+
+    async def _rows(self):
+        try:
+            batch = self._first_batch
+            self._first_batch = None
+            while batch:
+                batch = [tuple(record) for record in batch]
+                self._collect(batch)
+                for row in batch:
+                    self.row_count += 1
+                    yield row
+                batch = await self._cursor.fetch(self._itersize) if len(batch) == self._itersize else None
+            for callback in self._callbacks:
+                callback(self._collected)
+        except Exception as e:
+            if not _is_query_cancelled(e):
+                raise
+            log('query_cancelled', 'warning', error=str(e), streaming=True)
+        finally:
+            await self.close()
+
+    def on_complete(self, callback):
+        self._callbacks.append(callback)
+
+    def _collect(self, batch):
+        if self._collected is None:
+            return
+        self._collected_size += sum(len(repr(row)) for row in batch)
+        if self._collected_size > self._collect_bytes:
+            self._collected = None
+            return
+        self._collected.extend(batch)
+
+    async def close(self):
+        if self._borrowed is None:
+            return
+        borrowed, self._borrowed = self._borrowed, None
+        try:
+            await self._transaction.rollback()
+        except Exception as e:
+            log('cursor_close_error', 'error', error=str(e))
+        await borrowed.release()
+        log('stream_closed', rows=self.row_count)
+
+
+
+async def execute_sql_stream(sql_from_bedrock, details=None, itersize=STREAM_ITERSIZE):
+    details = {} if details is None else details
+    borrowed = None
+    transaction = None
+    try:
+        log('execute_sql', sql=sql_from_bedrock, streaming=True)
+        started = time.monotonic()
+
+        # dc - 2026-10-18 - Same result cache as execute_sql: a hit is streamed from memory
+        cache_key, cached = await run_blocking(AuroraAI.lookup_result, sql_from_bedrock, details)
+        if cached is not None:
+            columns, data, _ = cached
+            log('sql_executed', rows=len(data), result_cache='hit', streaming=True)
+            set_outcome('success')
+            return columns, data
+
+        borrowed = await checkout()
+        conn = borrowed.conn
+        transaction = conn.transaction()
+        await transaction.start()
+
+        # dc - 2026-10-18 - Cost and row gates, as in AuroraAI.execute_sql_stream
+        sql_to_run, rejection = await prepare_query(conn, sql_from_bedrock, details)
+        if rejection is not None:
+            return rejection
+        relations, versions = await run_blocking(AuroraAI.result_versions, cache_key, details)
+
+        with stage('execute'):
+            statement = await conn.prepare(sql_to_run)
+            columns = [attribute.name for attribute in statement.get_attributes()]
+            cursor = await statement.cursor()
+            # dc - 2026-10-18 - Fetch the first batch now so errors surface before the response starts
+            first_batch = await cursor.fetch(itersize)
+        log('sql_executed', first_batch_rows=len(first_batch), streaming=True)
+        set_outcome('success')
+
+        # dc - 2026-10-18 - A result small enough for the cache is stored once it has been streamed in full
+        if versions is not None:
+            rows = AsyncRowStream(borrowed, transaction, cursor, first_batch, itersize, started,
+                                  min(RESULT_CACHE_STREAM_MAX_BYTES, AuroraAI.result_cache.max_bytes))
+            rows.on_complete(AuroraAI.stream_cache_writer(cache_key, relations, versions, borrowed.lag, columns,
+                                                          details.get('plan')))
+        else:
+            if cache_key is not None:
+                AuroraAI.result_cache.record('uncacheable')
+            rows = AsyncRowStream(borrowed, transaction, cursor, first_batch, itersize, started)
+        borrowed = None
+        return columns, rows
+
+    except Exception as e:
+        if _is_query_cancelled(e):
+            return AuroraAI.query_cancelled(e, details)
+        set_outcome('error')
+        log('execute_error', 'error', error=str(e), streaming=True)
+        return None, None
+
+    finally:
+        # dc - 2026-10-18 - Only reached with a connection when the query failed or was cancelled
+        if borrowed is not None:
+            if transaction is not None:
+                try:
+                    await transaction.rollback()
+                except Exception as e:
+                    log('rollback_error', 'error', error=str(e))
+            await borrowed.release()
+
+
+
+async def _iterate(rows):
+    # dc - 2026-10-18 - Rejections come back as a plain list of rows, results as an AsyncRowStream
+    if hasattr(rows, '__aiter__'):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+
+async def stream_result(columns, rows, fmt='ndjson', plan=None):
+    # dc - 2026-10-18 - Same framing as AuroraAI.stream_result, encoded with the typed encoder
+    started = getattr(rows, 'started', time.monotonic())
+    row_count = 0
+    if fmt == 'json':
+        yield b'{"columns": ' + dumps_bytes(columns) + b', "plan": ' + dumps_bytes(plan) + b', "rows": ['
+    else:
+        yield dumps_bytes({'columns': columns, 'plan': plan}) + b'\n'
+    async for row in _iterate(rows):
+        if fmt == 'json':
+            yield (b',' if row_count else b'') + dumps_bytes(list(row))
+        else:
+            yield dumps_bytes(list(row)) + b'\n'
+        row_count += 1
+    summary = {
+        'row_count': row_count,
+        'time_to_first_row_ms': round(rows.time_to_first_row * 1000, 1) if getattr(rows, 'time_to_first_row', None) is not None else None,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+    count('rows', row_count)
+    log('stream_complete', **summary)
+    if fmt == 'json':
+        yield b'], "summary": ' + dumps_bytes(summary) + b'}'
+    else:
+        yield dumps_bytes({'summary': summary}) + b'\n'
+
+
+
+def negotiate_encoding(scope):
+    # dc - 2026-10-18 - Accept-Encoding parsing for ASGI scopes; same preference as AuroraAI.negotiate_encoding
+    header = dict(scope.get('headers') or []).get(b'accept-encoding', b'').decode('latin-1')
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    if brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return None
+
+
+
+def response_headers(content_type, trace):
+    headers = [(b'content-type', content_type.encode('latin-1'))]
+    if SERVER_TIMING and trace is not None:
+        headers.append((b'server-timing', trace.server_timing().encode('latin-1')))
+    return headers
+
+
+
+async def send_response(send, body, status=200, content_type='application/json', encoding=None):
+    trace = AuroraAI._current_trace.get()
+    headers = response_headers(content_type, trace)
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    if encoding:
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+    if content_type == 'application/json':
+        headers.append((b'vary', b'Accept-Encoding'))
+    if trace is not None:
+        trace.status = status
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+
+async def send_json(send, payload, status=200):
+    await send_response(send, json.dumps(payload).encode('utf-8'), status)
+
+
+
+async def send_compressed(scope, send, body, status=200):
+    encoding = negotiate_encoding(scope) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        with stage('compress'):
+            body = compress_body(body, encoding)
+    count('response_bytes', len(body))
+    await send_response(send, body, status, encoding=encoding)
+
+
+
+async def send_stream(send, chunks, content_type):
+    # dc - 2026-10-18 - Server-Timing can only cover the stages before the first row; the request log has the rest
+    trace = AuroraAI._current_trace.get()
+    if trace is not None:
+        trace.status = 200
+    await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers(content_type, trace)})
+    async for chunk in chunks:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+
+_index_html = None
+
+
+
+def index_html():
+    # dc - 2026-10-18 - The page the Flask app renders; it has no template variables, so serve it as-is
+    global _index_html
+    if _index_html is None:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html'), 'rb') as f:
+            _index_html = f.read()
+    return _index_html
+
+
+
+async def home(scope, body, send):
+    await send_response(send, index_html(), content_type='text/html; charset=utf-8')
+
+
+
+async def generate(scope, body, send):
+    try:
+        data = json.loads(body)
+        prompt = data.get('prompt', '')
+        stream = data.get('stream')
+        # dc - 2026-10-18 - "cache": false or Cache-Control: no-cache skips the result cache lookup, as on the Flask app
+        cache_control = dict(scope.get('headers') or []).get(b'cache-control', b'').decode('latin-1')
+        details = {'bypass_cache': data.get('cache') is False or 'no-cache' in cache_control}
+        if stream:
+            columns, rows = await call_bedrock(prompt, execute=execute_sql_stream, details=details)
+        else:
+            columns, rows = await call_bedrock(prompt, details=details)
+    except Exception as e:
+        log('request_error', 'error', error=str(e))
+        await send_json(send, {'error': str(e)}, 500)
+        return
+
+    if stream:
+        if not columns:
+            await send_json(send, {'error': 'No data returned'}, 404)
+            return
+        fmt = 'json' if stream == 'json' else 'ndjson'
+        try:
+            await send_stream(send, stream_result(columns, rows, fmt, details.get('plan')),
+                              'application/json' if fmt == 'json' else 'application/x-ndjson')
+        finally:
+            # dc - 2026-10-18 - Release the connection whether the stream finished, failed or was cancelled
+            if hasattr(rows, 'close'):
+                await rows.close()
+        return
+
+    if columns and rows:
+        extra = {'plan': details['plan']} if 'plan' in details else None
+        layout = 'columnar' if data.get('layout') == 'columnar' else 'rows'
+        with stage('encode'):
+            body = encode_result(columns, rows, layout, extra)
+        await send_compressed(scope, send, body)
+    else:
+        await send_json(send, {'error': 'No data returned'}, 404)
+
+
+
+async def metrics(scope, body, send):
+    await send_response(send, render_metrics().encode('utf-8'), content_type='text/plain; version=0.0.4')
+
+
+
+async def result_cache_stats(scope, body, send):
+    await send_json(send, AuroraAI.result_cache.stats())
+
+
+
+async def invalidate_result_cache(scope, body, send):
+    # dc - 2026-10-18 - Each process has its own result cache, so an ASGI server needs its own invalidation endpoint
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = {}
+    AuroraAI.result_cache.invalidate(data.get('table') if isinstance(data, dict) else None)
+    await send_json(send, AuroraAI.result_cache.stats())
+
+
+
+ROUTES = {
+    ('GET', '/'): home,
+    ('POST', '/generate'): generate,
+    ('GET', '/metrics'): metrics,
+    ('GET', '/stats/result_cache'): result_cache_stats,
+    ('POST', '/result_cache/invalidate'): invalidate_result_cache,
+}
+
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+
+async def run_cancellable(handler, scope, body, receive, send):
+    # dc - 2026-10-18 - Cancel the handler as soon as the client disconnects; awaits inside it raise CancelledError
+    handler_task = asyncio.ensure_future(handler(scope, body, send))
+    disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        done, _ = await asyncio.wait([handler_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+        if handler_task not in done:
+            set_outcome('cancelled')
+            log('client_disconnected', path=scope['path'])
+            handler_task.cancel()
+        try:
+            await handler_task
+        except asyncio.CancelledError:
+            if handler_task not in done:
+                return
+            raise
+    finally:
+        disconnect_task.cancel()
+        handler_task.cancel()
+
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_offload_executor()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_db_pool()
+            if _offload_executor is not None:
+                _offload_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await send_json(send, {'error': 'Not found'}, 404)
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    # dc - 2026-10-18 - Tasks copy the context when created, so the handler and its stages see this trace
+    trace, token = start_trace(handler.__name__)
+    try:
+        await run_cancellable(handler, scope, body, receive, send)
+    finally:
+        AuroraAI._current_trace.reset(token)
+        finish_trace(trace, trace.status)
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import asgi
+import fakes
+
+
+
+# dc - 2026-10-18 - Sync Flask path vs the ASGI path under many concurrent clients, with Bedrock and the database stubbed
+
+
+
+def stub_backends(bedrock_latency, tables):
+    # dc - 2026-10-18 - Fake Bedrock client, no rate limit, and a cached synthetic schema that is never re-checked
+    AuroraAI.set_aws_client('bedrock-runtime', fakes.FakeBedrockClient('SELECT 1;', latency=bedrock_latency))
+    AuroraAI._rate_limiters[AuroraAI.BEDROCK_MODEL_ID] = AuroraAI.RateLimiter(0)
+    metadata = fakes.synthetic_metadata(tables)
+    AuroraAI.schema_cache.check_interval = float('inf')
+    AuroraAI.schema_cache.get(AuroraAI.SCHEMA_NAME, lambda: ('benchmark', metadata), lambda: 'benchmark')
+
+
+def stub_execute(db_latency):
+    def execute_sql(sql_from_bedrock, details=None):
+        time.sleep(db_latency)
+        return ['result'], [(1,)]
+
+    async def execute_sql_async(sql_from_bedrock, details=None):
+        await asyncio.sleep(db_latency)
+        return ['result'], [(1,)]
+
+    AuroraAI.execute_sql = execute_sql
+    asgi.execute_sql = execute_sql_async
+
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    pick = lambda fraction: latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+
+class ThreadSampler:
+    """Records the highest thread count seen while the load runs."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+
+
+def run_sync(requests, clients, server_threads):
+    # dc - 2026-10-18 - A threaded WSGI server modelled as a fixed worker pool; latency includes the queue wait
+    client = AuroraAI.app.test_client()
+    statuses = []
+
+    def one(index, submitted):
+        response = client.post('/generate', json={'prompt': 'sync report %d' % index})
+        statuses.append(response.status_code)
+        return time.perf_counter() - submitted
+
+    latencies = []
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=server_threads) as server:
+        started = time.perf_counter()
+        pending = []
+        for index in range(requests):
+            # dc - 2026-10-18 - Keep at most `clients` requests outstanding, like closed-loop clients
+            if len(pending) >= clients:
+                latencies.append(pending.pop(0).result())
+            pending.append(server.submit(one, index, time.perf_counter()))
+        latencies.extend(future.result() for future in pending)
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, sampler.peak, statuses
+
+
+async def _asgi_request(path, payload):
+    body = json.dumps(payload).encode('utf-8')
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': [(b'content-type', b'application/json')]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await asgi.app(scope, receive, send)
+    disconnected.set()
+    return status[0] if status else None
+
+
+async def _run_async(requests, clients):
+    semaphore = asyncio.Semaphore(clients)
+    statuses = []
+
+    async def one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            statuses.append(await _asgi_request('/generate', {'prompt': 'async report %d' % index}))
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[one(index) for index in range(requests)])
+    return time.perf_counter() - started, latencies, statuses
+
+
+def run_async(requests, clients):
+    with ThreadSampler() as sampler:
+        elapsed, latencies, statuses = asyncio.run(_run_async(requests, clients))
+    return elapsed, latencies, sampler.peak, statuses
+
+
+
+def report(name, requests, elapsed, latencies, peak_threads, statuses):
+    p50, p95, p99 = percentiles(latencies)
+    failures = sum(1 for status in statuses if status != 200)
+    print('%-6s %8d %10.2f %10.1f %9.1f %9.1f %9.1f %8d %8d' % (
+        name, requests, elapsed, requests / elapsed, p50, p95, p99, peak_threads, failures))
+
+
+def run(requests, clients, server_threads, offload_workers, bedrock_latency, db_latency, tables):
+    stub_backends(bedrock_latency, tables)
+    stub_execute(db_latency)
+    asgi._offload_executor = ThreadPoolExecutor(max_workers=offload_workers, thread_name_prefix='auroraai-offload')
+    print('clients: %d, sync server threads: %d, async offload workers: %d, bedrock: %.0f ms, db: %.0f ms' % (
+        clients, server_threads, offload_workers, bedrock_latency * 1000, db_latency * 1000))
+    print('%-6s %8s %10s %10s %9s %9s %9s %8s %8s' % (
+        'path', 'requests', 'elapsed_s', 'req/s', 'p50_ms', 'p95_ms', 'p99_ms', 'threads', 'failed'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync_result = run_sync(requests, clients, server_threads)
+    report('sync', requests, *sync_result)
+    AuroraAI.sql_cache.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        async_result = run_async(requests, clients)
+    report('async', requests, *async_result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync vs async /generate load test with stubbed backends')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--server-threads', type=int, default=32, help='worker threads of the sync server')
+    parser.add_argument('--offload-workers', type=int, default=asgi.ASYNC_OFFLOAD_WORKERS)
+    parser.add_argument('--bedrock-latency', type=float, default=0.2, help='seconds per fake Bedrock call')
+    parser.add_argument('--db-latency', type=float, default=0.05, help='seconds per stubbed query')
+    parser.add_argument('--tables', type=int, default=20)
+    args = parser.parse_args()
+    run(args.requests, args.clients, args.server_threads, args.offload_workers,
+        args.bedrock_latency, args.db_latency, args.tables)
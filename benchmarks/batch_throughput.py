@@ -0,0 +1,51 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import fakes
+
+
+
+def fake_execute(sql_from_bedrock, details=None):
+    # dc - 2026-10-18 - Stand-in for execute_sql so only the generation fan-out is measured
+    return ['result'], [(1,)]
+
+
+
+# dc - 2026-10-18 - Prompts per second through run_batch as the worker count grows, against a fake Bedrock client
+def run(prompts, concurrency_levels, latency, max_concurrent, rps):
+    client = fakes.FakeBedrockClient('SELECT 1;', latency=latency, max_concurrent=max_concurrent)
+    AuroraAI.set_aws_client('bedrock-runtime', client)
+    AuroraAI.BEDROCK_BACKOFF_BASE = latency / 2 or 0.01
+    metadata = fakes.synthetic_metadata(20)
+    print('%8s %10s %12s %10s %10s' % ('workers', 'prompts', 'elapsed_s', 'prompt/s', 'throttled'))
+    for workers in concurrency_levels:
+        AuroraAI._rate_limiters[AuroraAI.BEDROCK_MODEL_ID] = AuroraAI.RateLimiter(rps)
+        AuroraAI.sql_cache.clear()
+        client.throttled = 0
+        batch = ['report number %d for workers %d' % (index, workers) for index in range(prompts)]
+        with ThreadPoolExecutor(max_workers=workers) as executor, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            results = AuroraAI.run_batch(batch, execute=fake_execute, metadata=metadata, executor=executor)
+            elapsed = time.perf_counter() - started
+        errors = sum(1 for result in results if 'error' in result)
+        print('%8d %10d %12.2f %10.1f %10d%s' % (workers, prompts, elapsed, prompts / elapsed, client.throttled,
+                                                 '  (%d errors)' % errors if errors else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch generation throughput against a fake Bedrock client')
+    parser.add_argument('--prompts', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per fake Bedrock call')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='throttle beyond this many in-flight calls')
+    parser.add_argument('--rps', type=float, default=0, help='per-model rate limit; 0 disables it')
+    args = parser.parse_args()
+    run(args.prompts, args.workers, args.latency, args.max_concurrent, args.rps)
@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import fakes
+
+
+
+# dc - 2026-10-18 - End-to-end benchmarks against local stand-ins for Bedrock, Secrets Manager and the database
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'e2e.json')
+
+# dc - 2026-10-18 - Metrics compared against a saved baseline and which direction is better
+COMPARED_METRICS = (
+    ('p50_ms', 'lower'),
+    ('p95_ms', 'lower'),
+    ('p99_ms', 'lower'),
+    ('throughput', 'higher'),
+    ('alloc_peak_kb', 'lower'),
+)
+
+_sequence = itertools.count()
+_local = threading.local()
+
+
+
+def setup(args):
+    # dc - 2026-10-18 - Wire every external dependency of AuroraAI.py to an in-process fake
+    database = fakes.FakeDatabase(args.tables, args.columns, args.rows, latency=args.db_latency)
+    AuroraAI.set_aws_client('secretsmanager', fakes.FakeSecretsManagerClient(
+        {AuroraAI.SECRET_ID: database.secret()}, latency=args.secret_latency))
+    AuroraAI.set_aws_client('bedrock-runtime', fakes.FakeBedrockClient(
+        lambda prompt_text: canned_sql(prompt_text, args.result_rows), latency=args.bedrock_latency))
+    AuroraAI.set_db_connect(database.connect)
+    AuroraAI._rate_limiters[AuroraAI.BEDROCK_MODEL_ID] = AuroraAI.RateLimiter(0)
+    AuroraAI.secret_cache.invalidate()
+    AuroraAI.schema_cache.invalidate()
+    AuroraAI.sql_cache.clear()
+    AuroraAI.result_cache.clear()
+    return database
+
+
+def canned_sql(prompt_text, result_rows):
+    # dc - 2026-10-18 - Answer with a SELECT on the table the question names; the question is the prompt's last line
+    question = prompt_text.strip().splitlines()[-1]
+    match = re.search(r'table_(\d+)', question)
+    table = int(match.group(1)) if match else 0
+    return 'SELECT * FROM dc_ai_test.table_%04d WHERE id <= %d;' % (table, result_rows)
+
+
+def prompt_for(args):
+    # dc - 2026-10-18 - Unique prompts miss the SQL cache so every call reaches Bedrock, unless --cached
+    table = next(_sequence) % args.tables
+    if args.cached:
+        return 'list the rows of table_%04d' % table
+    return 'list the rows of table_%04d, request %d' % (table, next(_sequence))
+
+
+
+def drive_get_metadata(args):
+    AuroraAI.schema_cache.invalidate(AuroraAI.SCHEMA_NAME)
+    if AuroraAI.get_metadata() is None:
+        raise RuntimeError('get_metadata failed')
+
+
+def result_details(args):
+    # dc - 2026-10-18 - Canned SQL repeats after the first pass over the tables, so skip the result cache unless --result-cache
+    return {'bypass_cache': not args.result_cache}
+
+
+def drive_execute_sql(args):
+    columns, rows = AuroraAI.execute_sql(canned_sql(prompt_for(args), args.result_rows), result_details(args))
+    if columns is None:
+        raise RuntimeError('execute_sql failed')
+
+
+def drive_call_bedrock(args):
+    result = AuroraAI.call_bedrock(prompt_for(args), details=result_details(args))
+    if result is None or result[0] is None:
+        raise RuntimeError('call_bedrock failed')
+
+
+def drive_generate(args):
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _local.client = AuroraAI.app.test_client()
+    response = client.post('/generate', json={'prompt': prompt_for(args), 'cache': args.result_cache})
+    if response.status_code != 200:
+        raise RuntimeError('/generate returned %d' % response.status_code)
+
+
+
+DRIVERS = {
+    'get_metadata': drive_get_metadata,
+    'execute_sql': drive_execute_sql,
+    'call_bedrock': drive_call_bedrock,
+    'generate': drive_generate,
+}
+
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def peak_rss_mb():
+    # dc - 2026-10-18 - ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure_allocations(operation, iterations):
+    # dc - 2026-10-18 - Separate single-threaded pass: tracemalloc is too slow to leave on for the timed run
+    if iterations <= 0:
+        return None, None
+    tracemalloc.start()
+    peaks = []
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(iterations):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        operation()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    net_blocks = (sys.getallocatedblocks() - blocks_before) / iterations
+    tracemalloc.stop()
+    return max(peaks) / 1024, net_blocks
+
+
+def measure(operation, iterations, concurrency, warmup, alloc_iterations):
+    for _ in range(warmup):
+        operation()
+
+    def timed(_):
+        started = time.perf_counter()
+        operation()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(index) for index in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started
+    alloc_peak_kb, alloc_net_blocks = measure_allocations(operation, alloc_iterations)
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'throughput': iterations / elapsed,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'alloc_peak_kb': alloc_peak_kb,
+        'alloc_net_blocks': alloc_net_blocks,
+    }
+
+
+
+def report(results):
+    print('%-14s %6s %5s %10s %9s %9s %9s %9s %10s %11s' % (
+        'driver', 'iters', 'conc', 'ops/s', 'p50_ms', 'p95_ms', 'p99_ms', 'rss_mb', 'alloc_kb', 'net_blocks'))
+    for name, metrics in results.items():
+        print('%-14s %6d %5d %10.1f %9.2f %9.2f %9.2f %9.1f %10.1f %11.1f' % (
+            name, metrics['iterations'], metrics['concurrency'], metrics['throughput'], metrics['p50_ms'],
+            metrics['p95_ms'], metrics['p99_ms'], metrics['peak_rss_mb'], metrics['alloc_peak_kb'] or 0,
+            metrics['alloc_net_blocks'] or 0))
+
+
+def compare(results, baseline, tolerance):
+    # dc - 2026-10-18 - Flag any metric that moved in the wrong direction by more than the tolerance
+    regressions = []
+    print('%-14s %-14s %12s %12s %9s' % ('driver', 'metric', 'baseline', 'current', 'change'))
+    for name, metrics in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for key, better in COMPARED_METRICS:
+            if not previous.get(key) or metrics.get(key) is None:
+                continue
+            change = (metrics[key] - previous[key]) / previous[key]
+            worse = change > tolerance if better == 'lower' else change < -tolerance
+            print('%-14s %-14s %12.2f %12.2f %+8.1f%%%s' % (
+                name, key, previous[key], metrics[key], change * 100, '  REGRESSION' if worse else ''))
+            if worse:
+                regressions.append((name, key))
+    return regressions
+
+
+
+def run(args):
+    setup(args)
+    results = {}
+    # dc - 2026-10-18 - The structured logs would dominate the output; measure with them written to /dev/null
+    with open(os.devnull, 'w') as devnull:
+        for name in args.drivers:
+            with contextlib.redirect_stdout(devnull):
+                results[name] = measure(lambda: DRIVERS[name](args), args.iterations, args.concurrency,
+                                        args.warmup, args.alloc_iterations)
+    report(results)
+
+    config = {key: value for key, value in vars(args).items() if key not in ('save', 'compare', 'tolerance')}
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'config': config,
+                'results': results,
+            }, f, indent=2)
+        print('Baseline saved to', args.save)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print('Warning: baseline was recorded with a different configuration:', baseline.get('config'))
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmarks of the AuroraAI pipeline')
+    parser.add_argument('--drivers', nargs='+', choices=sorted(DRIVERS), default=list(DRIVERS))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--alloc-iterations', type=int, default=20, help='iterations of the tracemalloc pass; 0 skips it')
+    parser.add_argument('--tables', type=int, default=20)
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=1000, help='rows seeded per table')
+    parser.add_argument('--result-rows', type=int, default=100, help='rows returned by each generated query')
+    parser.add_argument('--bedrock-latency', type=float, default=0.0, help='seconds per fake Bedrock call')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='seconds per fake database statement')
+    parser.add_argument('--secret-latency', type=float, default=0.0, help='seconds per fake Secrets Manager call')
+    parser.add_argument('--cached', action='store_true', help='repeat prompts so the SQL cache serves them')
+    parser.add_argument('--result-cache', action='store_true', help='let the result cache serve repeated SQL')
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, help='write results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative change counted as a regression')
+    args = parser.parse_args()
+    sys.exit(run(args))
@@ -0,0 +1,78 @@
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+
+
+
+# dc - 2026-10-18 - The regex guardrail as it was before the lexer, kept here for comparison
+def legacy_guardrail(prompt, caller):
+    forbidden_words = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER']
+    upper_response = prompt.upper()
+    found_words = []
+    for word in forbidden_words:
+        pattern = r'\b' + re.escape(word) + r'\b'
+        if re.search(pattern, upper_response):
+            found_words.append(word)
+    if found_words:
+        print('Prohibited words found in', caller)
+        print(prompt)
+        print(found_words)
+        return('forbidden')
+    else:
+        print('No prohibited words found in', caller)
+        return('allowed')
+
+
+
+def make_sql(target_bytes):
+    # dc - 2026-10-18 - A wide SELECT with joins, literals, comments and a dollar-quoted string
+    parts = ['SELECT o.order_id, c.customer_name']
+    index = 0
+    while sum(len(part) for part in parts) < target_bytes:
+        parts.append(", CASE WHEN o.col_%d = 'value %d' THEN $$text %d$$ ELSE o.amount_%d END AS c_%d -- col %d\n"
+                     % (index, index, index, index, index, index))
+        index += 1
+    parts.append(' FROM dc_ai_test.orders o JOIN dc_ai_test.customers c ON c.customer_id = o.customer_id;')
+    return ''.join(parts)
+
+
+
+def measure(function, text, repeat):
+    sink = io.StringIO()
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            function(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        sink.seek(0)
+        sink.truncate()
+    return best * 1000
+
+
+
+def run(sizes, repeat):
+    print('%10s %14s %14s %14s' % ('bytes', 'legacy_ms', 'inspect_ms', 'prompt_ms'))
+    for size in sizes:
+        sql = make_sql(size)
+        legacy = measure(lambda text: legacy_guardrail(text, 'benchmark'), sql, repeat)
+        lexer = measure(AuroraAI.inspect_sql, sql, repeat)
+        prompt = measure(lambda text: AuroraAI.sql_injection_guardrail(text, 'benchmark'), sql, repeat)
+        print('%10d %14.3f %14.3f %14.3f' % (len(sql), legacy, lexer, prompt))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SQL guardrail microbenchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,139 @@
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import fakes
+
+
+
+# dc - 2026-10-18 - Reader routing under load: how queries spread over the readers and how a lagging or
+# dc - 2026-10-18 - unreachable reader is ejected and re-admitted. Runs against FakeDatabase instances by default,
+# dc - 2026-10-18 - or against real local PostgreSQL instances with --writer/--readers (e.g. one per port).
+FAKE_WRITER_PORT = 5432
+
+
+
+def setup_fake(args):
+    # dc - 2026-10-18 - Same seed everywhere, so every instance holds the same rows like a real replica would
+    writer = fakes.FakeDatabase(args.tables, args.columns, args.rows, latency=args.db_latency)
+    readers = {}
+    for index in range(args.fake_readers):
+        latency = args.db_latency * (1 + index * args.latency_spread)
+        readers[FAKE_WRITER_PORT + 1 + index] = fakes.FakeDatabase(args.tables, args.columns, args.rows, latency=latency)
+    secret = writer.secret()
+    secret['DB_PORT'] = str(FAKE_WRITER_PORT)
+    AuroraAI.set_aws_client('secretsmanager', fakes.FakeSecretsManagerClient({AuroraAI.SECRET_ID: secret}))
+    AuroraAI.set_db_connect(fakes.connect_by_port(readers, default=writer))
+    return writer, readers, ['localhost:%d' % port for port in readers]
+
+
+def setup_real(args):
+    # dc - 2026-10-18 - Only the secret is faked; connections go to the given PostgreSQL instances
+    host, _, port = args.writer.rpartition(':')
+    secret = {'DB_NAME': args.dbname, 'DB_USER': args.user, 'DB_PASSWORD': args.password,
+              'DB_HOST': host, 'DB_PORT': port}
+    AuroraAI.set_aws_client('secretsmanager', fakes.FakeSecretsManagerClient({AuroraAI.SECRET_ID: secret}))
+    return [item.strip() for item in args.readers.split(',') if item.strip()]
+
+
+def build_router(args, hosts):
+    readers = AuroraAI.reader_pools(','.join(hosts))
+    router = AuroraAI.ReplicaRouter(AuroraAI.get_db_pool(), readers, policy=args.policy, max_lag=args.max_lag,
+                                    check_interval=args.check_interval)
+    AuroraAI._read_router = router
+    AuroraAI.DB_READER_HOSTS = ','.join(hosts)
+    AuroraAI.RESULT_CACHE_ENABLED = False
+    return router
+
+
+
+def run_phase(name, router, args):
+    # dc - 2026-10-18 - Returns the report lines; the structured logs go to stdout while the queries run
+    before = {endpoint.name: endpoint.checkouts for endpoint in [router.writer] + router.readers}
+    fallbacks = router.stats()['writer_fallbacks']
+
+    def one(_):
+        started = time.perf_counter()
+        columns, rows = AuroraAI.execute_sql(args.sql)
+        return time.perf_counter() - started, columns is not None and columns != ['Error message']
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(one, range(args.queries)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    stats = router.stats()
+    lines = ['%s: %d queries in %.2fs, p50 %.1f ms, p95 %.1f ms, %d failed, %d on the writer' % (
+        name, len(results), elapsed, latencies[len(latencies) // 2] * 1000,
+        latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        sum(1 for _, ok in results if not ok), stats['writer_fallbacks'] - fallbacks)]
+    for endpoint in [stats['writer']] + stats['readers']:
+        lines.append('    %-16s %-8s lag %-6s latency %-8s queries %5d  ejections %d  readmissions %d' % (
+            endpoint['name'], 'healthy' if endpoint['healthy'] else 'EJECTED',
+            '-' if endpoint['lag_seconds'] is None else '%.1fs' % endpoint['lag_seconds'],
+            '-' if endpoint['latency_ms'] is None else '%.1fms' % endpoint['latency_ms'],
+            endpoint['checkouts'] - before[endpoint['name']], endpoint['ejections'], endpoint['readmissions']))
+    return lines
+
+
+def settle(router, args):
+    # dc - 2026-10-18 - Let the background lag checks run often enough to cross the eject or readmit threshold
+    deadline = time.monotonic() + args.check_interval * (max(router.eject_after, router.readmit_after) + 2)
+    while time.monotonic() < deadline:
+        router._schedule_checks()
+        time.sleep(args.check_interval / 4)
+
+
+
+def run(args):
+    if args.readers:
+        router = build_router(args, setup_real(args))
+        phases = [('steady', None)]
+    else:
+        writer, readers, hosts = setup_fake(args)
+        router = build_router(args, hosts)
+        lagging, down = list(readers.values())[0], list(readers.values())[-1]
+        phases = [
+            ('steady', None),
+            ('first reader lags %.0fs' % (args.max_lag * 2), lambda: setattr(lagging, 'replica_lag', args.max_lag * 2)),
+            ('last reader unreachable', lambda: setattr(down, 'available', False)),
+            ('both recovered', lambda: (setattr(lagging, 'replica_lag', 0.0), setattr(down, 'available', True))),
+        ]
+    with open(os.devnull, 'w') as devnull:
+        for name, change in phases:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                if change is not None:
+                    change()
+                    settle(router, args)
+                lines = run_phase(name, router, args)
+            print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reader routing, ejection and re-admission under load')
+    parser.add_argument('--policy', choices=['least_outstanding', 'latency'], default='least_outstanding')
+    parser.add_argument('--queries', type=int, default=400, help='queries per phase')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--sql', default='SELECT * FROM dc_ai_test.table_0001 WHERE id <= 20')
+    parser.add_argument('--max-lag', type=float, default=5.0)
+    parser.add_argument('--check-interval', type=float, default=0.2)
+    parser.add_argument('--fake-readers', type=int, default=3)
+    parser.add_argument('--latency-spread', type=float, default=1.0,
+                        help='each further fake reader is this much slower, relative to --db-latency')
+    parser.add_argument('--db-latency', type=float, default=0.002, help='seconds per fake database statement')
+    parser.add_argument('--tables', type=int, default=5)
+    parser.add_argument('--columns', type=int, default=6)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--writer', default='localhost:5432', help='host:port of a real writer, with --readers')
+    parser.add_argument('--readers', default='', help='host:port,... of real readers; omit to use fakes')
+    parser.add_argument('--dbname', default='postgres')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--verbose', action='store_true', help='show the structured logs')
+    run(parser.parse_args())
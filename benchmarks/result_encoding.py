@@ -0,0 +1,75 @@
+import argparse
+import datetime
+import decimal
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+
+
+
+# dc - 2026-10-18 - Only the JSON provider is needed, so nothing is warmed up
+flask_app = AuroraAI.create_app(warm='off')
+
+COLUMNS = ['order_id', 'region', 'amount', 'ordered_at', 'ordered_on', 'payload']
+
+
+
+def make_rows(count):
+    # dc - 2026-10-18 - Row tuples with the types psycopg2 hands back: int, text, Decimal, datetime, date, bytea
+    base = datetime.datetime(2024, 1, 1)
+    regions = ['north', 'south', 'east', 'west']
+    return [
+        (index, regions[index % 4], decimal.Decimal(index % 10000) / 100,
+         base + datetime.timedelta(minutes=index), (base + datetime.timedelta(days=index % 365)).date(),
+         memoryview(b'\x00\x01\x02\x03'))
+        for index in range(count)
+    ]
+
+
+
+def flask_default(columns, rows):
+    # dc - 2026-10-18 - What jsonify did before: Flask's provider, row-major lists
+    with flask_app.app_context():
+        return flask_app.json.dumps({'columns': columns, 'rows': [
+            [base64_cell(value) for value in row] for row in rows]}).encode('utf-8')
+
+
+
+def base64_cell(value):
+    # dc - 2026-10-18 - Flask cannot encode memoryview at all, so give it the same base64 text
+    return AuroraAI.encode_value(value) if isinstance(value, memoryview) else value
+
+
+
+ENCODERS = [
+    ('flask_rows', flask_default),
+    ('typed_rows', lambda columns, rows: AuroraAI.encode_result(columns, rows, 'rows')),
+    ('typed_columnar', lambda columns, rows: AuroraAI.encode_result(columns, rows, 'columnar')),
+]
+
+
+
+def run(counts):
+    print('encoder: %s, brotli: %s' % ('orjson' if AuroraAI.orjson else 'json', 'yes' if AuroraAI.brotli else 'no'))
+    print('%-15s %9s %10s %12s %12s %12s' % ('layout', 'rows', 'encode_ms', 'raw_bytes', 'gzip_bytes', 'br_bytes'))
+    for count in counts:
+        rows = make_rows(count)
+        for name, encoder in ENCODERS:
+            started = time.perf_counter()
+            body = encoder(COLUMNS, rows)
+            elapsed = (time.perf_counter() - started) * 1000
+            gzipped = len(gzip.compress(body, compresslevel=5))
+            brotlied = len(AuroraAI.brotli.compress(body, quality=4)) if AuroraAI.brotli else 0
+            print('%-15s %9d %10.1f %12d %12d %12d' % (name, count, elapsed, len(body), gzipped, brotlied))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Result encoding size and speed benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    run(args.rows)
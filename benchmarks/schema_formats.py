@@ -0,0 +1,34 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import fakes
+
+
+
+# dc - 2026-10-18 - Compare prompt size of each schema serializer on synthetic schemas
+def run(table_counts, columns_per_table):
+    print('%-10s %7s %12s %12s %10s' % ('format', 'tables', 'bytes', 'approx_tok', 'build_ms'))
+    for tables in table_counts:
+        metadata = fakes.synthetic_metadata(tables, columns_per_table)
+        print('%-10s %7d %12d %12d %10s' % ('raw', tables, len(metadata.encode('utf-8')),
+                                            AuroraAI.approx_tokens(metadata), '-'))
+        for fmt in AuroraAI.SCHEMA_SERIALIZERS:
+            started = time.perf_counter()
+            index = AuroraAI.SchemaIndex(AuroraAI.metadata_columns(metadata))
+            text = index.render(fmt=fmt)
+            elapsed = (time.perf_counter() - started) * 1000
+            print('%-10s %7d %12d %12d %10.1f' % (fmt, tables, len(text.encode('utf-8')),
+                                                  AuroraAI.approx_tokens(text), elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Schema serialization size benchmark')
+    parser.add_argument('--tables', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--columns', type=int, default=8)
+    args = parser.parse_args()
+    run(args.tables, args.columns)
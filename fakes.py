@@ -0,0 +1,459 @@
+import csv
+import io
+import itertools
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+
+import botocore.exceptions
+import psycopg2
+import psycopg2.extensions
+
+
+
+# dc - 2026-10-18 - Local stand-ins for AWS clients and schemas so AuroraAI.py can be exercised without an AWS account.
+# dc - 2026-10-18 - Register clients with AuroraAI.set_aws_client('bedrock-runtime', FakeBedrockClient(...)).
+# dc - 2026-10-18 - Point the pool at a FakeDatabase with AuroraAI.set_db_connect(FakeDatabase(...).connect).
+# dc - 2026-10-18 - For a writer and readers, build one FakeDatabase per instance and use connect_by_port.
+
+
+
+class FakeEventStream:
+    """Iterable of Bedrock response-stream events that records early cancellation."""
+
+    def __init__(self, text, chunk_size=8, delay=0.0, usage=None):
+        self._text = text
+        self._chunk_size = chunk_size
+        self._delay = delay
+        self._usage = usage or {}
+        self.chunks_sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        yield self._event({'type': 'message_start', 'message': {'usage': {'input_tokens': self._usage.get('input_tokens', 0)}}})
+        yield self._event({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        for start in range(0, len(self._text), self._chunk_size):
+            if self.closed:
+                return
+            if self._delay:
+                time.sleep(self._delay)
+            self.chunks_sent += 1
+            yield self._event({
+                'type': 'content_block_delta',
+                'index': 0,
+                'delta': {'type': 'text_delta', 'text': self._text[start:start + self._chunk_size]}
+            })
+        yield self._event({'type': 'content_block_stop', 'index': 0})
+        yield self._event({'type': 'message_delta', 'usage': {'output_tokens': self._usage.get('output_tokens', self.chunks_sent)}})
+        yield self._event({'type': 'message_stop'})
+
+    def close(self):
+        self.closed = True
+
+    @staticmethod
+    def _event(message):
+        return {'chunk': {'bytes': json.dumps(message).encode('utf-8')}}
+
+
+
+class FakeBedrockClient:
+    """Answers invoke_model calls with canned text after a configurable latency.
+
+    ``responses`` is either a string returned for every prompt or a callable
+    receiving the prompt text and returning the model output. With
+    ``max_concurrent`` set, calls beyond that many in flight fail with a
+    ThrottlingException the way Bedrock does when a quota is exceeded.
+    """
+
+    def __init__(self, responses='SELECT 1;', latency=0.0, chunk_size=8, chunk_delay=0.0, max_concurrent=None):
+        self._responses = responses
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.max_concurrent = max_concurrent
+        self.calls = 0
+        self.throttled = 0
+        self.streams = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def invoke_model(self, modelId, body, **kwargs):
+        text, prompt_text = self._answer(body)
+        self._enter('InvokeModel')
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            self._leave()
+        payload = {
+            'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': len(prompt_text) // 4, 'output_tokens': len(text) // 4}
+        }
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        text, prompt_text = self._answer(body)
+        self._enter('InvokeModelWithResponseStream')
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            self._leave()
+        stream = FakeEventStream(text, self.chunk_size, self.chunk_delay,
+                                 {'input_tokens': len(prompt_text) // 4})
+        self.streams.append(stream)
+        return {'body': stream}
+
+    def _enter(self, operation):
+        with self._lock:
+            if self.max_concurrent is not None and self._in_flight >= self.max_concurrent:
+                self.throttled += 1
+                raise botocore.exceptions.ClientError(
+                    {'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests, please wait before trying again.'}},
+                    operation
+                )
+            self._in_flight += 1
+
+    def _leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _answer(self, body):
+        with self._lock:
+            self.calls += 1
+        prompt_text = json.loads(body)['messages'][0]['content'][0]['text']
+        text = self._responses(prompt_text) if callable(self._responses) else self._responses
+        return text, prompt_text
+
+
+
+_SYNTHETIC_TYPES = [
+    ('integer', 32),
+    ('bigint', 64),
+    ('numeric', 12),
+    ('character varying', 255),
+    ('text', None),
+    ('date', None),
+    ('timestamp without time zone', None),
+    ('boolean', None),
+]
+
+
+
+def synthetic_schema_columns(tables=10, columns_per_table=8, schema_name='dc_ai_test', seed=0):
+    # dc - 2026-10-18 - Column dicts shaped like get_metadata output, with an id PK and FKs to earlier tables
+    rng = random.Random(seed)
+    columns = []
+    for index in range(tables):
+        table_name = 'table_%04d' % index
+        columns.append({'table_schema': schema_name, 'table_name': table_name, 'column_name': 'id',
+                        'data_type': 'integer', 'size': 32, 'key_type': 'PK', 'references': None})
+        targets = ['table_%04d' % target for target in rng.sample(range(index), min(2, index))]
+        for position in range(1, columns_per_table):
+            if position <= len(targets):
+                target = targets[position - 1]
+                columns.append({'table_schema': schema_name, 'table_name': table_name,
+                                'column_name': '%s_id' % target, 'data_type': 'integer', 'size': 32,
+                                'key_type': 'FK', 'references': {'table_name': target, 'column_name': 'id'}})
+                continue
+            data_type, size = rng.choice(_SYNTHETIC_TYPES)
+            columns.append({'table_schema': schema_name, 'table_name': table_name,
+                            'column_name': 'column_%02d' % position, 'data_type': data_type, 'size': size,
+                            'key_type': 'Not a key', 'references': None})
+    return columns
+
+
+
+def synthetic_metadata(tables=10, columns_per_table=8, schema_name='dc_ai_test', seed=0):
+    # dc - 2026-10-18 - The JSON string get_metadata returns for the synthetic schema
+    return json.dumps([[synthetic_schema_columns(tables, columns_per_table, schema_name, seed)]])
+
+
+
+class FakeSecretsManagerClient:
+    """Answers get_secret_value from a dict of secret id to secret payload."""
+
+    def __init__(self, secrets, latency=0.0):
+        self.secrets = secrets
+        self.latency = latency
+        self.calls = 0
+
+    def get_secret_value(self, SecretId, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if SecretId not in self.secrets:
+            raise botocore.exceptions.ClientError(
+                {'Error': {'Code': 'ResourceNotFoundException', 'Message': "Secrets Manager can't find the specified secret."}},
+                'GetSecretValue'
+            )
+        return {'Name': SecretId, 'SecretString': json.dumps(self.secrets[SecretId])}
+
+
+
+_SQLITE_TYPES = {
+    'integer': 'INTEGER',
+    'bigint': 'INTEGER',
+    'boolean': 'INTEGER',
+    'numeric': 'REAL',
+}
+
+
+
+def _synthetic_value(rng, data_type):
+    if data_type in ('integer', 'bigint'):
+        return rng.randint(0, 1000000)
+    if data_type == 'numeric':
+        return round(rng.uniform(0, 10000), 2)
+    if data_type == 'boolean':
+        return rng.randint(0, 1)
+    if data_type == 'date':
+        return '2024-%02d-%02d' % (rng.randint(1, 12), rng.randint(1, 28))
+    if data_type.startswith('timestamp'):
+        return '2024-%02d-%02d %02d:%02d:00' % (rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23), rng.randint(0, 59))
+    return 'value %d' % rng.randint(0, 999)
+
+
+
+class FakeDatabase:
+    """In-process stand-in for the Aurora PostgreSQL database, backed by SQLite.
+
+    The synthetic schema is seeded into an attached SQLite database named
+    after the schema, so schema-qualified SELECTs run unchanged. The
+    PostgreSQL-only statements AuroraAI.py issues are answered directly:
+    SET LOCAL, EXPLAIN (FORMAT JSON), the information_schema metadata
+    query, the pg_catalog fingerprint, the pg_stat_user_tables probe of
+    the result cache, pg_cancel_backend (which interrupts the SQLite
+    statement), the replica lag checks and COPY ... TO STDOUT. Call
+    ``touch`` to stand in for a write to a table; set ``replica_lag`` or
+    ``available`` to play a lagging or unreachable replica.
+    """
+
+    _names = itertools.count()
+
+    def __init__(self, tables=10, columns_per_table=8, rows_per_table=1000, schema_name='dc_ai_test',
+                 seed=0, latency=0.0, password='fake-password'):
+        self.schema_name = schema_name
+        self.rows_per_table = rows_per_table
+        self.latency = latency
+        self.password = password
+        self.columns = synthetic_schema_columns(tables, columns_per_table, schema_name, seed)
+        self.fingerprint = 'fake-%d-%d-%d' % (tables, columns_per_table, seed)
+        self.table_writes = dict.fromkeys(('%s.%s' % (schema_name, column['table_name']) for column in self.columns), 0)
+        self.connections = 0
+        self.statements = 0
+        self.backends = {}
+        self.replica_lag = 0.0
+        self.available = True
+        self._lock = threading.Lock()
+        self._uri = 'file:auroraai_fake_%d' % next(self._names)
+        # dc - 2026-10-18 - A shared-cache in-memory database lives as long as one connection to it is open
+        self._anchor = self._open()
+        self._seed(rows_per_table, seed)
+
+    def secret(self):
+        # dc - 2026-10-18 - Payload for FakeSecretsManagerClient in the shape get_db_credentials expects
+        return {'DB_NAME': 'postgres', 'DB_USER': 'auroraai', 'DB_PASSWORD': self.password,
+                'DB_HOST': 'localhost', 'DB_PORT': '5432'}
+
+    def connect(self, dbname=None, user=None, password=None, host=None, port=None, **kwargs):
+        if not self.available:
+            raise psycopg2.OperationalError('could not connect to server: Connection refused')
+        if self.password is not None and password != self.password:
+            raise psycopg2.OperationalError('FATAL:  password authentication failed for user "%s"' % user)
+        with self._lock:
+            self.connections += 1
+            conn = FakeConnection(self, self._open(), self.connections)
+            self.backends[conn.backend_pid] = conn
+        return conn
+
+    def cancel_backend(self, pid):
+        with self._lock:
+            conn = self.backends.get(pid)
+        if conn is None or conn.closed:
+            return False
+        conn._sqlite.interrupt()
+        return True
+
+    def touch(self, table):
+        # dc - 2026-10-18 - Bump the write counter the result cache watches
+        with self._lock:
+            self.table_writes[table] += 1
+
+    def table_versions(self, relations):
+        with self._lock:
+            return [(relation, '%d:0:0:1' % self.table_writes[relation])
+                    for relation in relations if relation in self.table_writes]
+
+    def explain(self, sql):
+        # dc - 2026-10-18 - Rough estimate: every referenced table is scanned in full, one Seq Scan node per table as
+        # EXPLAIN (VERBOSE) reports it
+        tables = sorted(set(re.findall(r'\b%s\.(\w+)' % re.escape(self.schema_name), sql)))
+        rows = self.rows_per_table
+        scans = [{'Node Type': 'Seq Scan', 'Schema': self.schema_name, 'Relation Name': table,
+                  'Total Cost': round(rows * 0.0155, 2), 'Plan Rows': rows, 'Plan Width': 32} for table in tables]
+        if len(scans) == 1:
+            return [{'Plan': scans[0]}]
+        return [{'Plan': {'Node Type': 'Result' if not scans else 'Nested Loop',
+                          'Total Cost': round(rows * max(len(tables), 1) * 0.0155, 2),
+                          'Plan Rows': rows, 'Plan Width': 32, 'Plans': scans}}]
+
+    def _open(self):
+        conn = sqlite3.connect('%s?mode=memory&cache=shared' % self._uri, uri=True, check_same_thread=False)
+        conn.execute("ATTACH DATABASE '%s_%s?mode=memory&cache=shared' AS %s" % (self._uri, self.schema_name, self.schema_name))
+        return conn
+
+    def _seed(self, rows_per_table, seed):
+        rng = random.Random(seed)
+        tables = {}
+        for column in self.columns:
+            tables.setdefault(column['table_name'], []).append(column)
+        for table_name, columns in tables.items():
+            definitions = ', '.join('%s %s%s' % (column['column_name'], _SQLITE_TYPES.get(column['data_type'], 'TEXT'),
+                                                 ' PRIMARY KEY' if column['key_type'] == 'PK' else '')
+                                    for column in columns)
+            self._anchor.execute('CREATE TABLE %s.%s (%s)' % (self.schema_name, table_name, definitions))
+            rows = []
+            for row_id in range(1, rows_per_table + 1):
+                row = []
+                for column in columns:
+                    if column['key_type'] == 'PK':
+                        row.append(row_id)
+                    elif column['key_type'] == 'FK':
+                        row.append(rng.randint(1, rows_per_table))
+                    else:
+                        row.append(_synthetic_value(rng, column['data_type']))
+                rows.append(row)
+            self._anchor.executemany('INSERT INTO %s.%s VALUES (%s)' % (self.schema_name, table_name, ', '.join('?' * len(columns))), rows)
+        self._anchor.commit()
+
+
+
+def connect_by_port(databases, default=None):
+    """psycopg2.connect stand-in that picks the FakeDatabase for the requested port, e.g. {5433: reader}."""
+
+    def connect(port=None, **kwargs):
+        database = databases.get(int(port), default) if port is not None else default
+        if database is None:
+            raise psycopg2.OperationalError('could not connect to server on port %s' % port)
+        return database.connect(port=port, **kwargs)
+    return connect
+
+
+
+class FakeConnection:
+    """The subset of a psycopg2 connection that AuroraAI.ConnectionPool and the query paths use."""
+
+    def __init__(self, database, sqlite_conn, backend_pid=0):
+        self.database = database
+        self.backend_pid = backend_pid
+        self.closed = 0
+        self._sqlite = sqlite_conn
+        self._in_transaction = False
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def get_backend_pid(self):
+        return self.backend_pid
+
+    def get_transaction_status(self):
+        if self._in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self._in_transaction = False
+
+    def commit(self):
+        self._in_transaction = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = 1
+            self._sqlite.close()
+            with self.database._lock:
+                self.database.backends.pop(self.backend_pid, None)
+
+
+
+class FakeCursor:
+    """psycopg2-style cursor over SQLite; ``name`` is accepted for server-side cursors and ignored."""
+
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.description = None
+        self._rows = iter(())
+
+    def execute(self, sql, params=None):
+        database = self.connection.database
+        # dc - 2026-10-18 - psycopg2 opens a transaction on the first statement
+        self.connection._in_transaction = True
+        with database._lock:
+            database.statements += 1
+        if database.latency:
+            time.sleep(database.latency)
+        if not database.available:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        head = sql.lstrip()[:16].upper()
+        if head.startswith('SET '):
+            self._result([], [])
+        elif head.startswith('EXPLAIN'):
+            self._result(['QUERY PLAN'], [(database.explain(sql),)])
+        elif 'information_schema' in sql:
+            self._result(['json_agg'], [(database.columns,)])
+        elif 'aurora_replica_status' in sql:
+            # dc - 2026-10-18 - Behave like community PostgreSQL, so the router falls back to the replay timestamp
+            raise psycopg2.ProgrammingError('function aurora_replica_status() does not exist')
+        elif 'pg_last_xact_replay_timestamp' in sql:
+            self._result(['lag'], [(database.replica_lag,)])
+        elif 'pg_cancel_backend' in sql:
+            self._result(['pg_cancel_backend'], [(database.cancel_backend(params[0]),)])
+        elif 'pg_stat_user_tables' in sql:
+            self._result(['name', 'version'], database.table_versions(params[0]))
+        elif 'pg_class' in sql:
+            self._result(['md5'], [(database.fingerprint,)])
+        else:
+            cursor = self._interruptible(self.connection._sqlite.execute, sql, params or ())
+            self.description = [(column[0], None, None, None, None, None, None) for column in cursor.description or ()]
+            self._rows = iter(cursor)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        return list(itertools.islice(self._rows, size or self.itersize))
+
+    def fetchall(self):
+        return self._interruptible(list, self._rows)
+
+    def copy_expert(self, sql, file):
+        # dc - 2026-10-18 - Only the COPY (query) TO STDOUT WITH (FORMAT csv, HEADER true) form used by export_sql
+        query = sql[sql.index('(') + 1:sql.rindex(') TO STDOUT')]
+        self.execute(query)
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow([column[0] for column in self.description])
+        writer.writerows(self._rows)
+        file.write(text.getvalue().encode('utf-8'))
+
+    def close(self):
+        self._rows = iter(())
+
+    def _interruptible(self, function, *args):
+        # dc - 2026-10-18 - An interrupted SQLite statement reports what pg_cancel_backend does in PostgreSQL
+        try:
+            return function(*args)
+        except sqlite3.OperationalError as e:
+            if 'interrupted' in str(e):
+                raise psycopg2.extensions.QueryCanceledError('canceling statement due to user request')
+            raise
+
+    def _result(self, columns, rows):
+        self.description = [(column, None, None, None, None, None, None) for column in columns] or None
+        self._rows = iter(rows)
@@ -0,0 +1,35 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+import fakes
+
+
+
+# dc - 2026-10-18 - Rows each canned query returns; Bedrock answers with a SELECT on the table the question names
+RESULT_ROWS = 3
+
+
+
+def canned_sql(prompt_text):
+    table = int(re.search(r'table_(\d+)', prompt_text.strip().splitlines()[-1]).group(1))
+    return 'SELECT * FROM dc_ai_test.table_%04d WHERE id <= %d;' % (table, RESULT_ROWS)
+
+
+@pytest.fixture
+def backends():
+    # dc - 2026-10-18 - Wire AuroraAI.py to the in-process fakes, with empty caches
+    database = fakes.FakeDatabase(tables=3, columns_per_table=4, rows_per_table=20)
+    AuroraAI.set_aws_client('secretsmanager', fakes.FakeSecretsManagerClient({AuroraAI.SECRET_ID: database.secret()}))
+    AuroraAI.set_aws_client('bedrock-runtime', fakes.FakeBedrockClient(canned_sql))
+    AuroraAI.set_db_connect(database.connect)
+    AuroraAI.secret_cache.invalidate()
+    AuroraAI.schema_cache.invalidate()
+    AuroraAI.sql_cache.clear()
+    AuroraAI.result_cache.clear()
+    return database
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+from conftest import RESULT_ROWS
+
+
+
+# dc - 2026-10-18 - Batch items run on worker threads but must record into the trace of the request that fanned them out
+def test_batch_items_record_into_the_request_trace(backends):
+    trace, token = AuroraAI.start_trace('generate_batch')
+    try:
+        results = AuroraAI.run_batch(['list the rows of table_0001', 'list the rows of table_0002'])
+    finally:
+        AuroraAI._current_trace.reset(token)
+    assert [len(result['rows']) for result in results] == [RESULT_ROWS, RESULT_ROWS]
+    assert {'bedrock', 'validate', 'execute'} <= set(trace.stages)
+    assert trace.counters['rows'] == 2 * RESULT_ROWS
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+from conftest import RESULT_ROWS
+
+
+
+# dc - 2026-10-18 - A streamed result is cached, and its SQL kept as an example, only once it has been read to the end
+SQL = 'SELECT * FROM dc_ai_test.table_0001 WHERE id <= 5'
+
+
+
+def test_small_stream_is_cached_once_read(backends):
+    columns, rows = AuroraAI.execute_sql_stream(SQL)
+    assert isinstance(rows, AuroraAI.RowStream)
+    assert AuroraAI.result_cache.stats()['entries'] == 0
+    assert len(list(rows)) == 5
+    columns, rows = AuroraAI.execute_sql_stream(SQL)
+    assert isinstance(rows, list) and len(rows) == 5
+
+
+def test_stream_past_the_cap_is_not_kept(backends, monkeypatch):
+    monkeypatch.setattr(AuroraAI, 'RESULT_CACHE_STREAM_MAX_BYTES', 16)
+    columns, rows = AuroraAI.execute_sql_stream(SQL, itersize=2)
+    assert len(list(rows)) == 5
+    assert rows._collected is None
+    stats = AuroraAI.result_cache.stats()
+    assert stats['entries'] == 0 and stats['uncacheable'] == 1
+
+
+def test_stream_closed_early_is_not_cached(backends):
+    columns, rows = AuroraAI.execute_sql_stream(SQL, itersize=2)
+    next(iter(rows))
+    rows.close()
+    assert AuroraAI.result_cache.stats()['entries'] == 0
+
+
+def test_example_is_recorded_after_the_stream_ends(backends, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(AuroraAI, 'record_example', lambda prompt, details, result: recorded.append(prompt))
+    columns, rows = AuroraAI.call_bedrock('list the rows of table_0002', execute=AuroraAI.execute_sql_stream)
+    assert recorded == []
+    assert len(list(rows)) == RESULT_ROWS
+    assert recorded == ['list the rows of table_0002']
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+
+
+
+# dc - 2026-10-18 - Accept/reject behaviour of the read-only validator that gates every generated statement
+ALLOWED = [
+    'SELECT * FROM dc_ai_test.orders',
+    'SELECT * FROM dc_ai_test.orders;',
+    "SELECT * FROM dc_ai_test.orders WHERE note = 'DROP TABLE orders; DELETE FROM orders'",
+    "SELECT $$pg_sleep(5)$$ FROM dc_ai_test.orders",
+    'SELECT 1 /* a * b / c **/ FROM dc_ai_test.orders',
+    'SELECT "name" FROM dc_ai_test.orders -- DELETE FROM orders',
+    'SELECT 1 /* DROP TABLE orders */ FROM dc_ai_test.orders',
+    'SELECT 10 - 1, 10 / 2, 10 * 3 FROM dc_ai_test.orders',
+    'WITH recent AS (SELECT * FROM dc_ai_test.orders) SELECT * FROM recent',
+    'SELECT EXTRACT(YEAR FROM ordered_at) FROM dc_ai_test.orders',
+]
+
+REJECTED = [
+    # dc - 2026-10-18 - Denylisted functions, bare, schema-qualified and quoted
+    ('SELECT pg_sleep(5)', 'select'),
+    ('SELECT pg_catalog.pg_sleep(5)', 'select'),
+    ('SELECT "pg_sleep"(5)', 'select'),
+    ('SELECT "pg_terminate_backend"(pid) FROM pg_stat_activity', 'select'),
+    ("SELECT \"set_config\"('search_path', 'public', false)", 'select'),
+    ("SELECT nextval('orders_id_seq')", 'select'),
+    ("SELECT dblink_connect('host=elsewhere')", 'select'),
+    ("SELECT dblink_exec('conn', 'DELETE FROM orders')", 'select'),
+    ('SELECT lo_unlink(16403)', 'select'),
+    ("SELECT query_to_xml('DELETE FROM dc_ai_test.orders RETURNING *', false, false, '')", 'select'),
+    # dc - 2026-10-18 - Unterminated comments and quotes
+    ('SELECT * FROM dc_ai_test.orders /* unterminated', 'error'),
+    ('SELECT * FROM dc_ai_test.orders +/* unterminated', 'error'),
+    ("SELECT * FROM dc_ai_test.orders WHERE note = 'open", 'error'),
+    ('SELECT "open FROM dc_ai_test.orders', 'error'),
+    ('SELECT $tag$ open FROM dc_ai_test.orders', 'error'),
+    # dc - 2026-10-18 - Nested comments; PostgreSQL ends the outer comment only at the matching */
+    ("SELECT 1 /* /* */ ' */ ; DELETE FROM dc_ai_test.x; COMMIT; -- '", 'error'),
+    ('SELECT 1 /* outer /* inner */ still outer */ FROM dc_ai_test.orders', 'error'),
+    ('SELECT 1 /* a /*/ DELETE FROM dc_ai_test.orders', 'error'),
+    ("SELECT 1 /* /* */ */ ; DELETE FROM dc_ai_test.orders", 'error'),
+    # dc - 2026-10-18 - More than one statement
+    ('SELECT 1; DROP TABLE dc_ai_test.orders', 'multiple'),
+    ('SELECT 1; SELECT 2', 'multiple'),
+    ('SELECT 1 --\n; DELETE FROM dc_ai_test.orders', 'multiple'),
+    # dc - 2026-10-18 - Data-modifying CTEs and statements that are not reads
+    ('WITH gone AS (DELETE FROM dc_ai_test.orders RETURNING *) SELECT * FROM gone', 'select'),
+    ('WITH moved AS (UPDATE dc_ai_test.orders SET total = 0 RETURNING *) SELECT count(*) FROM moved', 'select'),
+    ('SELECT * INTO dc_ai_test.copy FROM dc_ai_test.orders', 'select'),
+    ('DELETE FROM dc_ai_test.orders', 'delete'),
+    ('EXPLAIN ANALYZE DELETE FROM dc_ai_test.orders', 'explain'),
+]
+
+
+
+@pytest.mark.parametrize('sql', ALLOWED)
+def test_allowed(sql):
+    verdict = AuroraAI.inspect_sql(sql)
+    assert verdict.allowed, verdict
+    assert verdict.kind == 'select'
+    assert verdict.forbidden == []
+
+
+@pytest.mark.parametrize('sql, kind', REJECTED)
+def test_rejected(sql, kind):
+    verdict = AuroraAI.inspect_sql(sql)
+    assert not verdict.allowed, verdict
+    assert verdict.kind == kind
+
+
+def test_quoted_function_is_reported():
+    assert AuroraAI.inspect_sql('SELECT "pg_sleep"(5)').forbidden == ['pg_sleep()']
+
+
+def test_forbidden_keywords_inside_literals_are_ignored():
+    assert AuroraAI.inspect_sql("SELECT 'pg_sleep(5)', E'it\\'s DELETE' FROM dc_ai_test.orders").allowed
+
+
+def test_streamed_text_gives_the_same_verdict():
+    # dc - 2026-10-18 - The streaming path feeds partial text; an unterminated comment must still fail at the end
+    sql = 'SELECT * FROM dc_ai_test.orders /* unterminated'
+    scanner = AuroraAI.SqlScanner()
+    for end in range(1, len(sql)):
+        scanner.scan(sql[:end], final=False)
+    assert scanner.scan(sql).verdict().kind == 'error'
+
+
+def test_streamed_nested_comment_is_rejected():
+    sql = "SELECT 1 /* /* */ ' */ ; DELETE FROM dc_ai_test.x; COMMIT; -- '"
+    scanner = AuroraAI.SqlScanner()
+    for end in range(1, len(sql)):
+        scanner.scan(sql[:end], final=False)
+    assert scanner.scan(sql).verdict().kind == 'error'
+
+
+def test_nested_comment_is_not_a_cache_key():
+    assert AuroraAI.result_cache_key('SELECT 1 /* /* */ */ FROM dc_ai_test.orders') is None
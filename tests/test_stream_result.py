@@ -0,0 +1,30 @@
+import datetime
+import decimal
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+
+
+
+# dc - 2026-10-18 - Streamed rows must encode like buffered ones: bytea as base64, dates as ISO 8601, Decimal as text
+COLUMNS = ['payload', 'ordered_on', 'ordered_at', 'total']
+ROWS = [(memoryview(b'\x00\xff'), datetime.date(2024, 1, 2), datetime.datetime(2024, 1, 2, 3, 4, 5), decimal.Decimal('1.10'))]
+EXPECTED = ['AP8=', '2024-01-02', '2024-01-02T03:04:05', '1.10']
+
+
+
+def test_ndjson_encodes_typed_values():
+    lines = b''.join(AuroraAI.stream_result(COLUMNS, ROWS, 'ndjson')).decode('utf-8').splitlines()
+    assert json.loads(lines[0]) == {'columns': COLUMNS, 'plan': None}
+    assert json.loads(lines[1]) == EXPECTED
+    assert json.loads(lines[2])['summary']['row_count'] == 1
+
+
+def test_json_document_encodes_typed_values():
+    document = json.loads(b''.join(AuroraAI.stream_result(COLUMNS, ROWS, 'json')))
+    assert document['rows'] == [EXPECTED]
+    assert document['summary']['row_count'] == 1
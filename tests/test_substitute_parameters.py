@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AuroraAI
+
+
+
+# dc - 2026-10-18 - Reused SQL must either be exactly right or be refused (None), so generation runs instead
+SUBSTITUTED = [
+    ('top 5 products in 10 stores', 'SELECT p FROM t WHERE store_count >= 10 LIMIT 5',
+     'top 10 products in 20 stores', 'SELECT p FROM t WHERE store_count >= 20 LIMIT 10'),
+    ('orders over 10 dollars', "SELECT * FROM o WHERE amount > 10 AND d >= '2023-01-01'",
+     'orders over 20 dollars', "SELECT * FROM o WHERE amount > 20 AND d >= '2023-01-01'"),
+    ('sales in March', "SELECT * FROM s WHERE d >= '2024-03-01' AND d < '2024-04-01'",
+     'sales in May', "SELECT * FROM s WHERE d >= '2024-05-01' AND d < '2024-06-01'"),
+    ('sales in March', 'SELECT * FROM s WHERE EXTRACT(MONTH FROM d) = 3',
+     'sales in May', 'SELECT * FROM s WHERE EXTRACT(MONTH FROM d) = 5'),
+    ('sales for north region', "SELECT * FROM s WHERE region = 'north'",
+     'sales for south region', "SELECT * FROM s WHERE region = 'south'"),
+    ('rows with id up to 10', 'SELECT * FROM t WHERE id <= 10',
+     'rows with id up to 10', 'SELECT * FROM t WHERE id <= 10'),
+]
+
+REFUSED = [
+    # dc - 2026-10-18 - A changed number that also appears inside a date literal
+    ('orders over 10 dollars', "SELECT * FROM o WHERE amount > 10 AND d >= '2023-10-01'", 'orders over 11 dollars'),
+    # dc - 2026-10-18 - A changed value that occurs twice in the prompt or twice in the SQL
+    ('top 10 products in 10 stores', 'SELECT p FROM t WHERE s >= 10 LIMIT 10', 'top 10 products in 20 stores'),
+    ('rows with id up to 10', 'SELECT * FROM t WHERE id <= 10 OR x = 10', 'rows with id up to 20'),
+    ('sales for north region', "SELECT * FROM s WHERE region = 'north' OR r2 = 'north'", 'sales for south region'),
+    # dc - 2026-10-18 - Values inside a larger literal, days that do not exist in every month, unmatched values
+    ('sales for north region', "SELECT * FROM s WHERE region LIKE '%north%'", 'sales for south region'),
+    ('sales in March', "SELECT * FROM s WHERE d BETWEEN '2024-03-01' AND '2024-03-31'", 'sales in May'),
+    ('rows with id up to 10', 'SELECT * FROM t WHERE id <= 11', 'rows with id up to 20'),
+    ('rows with id up to 10', 'SELECT * FROM t WHERE id <= 10', 'rows with an id up to 20'),
+]
+
+
+
+@pytest.mark.parametrize('example_prompt, example_sql, input_prompt, expected', SUBSTITUTED)
+def test_substituted(example_prompt, example_sql, input_prompt, expected):
+    assert AuroraAI.substitute_parameters(example_prompt, example_sql, input_prompt) == expected
+
+
+@pytest.mark.parametrize('example_prompt, example_sql, input_prompt', REFUSED)
+def test_refused(example_prompt, example_sql, input_prompt):
+    assert AuroraAI.substitute_parameters(example_prompt, example_sql, input_prompt) is None